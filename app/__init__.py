@@ -1,25 +1,73 @@
 from flask import Flask
 from flask_sqlalchemy import SQLAlchemy
 from flask_login import LoginManager
+from app.database import RoutingSession
 
 # Инициализация расширений
-db = SQLAlchemy()
+db = SQLAlchemy(session_options={'class_': RoutingSession})
 login_manager = LoginManager()
 login_manager.login_view = 'auth.login'
 login_manager.login_message = 'Пожалуйста, войдите в систему.'
 
-def create_app():
+def create_app(test_config=None):
     """Фабрика для создания приложения Flask"""
     app = Flask(__name__)
     
-    # Базовая конфигурация
-    app.config['SECRET_KEY'] = 'dev-secret-key-change-in-production'
-    app.config['SQLALCHEMY_DATABASE_URI'] = 'sqlite:///5s_system.db'
-    app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
+    # Конфигурация из config.Config, затем переменные окружения FLASK_*
+    from config import Config
+    app.config.from_object(Config)
+    app.config.from_prefixed_env()
+    
+    # Переопределения для тестов
+    if test_config:
+        app.config.update(test_config)
     
     # Инициализация расширений с приложением
+    from app import database
+    database.configure(app)
     db.init_app(app)
+    database.init_app(app)
     login_manager.init_app(app)
+    
+    from app.cache import cache
+    cache.init_app(app)
+    
+    from app import photos
+    photos.init_app(app)
+    
+    from app.user_cache import user_cache
+    user_cache.init_app(app)
+    
+    from app import passwords
+    passwords.init_app(app)
+    
+    from app import tokens
+    tokens.init_app(app)
+    
+    from app import jobs
+    jobs.init_app(app)
+    
+    from app import rollup
+    rollup.init_app(app)
+    
+    from app.instrumentation import instrumentation
+    instrumentation.init_app(app)
+    
+    from app.leaderboard import leaderboard
+    leaderboard.init_app(app)
+    
+    from app.events import hub as event_hub
+    event_hub.init_app(app)
+    
+    from app import notifications
+    notifications.init_app(app)
+    
+    from app import reports
+    reports.init_app(app)
+    
+    # Модели SQLAlchemy (используются в fix_database.py через app.models)
+    from app.models_init import init_models
+    app.models = init_models()
     # CORS временно убран
     
     # Регистрация блюпринтов
@@ -33,6 +81,19 @@ def create_app():
         app.register_blueprint(api_blueprint, url_prefix='/api')
         
         print("✅ Все блюпринты зарегистрированы")
+        
+        from app.rollup import rebuild_rollup_command
+        from app.scoring import rescore_checks_command
+        from app.notifications import send_notifications_command
+        from app.seed import seed_command
+        from app.jobs import enqueue_command, stats_command, worker_command
+        app.cli.add_command(rebuild_rollup_command)
+        app.cli.add_command(rescore_checks_command)
+        app.cli.add_command(send_notifications_command)
+        app.cli.add_command(worker_command)
+        app.cli.add_command(enqueue_command)
+        app.cli.add_command(stats_command)
+        app.cli.add_command(seed_command)
     except ImportError as e:
         print(f"❌ Ошибка регистрации блюпринтов: {e}")
     
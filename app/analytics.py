@@ -0,0 +1,125 @@
+"""
+Динамика оценок 5С по времени.
+
+Запросы читают дневные агрегаты area_daily_stats (строка на участок и день),
+а не checks_5s: объем чтения зависит от числа участков и дней в периоде,
+но не от числа проверок. Дни группируются в недели и месяцы средствами SQL
+(SQLite, PostgreSQL, MySQL); на других базах запрос группирует по дням, а
+недели и месяцы сводятся в Python.
+"""
+from datetime import timedelta
+
+from sqlalchemy import func, literal_column
+from app import db
+from app.models import AreaDailyStats as Daily, Area5S as Area
+from app.rollup import S_FIELDS
+
+BUCKETS = ('day', 'week', 'month')
+GROUPS = ('area', 'department')
+
+
+class AnalyticsError(ValueError):
+    """Некорректные параметры запроса аналитики"""
+
+
+def _bucket_expr(bucket):
+    """
+    Начало периода (неделя — с понедельника) для столбца day: SQLite, PostgreSQL,
+    MySQL. Для других баз None — периоды считает _bucket_start.
+    """
+    if bucket == 'day':
+        return Daily.day
+    dialect = db.engine.dialect.name
+    if dialect == 'sqlite':
+        if bucket == 'week':
+            return func.date(Daily.day, '-6 days', 'weekday 1', type_=db.Date)
+        return func.date(Daily.day, 'start of month', type_=db.Date)
+    if dialect == 'postgresql':
+        return func.date(func.date_trunc(literal_column(f"'{bucket}'"), Daily.day), type_=db.Date)
+    if dialect in ('mysql', 'mariadb'):
+        if bucket == 'week':
+            # WEEKDAY: понедельник = 0
+            return func.subdate(Daily.day, func.weekday(Daily.day), type_=db.Date)
+        return func.subdate(Daily.day, func.dayofmonth(Daily.day) - 1, type_=db.Date)
+    return None
+
+
+def _bucket_start(day, bucket):
+    """Начало периода для даты — то же, что _bucket_expr, но в Python"""
+    if bucket == 'week':
+        return day - timedelta(days=day.weekday())
+    if bucket == 'month':
+        return day.replace(day=1)
+    return day
+
+
+def trends_query(bucket='week', group_by='area', area_id=None, department=None, since=None, until=None):
+    """Сгруппированный запрос: ключ группы, начало периода и суммы показателей"""
+    if bucket not in BUCKETS:
+        raise AnalyticsError(f'bucket: одно из {", ".join(BUCKETS)}')
+    if group_by not in GROUPS:
+        raise AnalyticsError(f'group_by: одно из {", ".join(GROUPS)}')
+
+    # Без выражения для базы строки идут по дням, trends() сводит их в периоды
+    period = _bucket_expr(bucket)
+    period = (Daily.day if period is None else period).label('period')
+    keys = [Area.id, Area.name] if group_by == 'area' else [Area.department]
+    query = db.session.query(
+        *keys,
+        period,
+        func.sum(Daily.check_count).label('check_count'),
+        func.sum(Daily.score_sum).label('score_sum'),
+        *(func.sum(getattr(Daily, f'{name}_hits')).label(f'{name}_hits') for name in S_FIELDS)
+    ).join(Area, Area.id == Daily.area_id)
+
+    if area_id is not None:
+        query = query.filter(Daily.area_id == area_id)
+    if department:
+        query = query.filter(Area.department == department)
+    if since is not None:
+        query = query.filter(Daily.day >= since)
+    if until is not None:
+        query = query.filter(Daily.day < until)
+    return query.group_by(*keys, period).order_by(*keys, period)
+
+
+_SUMS = ('check_count', 'score_sum', *(f'{name}_hits' for name in S_FIELDS))
+
+
+def _point(values):
+    count = values['check_count'] or 0
+    return {
+        'period': values['period'].isoformat(),
+        'checks': count,
+        'average_score': round(values['score_sum'] / count, 2) if count else None,
+        'pass_rates': {
+            name: round(values[f'{name}_hits'] / count, 3) if count else None
+            for name in S_FIELDS
+        }
+    }
+
+
+def trends(bucket='week', group_by='area', **filters):
+    """Ряды средних оценок и долей выполнения каждого S по периодам"""
+    series, sums = [], []
+    current_key = object()
+    for row in trends_query(bucket, group_by, **filters):
+        key = (row.id, row.name) if group_by == 'area' else row.department
+        if key != current_key:
+            current_key = key
+            if group_by == 'area':
+                series.append({'area_id': row.id, 'area': row.name, 'points': []})
+            else:
+                series.append({'department': row.department, 'points': []})
+            sums.append([])
+        period = _bucket_start(row.period, bucket)
+        points = sums[-1]
+        if points and points[-1]['period'] == period:
+            # Дни одного периода (база без выражения периода в SQL)
+            for name in _SUMS:
+                points[-1][name] = (points[-1][name] or 0) + (getattr(row, name) or 0)
+        else:
+            points.append({'period': period, **{name: getattr(row, name) for name in _SUMS}})
+    for item, points in zip(series, sums):
+        item['points'] = [_point(values) for values in points]
+    return {'bucket': bucket, 'group_by': group_by, 'series': series}
@@ -1,15 +1,29 @@
-from flask import Blueprint, request, jsonify, send_file
+from flask import Blueprint, current_app, request, jsonify, send_file, stream_with_context
 from flask_login import login_required, current_user
 from sqlalchemy import desc, func
 from datetime import datetime, timedelta
 import json
 import os
-from app import db
-ffrom app.models import Area5S as Area, Check5S as Check, Audit5S as Audit, User
+from app import (
+    analytics, database, db, events, export, jobs, notifications, photos, reports, rollup, scheduling, scoring
+)
+from app.ingest import BATCH_MAX_SIZE, ingest_checks
+from app.cache import DASHBOARD_STATS_KEY, cache, invalidate_dashboard
+from app.leaderboard import LEADERBOARD_MAX_LIMIT, SCOPES as LEADERBOARD_SCOPES, leaderboard
+from app.queries import (
+    CHECKS_PAGE_DEFAULT, CHECKS_PAGE_MAX, area_checks_page, area_summaries,
+    dashboard_stats, serialize_check
+)
+from app.models import (
+    Area5S as Area, Check5S as Check, Audit5S as Audit, Notification5S as Notification, Report5S as Report, User
+)
 from functools import wraps
 
 api = Blueprint('api', __name__)
 
+# GET-запросы (участки, история проверок, сводка) читают с реплики, если она настроена
+api.before_request(database.route_reads_to_replica)
+
 def role_required(*roles):
     """Декоратор для проверки ролей"""
     def decorator(f):
@@ -27,20 +41,7 @@ def role_required(*roles):
 @login_required
 def get_areas():
     """Получить список всех участков"""
-    areas = Area.query.filter_by(is_active=True).all()
-    
-    return jsonify([{
-        'id': area.id,
-        'name': area.name,
-        'description': area.description,
-        'department': area.department,
-        'location': area.location,
-        'responsible_person': area.responsible_person.username if area.responsible_person else None,
-        'responsible_person_id': area.responsible_person_id,
-        'created_at': area.created_at.isoformat(),
-        'last_check': Check.query.filter_by(area_id=area.id).order_by(desc(Check.checked_at)).first().checked_at.isoformat() if Check.query.filter_by(area_id=area.id).first() else None,
-        'average_score': db.session.query(func.avg(Check.total_score)).filter(Check.area_id == area.id).scalar() or 0
-    } for area in areas])
+    return jsonify(area_summaries())
 
 @api.route('/areas/<int:area_id>', methods=['GET'])
 @login_required
@@ -78,6 +79,7 @@ def create_area():
     
     db.session.add(area)
     db.session.commit()
+    invalidate_dashboard()
     
     return jsonify({
         'message': 'Участок создан успешно',
@@ -98,6 +100,11 @@ def create_check():
     if not all(field in data for field in required_fields):
         return jsonify({'message': 'Отсутствуют обязательные поля'}), 400
     
+    try:
+        photo_refs = photos.normalize_refs(data.get('photos'))
+    except photos.PhotoError as e:
+        return jsonify({'message': str(e)}), 400
+    
     check = Check(
         area_id=data['area_id'],
         user_id=current_user.id,
@@ -107,14 +114,19 @@ def create_check():
         s_seiketsu=bool(data['s_seiketsu']),
         s_shitsuke=bool(data['s_shitsuke']),
         notes=data.get('notes'),
-        photos=data.get('photos', [])
+        photos=photo_refs
     )
     
     # Расчет оценки
     check.calculate_score()
     
     db.session.add(check)
+    db.session.flush()
+    rollup.apply_check(check)
+    # Уведомление только ставится в очередь, доставка идет в фоне
+    notifications.notify_low_scores([(check.id, check.area_id, check.user_id, check.total_score)])
     db.session.commit()
+    invalidate_dashboard()
     
     return jsonify({
         'message': 'Проверка создана успешно',
@@ -125,25 +137,69 @@ def create_check():
         }
     }), 201
 
+@api.route('/checks/batch', methods=['POST'])
+@login_required
+def create_checks_batch():
+    """
+    Пакетная загрузка проверок с планшетов (офлайн-синхронизация)
+    Тело: {"checks": [{client_uuid, area_id, s_seiri, ..., checked_at?}, ...]}
+    """
+    data = request.get_json(silent=True) or {}
+    items = data.get('checks')
+    
+    if not isinstance(items, list) or not items:
+        return jsonify({'message': 'Ожидается непустой список checks'}), 400
+    
+    if len(items) > BATCH_MAX_SIZE:
+        return jsonify({'message': f'Не более {BATCH_MAX_SIZE} проверок в пакете'}), 413
+    
+    results = ingest_checks(items, current_user.id)
+    
+    summary = {status: 0 for status in ('created', 'duplicate', 'error')}
+    for result in results:
+        summary[result['status']] += 1
+    if summary['created']:
+        invalidate_dashboard()
+    
+    return jsonify({'summary': summary, 'results': results}), 200
+
 @api.route('/checks/area/<int:area_id>', methods=['GET'])
 @login_required
 def get_area_checks(area_id):
-    """Получить проверки для участка"""
-    checks = Check.query.filter_by(area_id=area_id).order_by(desc(Check.checked_at)).all()
+    """
+    Получить проверки для участка (постранично, от новых к старым)
+    Параметры: limit, cursor, since, until, user_id, min_score
+    """
+    try:
+        limit = min(request.args.get('limit', CHECKS_PAGE_DEFAULT, type=int), CHECKS_PAGE_MAX)
+        since = _parse_datetime_arg('since')
+        until = _parse_datetime_arg('until')
+        checks, next_cursor = area_checks_page(
+            area_id,
+            limit=max(limit, 1),
+            cursor=request.args.get('cursor'),
+            since=since,
+            until=until,
+            user_id=request.args.get('user_id', type=int),
+            min_score=request.args.get('min_score', type=int)
+        )
+    except ValueError as e:
+        return jsonify({'message': str(e)}), 400
     
-    return jsonify([{
-        'id': check.id,
-        'area_id': check.area_id,
-        'user': check.user.username,
-        's_seiri': check.s_seiri,
-        's_seiton': check.s_seiton,
-        's_seiso': check.s_seiso,
-        's_seiketsu': check.s_seiketsu,
-        's_shitsuke': check.s_shitsuke,
-        'total_score': check.total_score,
-        'notes': check.notes,
-        'checked_at': check.checked_at.isoformat()
-    } for check in checks])
+    return jsonify({
+        'checks': [serialize_check(check) for check in checks],
+        'next_cursor': next_cursor
+    })
+
+def _parse_datetime_arg(name):
+    """Дата из параметра запроса в формате ISO 8601"""
+    value = request.args.get(name)
+    if not value:
+        return None
+    try:
+        return datetime.fromisoformat(value)
+    except ValueError:
+        raise ValueError(f'Некорректная дата в параметре {name}')
 
 # ===== AUDITS ENDPOINTS =====
 @api.route('/audits', methods=['POST'])
@@ -156,6 +212,17 @@ def create_audit():
     if not all(field in data for field in required_fields):
         return jsonify({'message': 'Отсутствуют обязательные поля'}), 400
     
+    if not all(scoring.is_valid_audit_score(data[field]) for field in scoring.AUDIT_FIELDS):
+        return jsonify({'message': f'Оценки критериев должны быть от 0 до {scoring.AUDIT_MAX_S_SCORE}'}), 400
+    
+    try:
+        photo_refs = photos.normalize_refs(data.get('photos'))
+        next_audit_date = datetime.fromisoformat(data['next_audit_date']) if data.get('next_audit_date') else None
+    except photos.PhotoError as e:
+        return jsonify({'message': str(e)}), 400
+    except (TypeError, ValueError):
+        return jsonify({'message': 'Некорректная дата next_audit_date'}), 400
+    
     audit = Audit(
         area_id=data['area_id'],
         auditor_id=current_user.id,
@@ -166,14 +233,20 @@ def create_audit():
         shitsuke_score=data['shitsuke_score'],
         comments=data.get('comments'),
         recommendations=data.get('recommendations'),
-        photos=data.get('photos', [])
+        photos=photo_refs,
+        next_audit_date=next_audit_date
     )
     
     # Расчет общей оценки
     audit.calculate_total_score()
     
     db.session.add(audit)
+    db.session.flush()
+    grade = audit.get_grade()
+    scheduling.schedule_audit(audit, grade)
+    rollup.apply_audit(audit, grade)
     db.session.commit()
+    invalidate_dashboard()
     
     return jsonify({
         'message': 'Аудит создан успешно',
@@ -181,10 +254,242 @@ def create_audit():
             'id': audit.id,
             'area_id': audit.area_id,
             'total_score': audit.total_score,
-            'grade': audit.get_grade()
+            'grade': grade,
+            'next_audit_date': audit.next_audit_date.isoformat()
         }
     }), 201
 
+@api.route('/audits/due', methods=['GET'])
+@role_required('admin', 'manager', 'auditor')
+def get_due_audits():
+    """
+    Участки, которым пора проводить аудит: без аудитов, просроченные и
+    со сроком в ближайшие within_days дней (по возрастанию срока)
+    Параметры: within_days (по умолчанию 7), department, limit
+    """
+    within_days = max(request.args.get('within_days', 7, type=int), 0)
+    limit = min(max(request.args.get('limit', 50, type=int), 1), scheduling.DUE_LIST_MAX)
+    return jsonify(scheduling.due_audits(
+        within_days=within_days,
+        department=request.args.get('department'),
+        limit=limit
+    ))
+
+# ===== PHOTOS ENDPOINTS =====
+@api.route('/photos', methods=['POST'])
+@login_required
+def upload_photo():
+    """
+    Загрузить фото: multipart-поле photo или тело запроса целиком (image/*).
+    Возвращает id фото для поля photos проверки или аудита.
+    """
+    upload = request.files.get('photo')
+    stream = upload.stream if upload else request.stream
+    
+    try:
+        photo, created = photos.save_upload(stream, current_user.id)
+    except photos.PhotoError as e:
+        return jsonify({'message': str(e)}), 400
+    
+    return jsonify({
+        'photo': photos.serialize_photo(photo),
+        'duplicate': not created
+    }), 201 if created else 200
+
+PHOTO_CACHE_MAX_AGE = 365 * 24 * 3600
+
+@api.route('/photos/<photo_id>', methods=['GET'])
+@login_required
+def get_photo(photo_id):
+    """
+    Скачать фото: ?variant=original (по умолчанию), medium или thumb.
+    Файлы адресуются по содержимому и не меняются, поэтому отдаются с ETag,
+    поддержкой Range и неизменяемым долгим кэшем. Кэш только private: фото
+    доступны после входа, общим прокси хранить их нельзя.
+    """
+    variant = request.args.get('variant', 'original')
+    if variant != 'original' and variant not in photos.VARIANTS:
+        return jsonify({'message': 'Неизвестный вариант фото'}), 400
+    
+    photo_id = photo_id.lower()
+    etag = photos.photo_etag(photo_id, variant)
+    # Содержимое по этому ETag не меняется: 304 без обращения к базе и диску
+    if etag in request.if_none_match:
+        response = current_app.response_class(status=304)
+        response.set_etag(etag)
+        response.cache_control.private = True
+        response.cache_control.max_age = PHOTO_CACHE_MAX_AGE
+        response.cache_control.immutable = True
+        return response
+    
+    resolved = photos.resolve_file(photo_id, variant)
+    if resolved is None or not os.path.exists(resolved[0]):
+        return jsonify({'message': 'Фото не найдено'}), 404
+    path, content_type, immutable = resolved
+    
+    # conditional=True: If-Modified-Since и Range (206); при USE_X_SENDFILE файл
+    # отдает фронтенд-сервер, иначе используется wsgi.file_wrapper (sendfile у gunicorn)
+    response = send_file(
+        path,
+        mimetype=content_type,
+        conditional=True,
+        etag=etag if immutable else True,
+        max_age=PHOTO_CACHE_MAX_AGE if immutable else 0
+    )
+    response.headers['Accept-Ranges'] = 'bytes'
+    # send_file ставит public вместе с max_age
+    response.cache_control.public = False
+    response.cache_control.private = True
+    if immutable:
+        response.cache_control.immutable = True
+    else:
+        # Превью еще строится: отдаем оригинал, но не закрепляем его в кэше
+        response.cache_control.no_cache = True
+    return response
+
+# ===== EXPORT ENDPOINTS =====
+@api.route('/export/<any(checks, audits):kind>', methods=['GET'])
+@role_required('admin', 'manager')
+def export_records(kind):
+    """
+    Выгрузка проверок или аудитов потоком, без сборки всего файла в памяти
+    Параметры: format (csv или xlsx), area_id, department, since, until
+    """
+    file_format = request.args.get('format', 'csv')
+    try:
+        body = export.export_stream(
+            kind,
+            file_format,
+            area_id=request.args.get('area_id', type=int),
+            department=request.args.get('department'),
+            since=_parse_datetime_arg('since'),
+            until=_parse_datetime_arg('until')
+        )
+    except ValueError as e:
+        return jsonify({'message': str(e)}), 400
+    
+    filename = f'{kind}_{datetime.utcnow():%Y%m%d_%H%M%S}.{file_format}'
+    response = current_app.response_class(stream_with_context(body), content_type=export.FORMATS[file_format])
+    response.headers['Content-Disposition'] = f'attachment; filename={filename}'
+    return response
+
+# ===== REPORTS ENDPOINTS =====
+@api.route('/reports', methods=['POST'])
+@role_required('admin', 'manager')
+def create_report():
+    """
+    Заказать отчет за месяц: month (ГГГГ-ММ), department (без него — все отделы),
+    format (html или pdf). Отчет строится в фоне; если такой же отчет по
+    неизменившимся данным уже есть, возвращается он
+    """
+    data = request.get_json() or {}
+    try:
+        report, created = reports.request_report(
+            data.get('month'),
+            department=data.get('department'),
+            file_format=data.get('format', 'html'),
+            user_id=current_user.id
+        )
+    except reports.ReportError as e:
+        return jsonify({'message': str(e)}), 400
+    
+    payload = reports.serialize_report(report)
+    response = jsonify({'report': payload, 'cached': not created})
+    response.headers['Location'] = payload['status_url']
+    return response, 200 if report.status == 'done' else 202
+
+@api.route('/reports/<int:report_id>', methods=['GET'])
+@role_required('admin', 'manager')
+def get_report(report_id):
+    """Статус задания на отчет"""
+    report = db.session.get(Report, report_id)
+    if report is None:
+        return jsonify({'message': 'Отчет не найден'}), 404
+    return jsonify(reports.serialize_report(report))
+
+@api.route('/reports/<int:report_id>/download', methods=['GET'])
+@role_required('admin', 'manager')
+def download_report(report_id):
+    """Скачать готовый отчет; файл в кэше не меняется, ETag — ключ кэша"""
+    report = db.session.get(Report, report_id)
+    if report is None:
+        return jsonify({'message': 'Отчет не найден'}), 404
+    path = reports.report_path(report)
+    if report.status != 'done' or not os.path.exists(path):
+        return jsonify({'message': 'Отчет еще не готов', 'status': report.status}), 409
+    
+    department = report.department or 'all'
+    return send_file(
+        path,
+        mimetype=reports.FORMATS[report.format],
+        as_attachment=True,
+        download_name=f'5s_report_{department}_{report.period_start:%Y-%m}.{report.format}',
+        conditional=True,
+        etag=report.cache_key
+    )
+
+# ===== STREAM ENDPOINTS =====
+@api.route('/stream', methods=['GET'])
+@login_required
+def stream_events():
+    """
+    Поток событий для дашбордов (text/event-stream): check, checks, audit, area_score
+    Переподключение с заголовком Last-Event-ID (или параметром last_event_id)
+    досылает пропущенные события
+    """
+    config = current_app.config
+    if not events.hub.subscribe(config['EVENTS_MAX_SUBSCRIBERS']):
+        response = jsonify({'message': 'Слишком много подключений к потоку событий'})
+        response.headers['Retry-After'] = '30'
+        return response, 503
+    
+    body = events.hub.stream(
+        request.headers.get('Last-Event-ID') or request.args.get('last_event_id'),
+        heartbeat=config['EVENTS_HEARTBEAT_SECONDS'],
+        max_seconds=config['EVENTS_STREAM_MAX_SECONDS'],
+        retry_ms=config['EVENTS_RETRY_MS']
+    )
+    # Генератор не обращается к базе, поэтому контекст запроса не удерживается
+    response = current_app.response_class(body, mimetype='text/event-stream')
+    # Место освобождается при закрытии ответа, даже если генератор не запускался
+    response.call_on_close(events.hub.unsubscribe)
+    response.headers['Cache-Control'] = 'no-cache'
+    response.headers['X-Accel-Buffering'] = 'no'
+    return response
+
+# ===== NOTIFICATIONS ENDPOINTS =====
+@api.route('/notifications', methods=['GET'])
+@login_required
+def get_notifications():
+    """Уведомления текущего пользователя, новые первыми (?unread=1 — только непрочитанные)"""
+    query = Notification.query.filter_by(user_id=current_user.id)
+    if request.args.get('unread', type=int):
+        query = query.filter(Notification.read_at.is_(None))
+    limit = min(max(request.args.get('limit', 50, type=int), 1), 200)
+    
+    return jsonify([{
+        'id': n.id,
+        'kind': n.kind,
+        'title': n.title,
+        'message': n.message,
+        'area_id': n.area_id,
+        'check_id': n.check_id,
+        'created_at': n.created_at.isoformat(),
+        'read': n.read_at is not None
+    } for n in query.order_by(desc(Notification.created_at), desc(Notification.id)).limit(limit)])
+
+@api.route('/notifications/<int:notification_id>/read', methods=['POST'])
+@login_required
+def mark_notification_read(notification_id):
+    """Отметить уведомление прочитанным"""
+    notification = Notification.query.filter_by(id=notification_id, user_id=current_user.id).first()
+    if notification is None:
+        return jsonify({'message': 'Уведомление не найдено'}), 404
+    if notification.read_at is None:
+        notification.read_at = datetime.utcnow()
+        db.session.commit()
+    return jsonify({'message': 'Уведомление прочитано'})
+
 # ===== USERS ENDPOINTS =====
 @api.route('/users', methods=['GET'])
 @role_required('admin')
@@ -209,35 +514,65 @@ def get_users():
 @api.route('/dashboard/stats', methods=['GET'])
 @login_required
 def get_dashboard_stats():
-    """Получить статистику для дашборда"""
-    total_areas = Area.query.filter_by(is_active=True).count()
-    total_checks = Check.query.count()
-    total_audits = Audit.query.count()
-    
-    # Последние проверки
-    recent_checks = Check.query.order_by(desc(Check.checked_at)).limit(5).all()
-    
-    # Статистика по отделам
-    department_stats = db.session.query(
-        Area.department,
-        func.count(Area.id),
-        func.avg(Check.total_score)
-    ).join(Check).group_by(Area.department).all()
-    
-    return jsonify({
-        'total_areas': total_areas,
-        'total_checks': total_checks,
-        'total_audits': total_audits,
-        'recent_checks': [{
-            'id': check.id,
-            'area_name': check.area.name,
-            'user': check.user.username,
-            'score': check.total_score,
-            'checked_at': check.checked_at.isoformat()
-        } for check in recent_checks],
-        'department_stats': [{
-            'department': dept,
-            'area_count': count,
-            'avg_score': round(avg_score or 0, 2)
-        } for dept, count, avg_score in department_stats]
-    })
\ No newline at end of file
+    """Получить статистику для дашборда (кэшируется, сбрасывается при записи)"""
+    return jsonify(cache.get_or_set(DASHBOARD_STATS_KEY, dashboard_stats))
+
+@api.route('/analytics/trends', methods=['GET'])
+@login_required
+def get_trends():
+    """
+    Динамика средней оценки и доли выполнения каждого S по периодам
+    Параметры: bucket (day, week, month), group_by (area, department),
+    area_id, department, since, until. Данные дневные, поэтому границы
+    расширяются до целых дней: день, частично попавший в период, входит целиком
+    (until=2024-05-10T12:00 включает 10 мая, until=2024-05-10 — нет).
+    """
+    try:
+        since = _parse_datetime_arg('since')
+        until = _parse_datetime_arg('until')
+        if until is not None and until != datetime.combine(until.date(), datetime.min.time()):
+            until += timedelta(days=1)
+        return jsonify(analytics.trends(
+            bucket=request.args.get('bucket', 'week'),
+            group_by=request.args.get('group_by', 'area'),
+            area_id=request.args.get('area_id', type=int),
+            department=request.args.get('department'),
+            since=since.date() if since else None,
+            until=until.date() if until else None
+        ))
+    except ValueError as e:
+        return jsonify({'message': str(e)}), 400
+
+@api.route('/leaderboard', methods=['GET'])
+@login_required
+def get_leaderboard():
+    """
+    Рейтинг по средней оценке проверок за скользящее окно
+    Параметры: scope (area, department), limit
+    """
+    scope = request.args.get('scope', 'area')
+    if scope not in LEADERBOARD_SCOPES:
+        return jsonify({'message': 'scope: area или department'}), 400
+    limit = min(max(request.args.get('limit', 10, type=int), 1), LEADERBOARD_MAX_LIMIT)
+    return jsonify(leaderboard.top(scope, limit))
+
+@api.route('/leaderboard/areas/<int:area_id>', methods=['GET'])
+@login_required
+def get_area_rank(area_id):
+    """Место участка в рейтинге"""
+    entry = leaderboard.position('area', area_id)
+    if entry is None:
+        return jsonify({'message': 'У участка нет проверок за период рейтинга'}), 404
+    return jsonify(entry)
+
+@api.route('/jobs/stats', methods=['GET'])
+@role_required('admin')
+def get_job_stats():
+    """Очереди фоновых заданий: статусы, задержка и пропускная способность"""
+    return jsonify(jobs.stats())
+
+@api.route('/cache/stats', methods=['GET'])
+@role_required('admin')
+def get_cache_stats():
+    """Счетчики попаданий и промахов кэша"""
+    return jsonify(cache.stats())
@@ -1,28 +1,68 @@
 from flask import Blueprint, request, jsonify, current_app
 from flask_login import login_user, logout_user, login_required, current_user
 from sqlalchemy import or_
-from app import db
+from app import database, db, login_manager, passwords, tokens
+from app.passwords import hashing_pool, login_throttle
 from app.models import User
+from app.user_cache import user_cache
 
 auth = Blueprint('auth', __name__)
 
+@login_manager.user_loader
+def load_user(user_id):
+    """Загрузка пользователя для Flask-Login (через кэш, без запроса к users_5s)"""
+    # Не с реплики: отставшая копия строки попала бы в кэш пользователей
+    with database.use_primary():
+        return user_cache.load(int(user_id))
+
+@login_manager.request_loader
+def load_user_from_request(req):
+    """Bearer-токены для блюпринта api: пользователь берется из claims токена"""
+    with database.use_primary():
+        return tokens.load_user_from_request(req)
+
+@login_manager.unauthorized_handler
+def unauthorized():
+    """API-клиентам нужен 401, а не перенаправление на форму входа"""
+    return jsonify({'message': 'Требуется авторизация'}), 401
+
 @auth.route('/login', methods=['POST'])
 def login():
     """Аутентификация пользователя"""
-    data = request.get_json()
+    data = request.get_json(silent=True)
     
-    if not data or not data.get('username') or not data.get('password'):
+    if not isinstance(data, dict) or not data.get('username') or not data.get('password'):
         return jsonify({'message': 'Требуется имя пользователя и пароль'}), 400
+    if not isinstance(data['username'], str) or not isinstance(data['password'], str):
+        return jsonify({'message': 'Имя пользователя и пароль должны быть строками'}), 400
+    
+    ip = request.remote_addr or 'unknown'
+    retry_after = login_throttle.retry_after(data['username'], ip)
+    if retry_after:
+        response = jsonify({'message': 'Слишком много попыток входа, повторите позже'})
+        response.headers['Retry-After'] = str(retry_after)
+        return response, 429
     
     # Поиск пользователя по username или email
     user = User.query.filter(
         or_(User.username == data['username'], User.email == data['username'])
     ).first()
     
-    if user and user.check_password(data['password']):
+    # PBKDF2 считается в ограниченном пуле, а не в потоке запроса
+    try:
+        password_ok = passwords.verify_password(user.password_hash if user else None, data['password'])
+        if password_ok and passwords.needs_rehash(user.password_hash):
+            user.password_hash = passwords.rehash_in_pool(data['password'])
+    except passwords.HashingBusy as e:
+        response = jsonify({'message': str(e)})
+        response.headers['Retry-After'] = '1'
+        return response, 503
+    
+    if password_ok:
         if not user.is_active:
             return jsonify({'message': 'Аккаунт деактивирован'}), 403
         
+        login_throttle.success(data['username'])
         login_user(user, remember=data.get('remember', False))
         user.last_login = db.func.now()
         db.session.commit()
@@ -37,11 +77,62 @@ def login():
                 'role_display': user.get_role_display(),
                 'department': user.department,
                 'position': user.position
-            }
+            },
+            'tokens': tokens.issue_pair(user)
         }), 200
     
+    login_throttle.failure(data['username'], ip)
     return jsonify({'message': 'Неверное имя пользователя или пароль'}), 401
 
+@auth.route('/token/refresh', methods=['POST'])
+def refresh_token():
+    """Обменять refresh-токен на новую пару токенов (старый refresh отзывается)"""
+    data = request.get_json(silent=True) or {}
+    
+    try:
+        claims = tokens.decode(data.get('refresh_token') or '', tokens.REFRESH)
+    except tokens.TokenError as e:
+        return jsonify({'message': str(e)}), 401
+    
+    # Отзыв — проверка и запись одним шагом: параллельный обмен того же токена получит 401
+    if not tokens.revocation_list.revoke(claims['jti'], claims['exp']):
+        return jsonify({'message': 'Токен отозван'}), 401
+    
+    user = user_cache.load(claims['uid'])
+    if user is None or not user.is_active:
+        return jsonify({'message': 'Аккаунт деактивирован'}), 401
+    
+    return jsonify(tokens.issue_pair(user))
+
+@auth.route('/token/revoke', methods=['POST'])
+def revoke_token():
+    """Отозвать access-токен из заголовка Authorization и/или refresh-токен из тела"""
+    data = request.get_json(silent=True) or {}
+    candidates = [(tokens.bearer_token(), tokens.ACCESS), (data.get('refresh_token'), tokens.REFRESH)]
+    
+    revoked = 0
+    for token, kind in candidates:
+        if not token:
+            continue
+        try:
+            claims = tokens.decode(token, kind)
+        except tokens.TokenError:
+            continue
+        tokens.revocation_list.revoke(claims['jti'], claims['exp'])
+        revoked += 1
+    
+    if not revoked:
+        return jsonify({'message': 'Действительные токены не переданы'}), 400
+    return jsonify({'message': 'Токены отозваны', 'revoked': revoked})
+
+@auth.route('/hashing/stats', methods=['GET'])
+@login_required
+def get_hashing_stats():
+    """Метрики пула хеширования паролей (только для админов)"""
+    if not current_user.has_role('admin'):
+        return jsonify({'message': 'Недостаточно прав'}), 403
+    return jsonify(hashing_pool.stats())
+
 @auth.route('/logout', methods=['POST'])
 @login_required
 def logout():
@@ -147,10 +238,15 @@ def change_password():
     if not data.get('current_password') or not data.get('new_password'):
         return jsonify({'message': 'Требуется текущий и новый пароль'}), 400
     
-    if not current_user.check_password(data['current_password']):
-        return jsonify({'message': 'Неверный текущий пароль'}), 400
+    try:
+        if not passwords.verify_password(current_user.password_hash, data['current_password']):
+            return jsonify({'message': 'Неверный текущий пароль'}), 400
+        current_user.password_hash = passwords.rehash_in_pool(data['new_password'])
+    except passwords.HashingBusy as e:
+        response = jsonify({'message': str(e)})
+        response.headers['Retry-After'] = '1'
+        return response, 503
     
-    current_user.set_password(data['new_password'])
     db.session.commit()
     
     return jsonify({'message': 'Пароль изменен успешно'})
\ No newline at end of file
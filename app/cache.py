@@ -0,0 +1,171 @@
+"""
+Кэш вычисляемых данных (статистика дашборда и т.п.) с TTL и явной инвалидацией.
+
+Бэкенды:
+- LRUCacheBackend — в памяти процесса, ограниченный по числу записей;
+- SharedCacheBackend — общий для процессов/серверов, поверх клиента с интерфейсом
+  redis-py (get/set(ex=, nx=)/delete/incr), сам клиент передается приложением.
+"""
+import json
+import threading
+import time
+from collections import OrderedDict
+
+DASHBOARD_STATS_KEY = 'dashboard:stats'
+
+
+class LRUCacheBackend:
+    """Кэш в памяти процесса: LRU-вытеснение и срок жизни записей"""
+
+    def __init__(self, max_entries=256, clock=time.monotonic):
+        self.max_entries = max_entries
+        self._clock = clock
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            item = self._data.get(key)
+            if item is None:
+                return None
+            value, expires_at = item
+            if expires_at is not None and expires_at <= self._clock():
+                del self._data[key]
+                return None
+            self._data.move_to_end(key)
+            return value
+
+    def set(self, key, value, ttl=None):
+        with self._lock:
+            self._store(key, value, ttl)
+
+    def add(self, key, value, ttl=None):
+        """Записывает значение, только если ключа нет; True, если записано"""
+        with self._lock:
+            item = self._data.get(key)
+            if item is not None and (item[1] is None or item[1] > self._clock()):
+                return False
+            self._store(key, value, ttl)
+            return True
+
+    def _store(self, key, value, ttl):
+        self._data[key] = (value, self._clock() + ttl if ttl else None)
+        self._data.move_to_end(key)
+        while len(self._data) > self.max_entries:
+            self._data.popitem(last=False)
+
+    def delete(self, key):
+        with self._lock:
+            self._data.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+
+class SharedCacheBackend:
+    """
+    Общий кэш поверх клиента с интерфейсом redis-py; значения хранятся в JSON.
+
+    Ключи включают номер поколения из счетчика <prefix>generation: clear()
+    увеличивает его, и все процессы перестают видеть прежние записи, а те
+    удаляются сервером по TTL. Поэтому кэшу и списку отзыва токенов нужны
+    разные prefix: очистка кэша не должна возвращать отозванные токены.
+    """
+
+    def __init__(self, client, prefix='5s:'):
+        self.client = client
+        self.prefix = prefix
+
+    def _key(self, key):
+        generation = int(self.client.get(self.prefix + 'generation') or 0)
+        if not generation:
+            return self.prefix + key
+        return f'{self.prefix}g{generation}:{key}'
+
+    def get(self, key):
+        raw = self.client.get(self._key(key))
+        return json.loads(raw) if raw is not None else None
+
+    def set(self, key, value, ttl=None):
+        self.client.set(self._key(key), json.dumps(value), ex=int(ttl) if ttl else None)
+
+    def add(self, key, value, ttl=None):
+        """SET NX: записывает значение, только если ключа нет; True, если записано"""
+        return bool(self.client.set(self._key(key), json.dumps(value), ex=int(ttl) if ttl else None, nx=True))
+
+    def delete(self, key):
+        self.client.delete(self._key(key))
+
+    def clear(self):
+        self.client.incr(self.prefix + 'generation')
+
+
+class Cache:
+    """Расширение Flask: кэш с TTL, инвалидацией и счетчиками попаданий"""
+
+    def __init__(self, app=None):
+        self.backend = LRUCacheBackend()
+        self.default_ttl = 30
+        self.hits = 0
+        self.misses = 0
+        self.invalidations = 0
+        self._lock = threading.Lock()
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        app.config.setdefault('CACHE_BACKEND', None)
+        app.config.setdefault('CACHE_DEFAULT_TTL', 30)
+        app.config.setdefault('CACHE_MAX_ENTRIES', 256)
+
+        self.backend = app.config['CACHE_BACKEND'] or LRUCacheBackend(app.config['CACHE_MAX_ENTRIES'])
+        self.default_ttl = app.config['CACHE_DEFAULT_TTL']
+        self.reset_stats()
+        app.extensions['cache'] = self
+
+    def get_or_set(self, key, compute, ttl=None):
+        """Значение из кэша или результат compute(), сохраненный на ttl секунд"""
+        value = self.backend.get(key)
+        if value is not None:
+            self._count('hits')
+            return value
+
+        self._count('misses')
+        value = compute()
+        self.backend.set(key, value, ttl or self.default_ttl)
+        return value
+
+    def invalidate(self, *keys):
+        for key in keys:
+            self.backend.delete(key)
+        self._count('invalidations')
+
+    def clear(self):
+        self.backend.clear()
+
+    def reset_stats(self):
+        with self._lock:
+            self.hits = self.misses = self.invalidations = 0
+
+    def stats(self):
+        total = self.hits + self.misses
+        return {
+            'backend': type(self.backend).__name__,
+            'hits': self.hits,
+            'misses': self.misses,
+            'invalidations': self.invalidations,
+            'hit_ratio': round(self.hits / total, 4) if total else 0
+        }
+
+    def _count(self, name):
+        with self._lock:
+            setattr(self, name, getattr(self, name) + 1)
+
+
+def invalidate_dashboard():
+    """Сбрасывает кэш статистики после записи проверок, аудитов или участков"""
+    cache.invalidate(DASHBOARD_STATS_KEY)
+
+
+cache = Cache()
@@ -0,0 +1,244 @@
+"""
+Профили движка базы данных.
+
+- SQLite (файл): при каждом новом соединении выставляются прагмы
+  journal_mode=WAL (читатели не блокируют писателя), busy_timeout (писатель
+  ждет освобождения блокировки вместо мгновенной ошибки "database is locked"),
+  synchronous=NORMAL (в режиме WAL fsync выполняется только на контрольной точке)
+  и mmap_size (чтение страниц через отображение файла в память).
+- Серверные БД (PostgreSQL, MySQL): QueuePool заданного размера с проверкой
+  соединения перед выдачей (pre_ping) и пересозданием старых соединений (recycle).
+
+Параметры задаются в config.Config или переменными окружения FLASK_<ИМЯ>,
+например FLASK_DB_POOL_SIZE=20. Явно заданный SQLALCHEMY_ENGINE_OPTIONS имеет
+приоритет над профилем.
+
+Реплика для чтения (SQLALCHEMY_READ_REPLICA_URI) подключается отдельным движком.
+Блюпринт включает чтение с реплики для запроса (route_reads_to_replica), и тогда
+SELECT уходят на реплику, а запись и чтение внутри flush — на основную базу.
+Клиент, который только что записал данные, READ_REPLICA_STICKY_SECONDS читает
+с основной базы: отметка о записи хранится в cookie-сессии Flask, а для клиентов
+с Bearer-токеном — на сервере, в кэше приложения по хешу токена (при нескольких
+процессах нужен общий CACHE_BACKEND). Поэтому свои изменения видны сразу,
+несмотря на отставание реплики.
+
+Аутентификация (user_loader, request_loader) читает пользователя только с
+основной базы (use_primary): иначе деактивация или смена роли, еще не дошедшие
+до реплики, попали бы в кэш пользователей.
+"""
+import hashlib
+import os
+import time
+from contextlib import contextmanager
+from flask import current_app, g, has_app_context, has_request_context, request, session as http_session
+from flask_sqlalchemy.session import Session
+from sqlalchemy import create_engine, event
+from sqlalchemy.engine import make_url
+from app.cache import cache
+from app.tokens import bearer_token
+
+JOURNAL_MODES = {'DELETE', 'TRUNCATE', 'PERSIST', 'MEMORY', 'WAL', 'OFF'}
+SYNCHRONOUS_MODES = {'OFF', 'NORMAL', 'FULL', 'EXTRA'}
+
+REPLICA_BIND = 'replica'
+_WRITE_STAMP = '_db_write_at'
+
+
+def configure(app):
+    """Параметры пула для SQLALCHEMY_ENGINE_OPTIONS; вызывается до db.init_app"""
+    app.config.setdefault('DB_POOL_SIZE', 10)
+    app.config.setdefault('DB_MAX_OVERFLOW', 20)
+    app.config.setdefault('DB_POOL_TIMEOUT', 30)
+    app.config.setdefault('DB_POOL_RECYCLE', 1800)
+    app.config.setdefault('SQLITE_JOURNAL_MODE', 'WAL')
+    app.config.setdefault('SQLITE_SYNCHRONOUS', 'NORMAL')
+    app.config.setdefault('SQLITE_BUSY_TIMEOUT_MS', 5000)
+    app.config.setdefault('SQLITE_MMAP_SIZE', 256 * 1024 * 1024)
+    app.config.setdefault('SQLALCHEMY_READ_REPLICA_URI', None)
+    app.config.setdefault('READ_REPLICA_STICKY_SECONDS', 5)
+
+    options = engine_options(app.config['SQLALCHEMY_DATABASE_URI'], app.config)
+    options.update(app.config.get('SQLALCHEMY_ENGINE_OPTIONS') or {})
+    app.config['SQLALCHEMY_ENGINE_OPTIONS'] = options
+
+
+def init_app(app):
+    """Прагмы SQLite и движок реплики; вызывается после db.init_app"""
+    from app import db
+
+    with app.app_context():
+        engines = [db.engine]
+    replica_uri = app.config['SQLALCHEMY_READ_REPLICA_URI']
+    if replica_uri:
+        # Отдельный движок, а не bind Flask-SQLAlchemy: create_all/drop_all
+        # не должны трогать реплику, ее наполняет репликация
+        replica = create_engine(_resolve_sqlite_path(app, replica_uri), **engine_options(replica_uri, app.config))
+        app.extensions[REPLICA_BIND] = replica
+        engines.append(replica)
+
+    pragmas = sqlite_pragmas(app.config)
+    for engine in engines:
+        if is_sqlite_file(engine.url):
+            event.listen(engine, 'connect', _pragma_listener(pragmas))
+
+    @app.teardown_request
+    def stop_replica_reads(exc):
+        g.pop('db_read_replica', None)
+
+
+def is_sqlite_file(url):
+    url = make_url(url)
+    return url.get_backend_name() == 'sqlite' and url.database not in (None, '', ':memory:')
+
+
+def _resolve_sqlite_path(app, uri):
+    """Относительный путь SQLite — от instance_path, как у основной базы"""
+    url = make_url(uri)
+    if is_sqlite_file(url) and not os.path.isabs(url.database):
+        os.makedirs(app.instance_path, exist_ok=True)
+        url = url.set(database=os.path.join(app.instance_path, url.database))
+    return url
+
+
+def replica_engine():
+    """Движок реплики текущего приложения или None"""
+    return current_app.extensions.get(REPLICA_BIND)
+
+
+def engine_options(uri, config):
+    """Параметры create_engine для профиля базы"""
+    url = make_url(uri)
+    if url.get_backend_name() == 'sqlite':
+        if not is_sqlite_file(url):
+            # База в памяти: Flask-SQLAlchemy использует StaticPool с одним соединением
+            return {}
+        return {
+            'pool_size': config['DB_POOL_SIZE'],
+            'max_overflow': config['DB_MAX_OVERFLOW'],
+            'pool_timeout': config['DB_POOL_TIMEOUT'],
+            # Ожидание блокировки на уровне драйвера, в секундах
+            'connect_args': {'timeout': config['SQLITE_BUSY_TIMEOUT_MS'] / 1000},
+        }
+    return {
+        'pool_size': config['DB_POOL_SIZE'],
+        'max_overflow': config['DB_MAX_OVERFLOW'],
+        'pool_timeout': config['DB_POOL_TIMEOUT'],
+        'pool_recycle': config['DB_POOL_RECYCLE'],
+        'pool_pre_ping': True,
+    }
+
+
+def sqlite_pragmas(config):
+    """Список прагм SQLite в порядке применения"""
+    journal_mode = str(config['SQLITE_JOURNAL_MODE']).upper()
+    synchronous = str(config['SQLITE_SYNCHRONOUS']).upper()
+    if journal_mode not in JOURNAL_MODES:
+        raise ValueError(f'Неизвестный SQLITE_JOURNAL_MODE: {journal_mode}')
+    if synchronous not in SYNCHRONOUS_MODES:
+        raise ValueError(f'Неизвестный SQLITE_SYNCHRONOUS: {synchronous}')
+    return [
+        f'PRAGMA busy_timeout = {int(config["SQLITE_BUSY_TIMEOUT_MS"])}',
+        f'PRAGMA journal_mode = {journal_mode}',
+        f'PRAGMA synchronous = {synchronous}',
+        f'PRAGMA mmap_size = {int(config["SQLITE_MMAP_SIZE"])}',
+    ]
+
+
+def _pragma_listener(pragmas):
+    def set_pragmas(dbapi_connection, connection_record):
+        cursor = dbapi_connection.cursor()
+        try:
+            for pragma in pragmas:
+                cursor.execute(pragma)
+        finally:
+            cursor.close()
+    return set_pragmas
+
+
+# ===== Реплика для чтения =====
+
+class RoutingSession(Session):
+    """Сессия, отправляющая SELECT на реплику, когда это разрешено для запроса"""
+
+    def get_bind(self, mapper=None, clause=None, bind=None, **kwargs):
+        if (bind is None and has_app_context() and g.get('db_read_replica')
+                and not g.get('db_primary_only')
+                and getattr(clause, 'is_select', False)
+                and not self._flushing and not self.info.get('db_wrote')):
+            replica = replica_engine()
+            if replica is not None:
+                return replica
+        return super().get_bind(mapper=mapper, clause=clause, bind=bind, **kwargs)
+
+
+@contextmanager
+def use_primary():
+    """Чтение внутри блока идет с основной базы, даже если запрос читает с реплики"""
+    if not has_app_context():
+        yield
+        return
+    previous = g.get('db_primary_only', False)
+    g.db_primary_only = True
+    try:
+        yield
+    finally:
+        g.db_primary_only = previous
+
+
+def _bearer_write_key():
+    """Ключ серверной отметки о записи для клиента с Bearer-токеном"""
+    token = bearer_token()
+    if token is None:
+        return None
+    return 'db_write:' + hashlib.sha256(token.encode()).hexdigest()
+
+
+def _written_at():
+    written_at = http_session.get(_WRITE_STAMP)
+    key = _bearer_write_key()
+    if key is not None:
+        written_at = max(written_at or 0, cache.backend.get(key) or 0)
+    return written_at
+
+
+def route_reads_to_replica():
+    """before_request: чтение GET-запроса с реплики, если клиент недавно не писал"""
+    if request.method not in ('GET', 'HEAD') or not current_app.config['SQLALCHEMY_READ_REPLICA_URI']:
+        return
+    written_at = _written_at()
+    if written_at and time.time() - written_at < current_app.config['READ_REPLICA_STICKY_SECONDS']:
+        return
+    g.db_read_replica = True
+
+
+@event.listens_for(RoutingSession, 'after_flush')
+def _remember_flush(session, flush_context):
+    session.info['db_wrote'] = True
+
+
+@event.listens_for(RoutingSession, 'do_orm_execute')
+def _remember_bulk_write(orm_execute_state):
+    if orm_execute_state.is_insert or orm_execute_state.is_update or orm_execute_state.is_delete:
+        orm_execute_state.session.info['db_wrote'] = True
+
+
+@event.listens_for(RoutingSession, 'after_commit')
+def _stamp_write(session):
+    if not session.info.pop('db_wrote', False) or not has_request_context():
+        return
+    if not current_app.config['SQLALCHEMY_READ_REPLICA_URI']:
+        return
+    # Дальнейшие запросы этого клиента читают с основной базы
+    now = time.time()
+    key = _bearer_write_key()
+    if key is not None:
+        # Клиент с Bearer-токеном не хранит cookie: отметка только на сервере
+        cache.backend.set(key, now, max(int(current_app.config['READ_REPLICA_STICKY_SECONDS']), 1))
+    else:
+        http_session[_WRITE_STAMP] = now
+    g.pop('db_read_replica', None)
+
+
+@event.listens_for(RoutingSession, 'after_rollback')
+def _forget_write(session):
+    session.info.pop('db_wrote', None)
@@ -0,0 +1,190 @@
+"""
+Поток событий для живых дашбордов (Server-Sent Events, GET /api/stream).
+
+Новые проверки, аудиты и изменения показателей участков публикуются во
+внутрипроцессный хаб после фиксации транзакции. Хаб хранит кольцевой буфер
+последних событий: все подключенные клиенты ждут на одном условии и читают
+общий буфер, поэтому событие рассылается один раз, без пересчета сводок на
+каждый экран.
+
+Идентификатор события — «эпоха процесса-номер». Клиент, переподключившийся
+с Last-Event-ID, получает пропущенные события из буфера; если буфер уже
+сдвинулся или процесс перезапущен, приходит событие reset, и клиент один раз
+перечитывает данные через REST.
+"""
+import json
+import threading
+import time
+import uuid
+from collections import deque, namedtuple
+from itertools import islice
+
+from sqlalchemy import cast, event, func
+from app import db
+from app.models import AreaScoreRollup as Rollup
+
+Event = namedtuple('Event', 'seq type data')
+
+
+class EventHub:
+    """Публикация событий и ожидание новых событий подписчиками"""
+
+    def __init__(self, history=1000):
+        self._cond = threading.Condition()
+        self._history = deque(maxlen=history)
+        self._seq = 0
+        self.epoch = uuid.uuid4().hex[:8]
+        self.subscribers = 0
+
+    def init_app(self, app):
+        app.config.setdefault('EVENTS_HISTORY_SIZE', 1000)
+        app.config.setdefault('EVENTS_HEARTBEAT_SECONDS', 15)
+        # Соединение закрывается периодически, браузер переподключается с Last-Event-ID
+        app.config.setdefault('EVENTS_STREAM_MAX_SECONDS', 300)
+        app.config.setdefault('EVENTS_RETRY_MS', 3000)
+        # Каждый поток занимает рабочий поток сервера
+        app.config.setdefault('EVENTS_MAX_SUBSCRIBERS', 100)
+        with self._cond:
+            self._history = deque(self._history, maxlen=app.config['EVENTS_HISTORY_SIZE'])
+        app.extensions['events'] = self
+
+    def event_id(self, seq):
+        return f'{self.epoch}-{seq}'
+
+    @property
+    def last_seq(self):
+        return self._seq
+
+    def publish(self, type, data):
+        with self._cond:
+            self._seq += 1
+            self._history.append(Event(self._seq, type, data))
+            self._cond.notify_all()
+            return self._seq
+
+    def resume_point(self, last_event_id=None):
+        """
+        Номер, после которого клиенту нужны события, и признак разрыва:
+        True, если пропущенные события восстановить нельзя.
+        """
+        current = self._seq
+        if not last_event_id:
+            return current, False
+        epoch, _, seq = last_event_id.partition('-')
+        if epoch != self.epoch or not seq.isdigit() or int(seq) > current:
+            return current, True
+        return self._after(int(seq))
+
+    def _after(self, seq):
+        with self._cond:
+            oldest = self._history[0].seq if self._history else self._seq + 1
+            if seq < oldest - 1:
+                return self._seq, True
+            return seq, False
+
+    def wait(self, seq, timeout):
+        """
+        События с номером больше seq; ждет не дольше timeout секунд.
+        Возвращает (события, признак разрыва).
+        """
+        with self._cond:
+            self._cond.wait_for(lambda: self._seq > seq, timeout)
+            if not self._history or self._seq <= seq:
+                return [], False
+            oldest = self._history[0].seq
+            if seq < oldest - 1:
+                return [], True
+            return list(islice(self._history, seq - oldest + 1, None)), False
+
+    # ===== Формат text/event-stream =====
+
+    def format(self, seq, type, data):
+        payload = json.dumps(data, ensure_ascii=False, default=str)
+        return f'id: {self.event_id(seq)}\nevent: {type}\ndata: {payload}\n\n'
+
+    def subscribe(self, limit):
+        """Занимает место подписчика, если их меньше limit (проверка и счетчик под одной блокировкой)"""
+        with self._cond:
+            if self.subscribers >= limit:
+                return False
+            self.subscribers += 1
+            return True
+
+    def unsubscribe(self):
+        with self._cond:
+            self.subscribers -= 1
+
+    def stream(self, last_event_id=None, heartbeat=15, max_seconds=300, retry_ms=3000):
+        """
+        Генератор ответа: пропущенные события, новые события и heartbeat-комментарии.
+        Место подписчика занимает и освобождает вызывающий (subscribe/unsubscribe).
+        """
+        seq, gap = self.resume_point(last_event_id)
+        deadline = time.monotonic() + max_seconds
+        yield f'retry: {retry_ms}\n\n'
+        while True:
+            if gap:
+                seq = self._seq
+                yield self.format(seq, 'reset', {})
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                return
+            events, gap = self.wait(seq, min(heartbeat, remaining))
+            if not events and not gap:
+                # Комментарий держит соединение через прокси и выявляет отключившихся клиентов
+                yield ': heartbeat\n\n'
+            for item in events:
+                seq = item.seq
+                yield self.format(*item)
+
+
+hub = EventHub()
+
+
+# ===== Публикация после фиксации транзакции =====
+
+def record(type, data, areas=()):
+    """
+    Ставит событие в очередь публикации; areas — участки, чьи показатели
+    изменились. Публикация выполняется только после фиксации транзакции.
+    """
+    pending = db.session.info.setdefault('events_pending', {'events': [], 'areas': set()})
+    pending['events'].append((type, data))
+    pending['areas'].update(areas)
+
+
+def _area_scores(area_ids):
+    """Текущие показатели участков внутри фиксируемой транзакции (один запрос)"""
+    average = cast(Rollup.score_sum, db.Float) / func.nullif(Rollup.check_count, 0)
+    rows = db.session.query(
+        Rollup.area_id, Rollup.check_count, average, Rollup.last_check_at,
+        Rollup.audit_count, Rollup.last_audit_grade
+    ).filter(Rollup.area_id.in_(sorted(area_ids)))
+    return [{
+        'area_id': area_id,
+        'check_count': check_count,
+        'average_score': round(average or 0, 2),
+        'last_check': last_check_at.isoformat() if last_check_at else None,
+        'audit_count': audit_count,
+        'last_audit_grade': last_grade
+    } for area_id, check_count, average, last_check_at, audit_count, last_grade in rows]
+
+
+@event.listens_for(db.session, 'before_commit')
+def _collect_scores(session):
+    pending = session.info.get('events_pending')
+    if pending and pending['areas']:
+        pending['events'].extend(('area_score', score) for score in _area_scores(pending['areas']))
+        pending['areas'].clear()
+
+
+@event.listens_for(db.session, 'after_commit')
+def _publish_pending(session):
+    pending = session.info.pop('events_pending', None)
+    for type, data in pending['events'] if pending else ():
+        hub.publish(type, data)
+
+
+@event.listens_for(db.session, 'after_rollback')
+def _drop_pending(session):
+    session.info.pop('events_pending', None)
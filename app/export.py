@@ -0,0 +1,244 @@
+"""
+Потоковая выгрузка проверок и аудитов в CSV и XLSX.
+
+Строки читаются серверным курсором порциями (yield_per), а файл формируется
+генератором по мере чтения: в памяти держится одна порция строк, размер
+выгрузки ограничен только диском клиента.
+
+XLSX пишется без сторонних библиотек: книга — это zip-архив с XML, лист
+записывается построчно в поток архива (строки inline, без таблицы общих
+строк), поэтому память тоже не растет с числом строк.
+"""
+import csv
+import io
+import re
+import zipfile
+from xml.sax.saxutils import escape
+
+from sqlalchemy import select
+from app import db, scoring
+from app.models import Area5S as Area, Audit5S as Audit, Check5S as Check, User
+
+EXPORT_BATCH_SIZE = 1000
+FORMATS = {
+    'csv': 'text/csv; charset=utf-8',
+    'xlsx': 'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet',
+}
+
+S_TITLES = ('Сортировка', 'Соблюдение порядка', 'Содержание в чистоте', 'Стандартизация', 'Совершенствование')
+
+CHECK_HEADERS = ('ID', 'Дата проверки', 'Участок', 'Отдел', 'Проверяющий', *S_TITLES, 'Оценка', 'Примечания')
+AUDIT_HEADERS = ('ID', 'Дата аудита', 'Участок', 'Отдел', 'Аудитор', *S_TITLES,
+                 'Общая оценка', 'Класс', 'Комментарии', 'Рекомендации', 'Следующий аудит')
+
+
+class ExportError(ValueError):
+    """Некорректные параметры выгрузки"""
+
+
+def checks_query(area_id=None, department=None, since=None, until=None):
+    """Строки проверок по фильтрам в порядке даты"""
+    query = select(
+        Check.id, Check.checked_at, Area.name, Area.department, User.username,
+        *(getattr(Check, flag) for flag in scoring.CHECK_FLAGS),
+        Check.total_score, Check.notes
+    ).join(Area, Area.id == Check.area_id).outerjoin(User, User.id == Check.user_id)
+
+    if area_id is not None:
+        query = query.where(Check.area_id == area_id)
+    if department:
+        query = query.where(Area.department == department)
+    if since is not None:
+        query = query.where(Check.checked_at >= since)
+    if until is not None:
+        query = query.where(Check.checked_at < until)
+    return query.order_by(Check.checked_at, Check.id)
+
+
+def audits_query(area_id=None, department=None, since=None, until=None):
+    """Строки аудитов по фильтрам в порядке даты"""
+    query = select(
+        Audit.id, Audit.audit_date, Area.name, Area.department, User.username,
+        *(getattr(Audit, field) for field in scoring.AUDIT_FIELDS),
+        Audit.total_score, Audit.comments, Audit.recommendations, Audit.next_audit_date
+    ).join(Area, Area.id == Audit.area_id).outerjoin(User, User.id == Audit.auditor_id)
+
+    if area_id is not None:
+        query = query.where(Audit.area_id == area_id)
+    if department:
+        query = query.where(Area.department == department)
+    if since is not None:
+        query = query.where(Audit.audit_date >= since)
+    if until is not None:
+        query = query.where(Audit.audit_date < until)
+    return query.order_by(Audit.audit_date, Audit.id)
+
+
+def _stream_rows(query):
+    """Строки запроса порциями через серверный курсор"""
+    result = db.session.execute(query.execution_options(yield_per=EXPORT_BATCH_SIZE))
+    for partition in result.partitions():
+        yield partition
+
+
+def check_rows(**filters):
+    for partition in _stream_rows(checks_query(**filters)):
+        yield [tuple(row) for row in partition]
+
+
+def audit_rows(**filters):
+    """Строки аудитов; класс считается по порогам отдела участка"""
+    grade_index = 5 + len(scoring.AUDIT_FIELDS)
+    for partition in _stream_rows(audits_query(**filters)):
+        batch = []
+        for row in partition:
+            values = list(row)
+            department = values[3]
+            values.insert(grade_index + 1, scoring.grade_for(values[grade_index] or 0, department))
+            batch.append(tuple(values))
+        yield batch
+
+
+def _format_value(value):
+    if value is None:
+        return ''
+    if hasattr(value, 'isoformat'):
+        return value.isoformat(sep=' ', timespec='seconds')
+    if isinstance(value, bool):
+        return 'да' if value else 'нет'
+    return value
+
+
+def _csv_value(value):
+    value = _format_value(value)
+    # Текст, начинающийся как формула, Excel не должен вычислять
+    if isinstance(value, str) and value[:1] in ('=', '+', '-', '@'):
+        return "'" + value
+    return value
+
+
+def write_csv(headers, batches):
+    """Генератор CSV (UTF-8 с BOM, чтобы Excel распознал кириллицу)"""
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    buffer.write('\ufeff')
+    writer.writerow(headers)
+    for batch in batches:
+        writer.writerows([_csv_value(value) for value in row] for row in batch)
+        yield buffer.getvalue().encode('utf-8')
+        buffer.seek(0)
+        buffer.truncate()
+    yield buffer.getvalue().encode('utf-8')
+
+
+# ===== XLSX =====
+
+_CONTENT_TYPES = (
+    '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+    '<Types xmlns="http://schemas.openxmlformats.org/package/2006/content-types">'
+    '<Default Extension="rels" ContentType="application/vnd.openxmlformats-package.relationships+xml"/>'
+    '<Default Extension="xml" ContentType="application/xml"/>'
+    '<Override PartName="/xl/workbook.xml" '
+    'ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet.main+xml"/>'
+    '<Override PartName="/xl/worksheets/sheet1.xml" '
+    'ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.worksheet+xml"/>'
+    '</Types>'
+)
+_ROOT_RELS = (
+    '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+    '<Relationships xmlns="http://schemas.openxmlformats.org/package/2006/relationships">'
+    '<Relationship Id="rId1" '
+    'Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/officeDocument" '
+    'Target="xl/workbook.xml"/>'
+    '</Relationships>'
+)
+_WORKBOOK = (
+    '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+    '<workbook xmlns="http://schemas.openxmlformats.org/spreadsheetml/2006/main" '
+    'xmlns:r="http://schemas.openxmlformats.org/officeDocument/2006/relationships">'
+    '<sheets><sheet name="{name}" sheetId="1" r:id="rId1"/></sheets>'
+    '</workbook>'
+)
+_WORKBOOK_RELS = (
+    '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+    '<Relationships xmlns="http://schemas.openxmlformats.org/package/2006/relationships">'
+    '<Relationship Id="rId1" '
+    'Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/worksheet" '
+    'Target="worksheets/sheet1.xml"/>'
+    '</Relationships>'
+)
+_SHEET_START = (
+    '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+    '<worksheet xmlns="http://schemas.openxmlformats.org/spreadsheetml/2006/main"><sheetData>'
+)
+_SHEET_END = '</sheetData></worksheet>'
+
+# Управляющие символы, недопустимые в XML 1.0
+_INVALID_XML_CHARS = re.compile('[\x00-\x08\x0b\x0c\x0e-\x1f]')
+
+
+class _ChunkSink:
+    """Файлоподобный приемник без seek: zipfile пишет в него, генератор забирает байты"""
+
+    def __init__(self):
+        self._chunks = []
+
+    def write(self, data):
+        self._chunks.append(bytes(data))
+        return len(data)
+
+    def flush(self):
+        pass
+
+    def drain(self):
+        data = b''.join(self._chunks)
+        self._chunks.clear()
+        return data
+
+
+def _xlsx_cell(value):
+    if value is None:
+        return '<c/>'
+    if isinstance(value, bool):
+        return f'<c t="b"><v>{int(value)}</v></c>'
+    if isinstance(value, (int, float)):
+        return f'<c><v>{value}</v></c>'
+    text = _INVALID_XML_CHARS.sub('', str(_format_value(value)))
+    return f'<c t="inlineStr"><is><t xml:space="preserve">{escape(text)}</t></is></c>'
+
+
+def _xlsx_row(values):
+    return '<row>' + ''.join(_xlsx_cell(value) for value in values) + '</row>'
+
+
+def write_xlsx(headers, batches, sheet_name='Лист1'):
+    """Генератор XLSX-книги с одним листом"""
+    sink = _ChunkSink()
+    with zipfile.ZipFile(sink, 'w', compression=zipfile.ZIP_DEFLATED) as archive:
+        archive.writestr('[Content_Types].xml', _CONTENT_TYPES)
+        archive.writestr('_rels/.rels', _ROOT_RELS)
+        archive.writestr('xl/workbook.xml', _WORKBOOK.format(name=escape(sheet_name, {'"': '&quot;'})))
+        archive.writestr('xl/_rels/workbook.xml.rels', _WORKBOOK_RELS)
+        with archive.open('xl/worksheets/sheet1.xml', 'w', force_zip64=True) as sheet:
+            sheet.write((_SHEET_START + _xlsx_row(headers)).encode('utf-8'))
+            for batch in batches:
+                sheet.write(''.join(_xlsx_row(row) for row in batch).encode('utf-8'))
+                yield sink.drain()
+            sheet.write(_SHEET_END.encode('utf-8'))
+    yield sink.drain()
+
+
+EXPORTS = {
+    'checks': (CHECK_HEADERS, check_rows, 'Проверки'),
+    'audits': (AUDIT_HEADERS, audit_rows, 'Аудиты'),
+}
+
+
+def export_stream(kind, file_format, **filters):
+    """Генератор байтов выгрузки kind ('checks' или 'audits') в формате csv/xlsx"""
+    if file_format not in FORMATS:
+        raise ExportError('Формат выгрузки: csv или xlsx')
+    headers, rows, sheet_name = EXPORTS[kind]
+    if file_format == 'csv':
+        return write_csv(headers, rows(**filters))
+    return write_xlsx(headers, rows(**filters), sheet_name)
@@ -0,0 +1,159 @@
+"""
+Пакетная загрузка проверок 5С с планшетов, работавших офлайн.
+
+Пакет проверяется целиком (обязательные поля, существование участков и фото,
+повторы client_uuid — по одному запросу на весь пакет), затем новые проверки вставляются
+одним executemany в одной транзакции. Повторная отправка того же пакета
+не создает дубликатов: проверки с известным client_uuid возвращаются как 'duplicate'.
+"""
+import uuid
+from datetime import datetime, timezone
+from sqlalchemy import insert
+from sqlalchemy.exc import IntegrityError
+from app import db, notifications, rollup, scoring
+from app.models import Area5S as Area, Check5S as Check, Photo5S as Photo
+
+BATCH_MAX_SIZE = 500
+
+S_FLAGS = scoring.CHECK_FLAGS
+REQUIRED_FIELDS = ('client_uuid', 'area_id') + S_FLAGS
+
+
+def _normalize_uuid(value):
+    try:
+        return str(uuid.UUID(str(value)))
+    except ValueError:
+        return None
+
+
+def _parse_checked_at(value, now):
+    if value is None:
+        return now
+    try:
+        checked_at = datetime.fromisoformat(value)
+    except (TypeError, ValueError):
+        return None
+    # Храним naive UTC, как и default=datetime.utcnow
+    if checked_at.tzinfo is not None:
+        checked_at = checked_at.astimezone(timezone.utc).replace(tzinfo=None)
+    return checked_at
+
+
+def validate_batch(items, now):
+    """
+    Проверяет пакет. Возвращает (результаты по позициям, строки для вставки);
+    для ошибочных позиций результат уже заполнен, для валидных — None.
+    """
+    results = [None] * len(items)
+    rows = []
+
+    # Поэлементные проверки формата
+    for index, item in enumerate(items):
+        if not isinstance(item, dict):
+            results[index] = {'index': index, 'status': 'error', 'errors': ['Ожидается объект']}
+            continue
+
+        errors = [f'Отсутствует поле {field}' for field in REQUIRED_FIELDS if field not in item]
+        client_uuid = _normalize_uuid(item.get('client_uuid')) if 'client_uuid' in item else None
+        if 'client_uuid' in item and client_uuid is None:
+            errors.append('Некорректный client_uuid')
+        checked_at = _parse_checked_at(item.get('checked_at'), now)
+        if checked_at is None:
+            errors.append('Некорректная дата checked_at')
+        if not isinstance(item.get('area_id', 0), int):
+            errors.append('Некорректный area_id')
+        photo_refs = item.get('photos') or []
+        if not isinstance(photo_refs, list) or not all(isinstance(ref, str) for ref in photo_refs):
+            errors.append('photos должен быть списком id загруженных фото')
+
+        if errors:
+            results[index] = {'index': index, 'client_uuid': item.get('client_uuid'),
+                              'status': 'error', 'errors': errors}
+            continue
+
+        row = {
+            'client_uuid': client_uuid,
+            'area_id': item['area_id'],
+            'notes': item.get('notes'),
+            'photos': list(dict.fromkeys(ref.lower() for ref in photo_refs)),
+            'checked_at': checked_at,
+        }
+        row.update({flag: bool(item[flag]) for flag in S_FLAGS})
+        row['total_score'] = scoring.check_score(row[flag] for flag in S_FLAGS)
+        rows.append((index, row))
+
+    # Проверки по всему пакету сразу: участки и уже загруженные UUID
+    area_ids = {row['area_id'] for _, row in rows}
+    known_areas = {area_id for (area_id,) in db.session.query(Area.id).filter(
+        Area.id.in_(area_ids), Area.is_active == True  # noqa: E712
+    )} if area_ids else set()
+
+    uuids = [row['client_uuid'] for _, row in rows]
+    existing = dict(db.session.query(Check.client_uuid, Check.id).filter(
+        Check.client_uuid.in_(uuids)
+    )) if uuids else {}
+
+    refs = {ref for _, row in rows for ref in row['photos']}
+    known_photos = {photo_id for (photo_id,) in db.session.query(Photo.id).filter(
+        Photo.id.in_(refs)
+    )} if refs else set()
+
+    valid = []
+    seen = set()
+    for index, row in rows:
+        client_uuid = row['client_uuid']
+        if client_uuid in existing:
+            results[index] = {'index': index, 'client_uuid': client_uuid,
+                              'status': 'duplicate', 'id': existing[client_uuid]}
+        elif client_uuid in seen:
+            results[index] = {'index': index, 'client_uuid': client_uuid,
+                              'status': 'error', 'errors': ['Повтор client_uuid в пакете']}
+        elif row['area_id'] not in known_areas:
+            results[index] = {'index': index, 'client_uuid': client_uuid,
+                              'status': 'error', 'errors': ['Участок не найден']}
+        elif not known_photos.issuperset(row['photos']):
+            results[index] = {'index': index, 'client_uuid': client_uuid,
+                              'status': 'error', 'errors': ['Фото не найдены']}
+        else:
+            seen.add(client_uuid)
+            valid.append((index, row))
+
+    return results, valid
+
+
+def ingest_checks(items, user_id):
+    """
+    Загружает пакет проверок от имени пользователя.
+    Возвращает список результатов в порядке позиций пакета.
+    """
+    now = datetime.utcnow()
+
+    # Параллельная синхронизация того же пакета может успеть раньше:
+    # после конфликта уникальности пакет проверяется заново и дубликаты отсеиваются
+    for attempt in range(2):
+        results, valid = validate_batch(items, now)
+        rows = [dict(row, user_id=user_id) for _, row in valid]
+        if not rows:
+            return results
+
+        try:
+            # Список параметров -> cursor.executemany()
+            db.session.execute(insert(Check), rows)
+            inserted = dict(db.session.query(Check.client_uuid, Check.id).filter(
+                Check.client_uuid.in_([row['client_uuid'] for row in rows])
+            ))
+            rollup.apply_check_rows(rows)
+            notifications.notify_low_scores([
+                (inserted[row['client_uuid']], row['area_id'], user_id, row['total_score']) for row in rows
+            ])
+            db.session.commit()
+        except IntegrityError:
+            db.session.rollback()
+            if attempt:
+                raise
+            continue
+
+        for index, row in valid:
+            results[index] = {'index': index, 'client_uuid': row['client_uuid'], 'status': 'created',
+                              'id': inserted[row['client_uuid']], 'total_score': row['total_score']}
+        return results
@@ -0,0 +1,250 @@
+"""
+Метрики запросов по маршрутам и эндпоинт /metrics в текстовом формате Prometheus.
+
+Для каждого маршрута (шаблон URL и метод) собираются:
+- гистограмма длительности обработки (до возврата ответа; тело потоковых
+  ответов не входит);
+- число SQL-запросов и суммарное время SQL за запрос — через события
+  before/after_cursor_execute всех движков (основная база и реплика);
+- гистограмма размера ответа (потоковые ответы без Content-Length пропускаются);
+- счетчик подозрений на N+1: один и тот же шаблон SQL за запрос выполнен
+  больше METRICS_N_PLUS_ONE_THRESHOLD раз. Такой запрос пишется в лог
+  предупреждением с маршрутом и текстом SQL.
+
+Метрики хранятся в памяти процесса: при нескольких процессах каждый
+отдает свои значения, суммирует их Prometheus.
+
+Доступ к /metrics: с METRICS_TOKEN нужен заголовок Authorization: Bearer
+<токен>. Без токена эндпоинт открыт только при METRICS_PUBLIC (по умолчанию —
+в режимах debug и testing), иначе отвечает 404: маршруты, объем трафика и
+время SQL не должны быть видны снаружи.
+"""
+import hmac
+import re
+import threading
+import time
+from bisect import bisect_left
+from collections import Counter
+
+from flask import Response, abort, current_app, g, has_request_context, request
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+DURATION_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+STATEMENT_BUCKETS = (0, 1, 2, 5, 10, 20, 50, 100, 250)
+SIZE_BUCKETS = (256, 1024, 4096, 16384, 65536, 262144, 1048576, 4194304, 16777216)
+
+# Списки параметров IN (?, ?, ?) разной длины — один шаблон
+_IN_LIST = re.compile(r'\((?:\s*(?:\?|%s|:\w+)\s*,)+\s*(?:\?|%s|:\w+)\s*\)')
+_SPACES = re.compile(r'\s+')
+
+
+def statement_template(statement):
+    return _IN_LIST.sub('(?)', _SPACES.sub(' ', statement).strip())
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _labels(names, values, extra=None):
+    pairs = list(zip(names, values)) + ([extra] if extra else [])
+    if not pairs:
+        return ''
+    return '{' + ','.join(f'{name}="{_escape(value)}"' for name, value in pairs) + '}'
+
+
+def _number(value):
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class Histogram:
+    def __init__(self, name, help, labels, buckets):
+        self.name = name
+        self.help = help
+        self.labels = labels
+        self.buckets = tuple(buckets)
+        self._series = {}
+
+    def observe(self, labels, value):
+        series = self._series.get(labels)
+        if series is None:
+            series = self._series[labels] = [[0] * (len(self.buckets) + 1), 0, 0]
+        series[0][bisect_left(self.buckets, value)] += 1
+        series[1] += value
+        series[2] += 1
+
+    def render(self):
+        lines = [f'# HELP {self.name} {self.help}', f'# TYPE {self.name} histogram']
+        for labels, (counts, total, count) in sorted(self._series.items()):
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets + ('+Inf',), counts):
+                cumulative += bucket_count
+                le = bound if bound == '+Inf' else _number(bound)
+                lines.append(f'{self.name}_bucket{_labels(self.labels, labels, ("le", le))} {cumulative}')
+            lines.append(f'{self.name}_sum{_labels(self.labels, labels)} {_number(total)}')
+            lines.append(f'{self.name}_count{_labels(self.labels, labels)} {count}')
+        return lines
+
+
+class CounterMetric:
+    def __init__(self, name, help, labels):
+        self.name = name
+        self.help = help
+        self.labels = labels
+        self._series = Counter()
+
+    def inc(self, labels, value=1):
+        self._series[labels] += value
+
+    def render(self):
+        lines = [f'# HELP {self.name} {self.help}', f'# TYPE {self.name} counter']
+        for labels, value in sorted(self._series.items()):
+            lines.append(f'{self.name}{_labels(self.labels, labels)} {_number(value)}')
+        return lines
+
+
+class _RequestStats:
+    __slots__ = ('started', 'statements', 'sql_seconds', 'templates')
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.statements = 0
+        self.sql_seconds = 0.0
+        self.templates = Counter()
+
+
+class Instrumentation:
+    """Расширение Flask: метрики маршрутов и эндпоинт /metrics"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.reset()
+
+    def init_app(self, app):
+        app.config.setdefault('METRICS_ENABLED', True)
+        app.config.setdefault('METRICS_NAMESPACE', 'five_s')
+        app.config.setdefault('METRICS_N_PLUS_ONE_THRESHOLD', 10)
+        # Если задан, /metrics требует заголовок Authorization: Bearer <токен>
+        app.config.setdefault('METRICS_TOKEN', None)
+        # /metrics без токена; в рабочем режиме нужен METRICS_TOKEN
+        app.config.setdefault('METRICS_PUBLIC', app.debug or app.testing)
+        # Заголовок Server-Timing с временем приложения и SQL (для DevTools браузера)
+        app.config.setdefault('METRICS_SERVER_TIMING', False)
+        if not app.config['METRICS_ENABLED']:
+            return
+
+        self.reset(app.config['METRICS_NAMESPACE'])
+        app.before_request(self._before_request)
+        app.after_request(self._after_request)
+        app.teardown_request(self._teardown_request)
+        app.add_url_rule('/metrics', 'metrics', self.metrics_view)
+        app.extensions['instrumentation'] = self
+        if not app.config['METRICS_TOKEN'] and not app.config['METRICS_PUBLIC']:
+            app.logger.warning('METRICS_TOKEN не задан: /metrics отключен')
+
+    def reset(self, namespace='five_s'):
+        route = ('method', 'route')
+        with self._lock:
+            self.requests = CounterMetric(
+                f'{namespace}_http_requests_total', 'Запросы по маршрутам и статусам', route + ('status',))
+            self.duration = Histogram(
+                f'{namespace}_http_request_duration_seconds', 'Время обработки запроса', route, DURATION_BUCKETS)
+            self.statements = Histogram(
+                f'{namespace}_http_request_sql_statements', 'SQL-запросов за HTTP-запрос', route, STATEMENT_BUCKETS)
+            self.sql_seconds = CounterMetric(
+                f'{namespace}_http_request_sql_seconds_total', 'Суммарное время SQL', route)
+            self.response_size = Histogram(
+                f'{namespace}_http_response_size_bytes', 'Размер ответа', route, SIZE_BUCKETS)
+            self.n_plus_one = CounterMetric(
+                f'{namespace}_http_request_n_plus_one_total', 'Запросы с повторяющимся шаблоном SQL', route)
+
+    # ===== Сбор =====
+
+    def _before_request(self):
+        g._request_stats = _RequestStats()
+
+    def _after_request(self, response):
+        stats = g.pop('_request_stats', None)
+        if stats is None or request.endpoint == 'metrics':
+            return response
+        elapsed = time.perf_counter() - stats.started
+        labels = (request.method, request.url_rule.rule if request.url_rule else '<unmatched>')
+
+        threshold = current_app.config['METRICS_N_PLUS_ONE_THRESHOLD']
+        repeated = [(template, count) for template, count in stats.templates.items() if count > threshold]
+        for template, count in repeated:
+            current_app.logger.warning(
+                'Возможный N+1: %s %s выполнил %s раз: %s', labels[0], labels[1], count, template[:300])
+
+        size = response.content_length if not response.is_streamed else None
+        with self._lock:
+            self.requests.inc(labels + (response.status_code,))
+            self.duration.observe(labels, elapsed)
+            self.statements.observe(labels, stats.statements)
+            self.sql_seconds.inc(labels, stats.sql_seconds)
+            if size is not None:
+                self.response_size.observe(labels, size)
+            if repeated:
+                self.n_plus_one.inc(labels)
+
+        if current_app.config['METRICS_SERVER_TIMING']:
+            response.headers['Server-Timing'] = (
+                f'app;dur={elapsed * 1000:.1f}, '
+                f'sql;dur={stats.sql_seconds * 1000:.1f};desc="{stats.statements} queries"'
+            )
+        return response
+
+    def _teardown_request(self, exc):
+        # Ответ не сформирован (необработанное исключение) — статистика не нужна
+        g.pop('_request_stats', None)
+
+    # ===== Вывод =====
+
+    def render(self):
+        with self._lock:
+            lines = []
+            for metric in (self.requests, self.duration, self.statements, self.sql_seconds,
+                           self.response_size, self.n_plus_one):
+                lines.extend(metric.render())
+        return '\n'.join(lines) + '\n'
+
+    def metrics_view(self):
+        token = current_app.config['METRICS_TOKEN']
+        if not token and not current_app.config['METRICS_PUBLIC']:
+            abort(404)
+        supplied = request.headers.get('Authorization', '').encode()
+        if token and not hmac.compare_digest(supplied, f'Bearer {token}'.encode()):
+            return Response('Unauthorized\n', status=401, mimetype='text/plain')
+        return Response(self.render(), content_type='text/plain; version=0.0.4; charset=utf-8')
+
+
+instrumentation = Instrumentation()
+
+
+def _current_stats():
+    return g.get('_request_stats') if has_request_context() else None
+
+
+@event.listens_for(Engine, 'before_cursor_execute')
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    if _current_stats() is not None:
+        conn.info.setdefault('_query_started', []).append(time.perf_counter())
+
+
+@event.listens_for(Engine, 'after_cursor_execute')
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    stats = _current_stats()
+    started = conn.info.get('_query_started')
+    if stats is None or not started:
+        return
+    stats.sql_seconds += time.perf_counter() - started.pop()
+    stats.statements += 1
+    stats.templates[statement_template(statement)] += 1
+
+
+@event.listens_for(Engine, 'handle_error')
+def _cursor_error(context):
+    started = context.connection.info.get('_query_started') if context.connection is not None else None
+    if started:
+        started.pop()
@@ -0,0 +1,429 @@
+"""
+Фоновая очередь заданий без внешнего брокера.
+
+- Задания хранятся в таблице job_queue той же базы. enqueue() добавляет строку
+  в текущую транзакцию: задание появляется у воркеров только вместе с
+  зафиксированными данными и не теряется при перезапуске процессов.
+- `flask worker -n N` запускает N процессов. Каждый захватывает готовое задание
+  условным UPDATE (claim_token), поэтому одно задание выполняет один процесс.
+- Таймаут видимости: захваченное задание заблокировано до locked_until; если
+  процесс упал или завис, задание снова становится доступным. Выполнение
+  поэтому «хотя бы один раз» — обработчики должны быть идемпотентными.
+- После ошибки обработчика задание повторяется с экспоненциальной задержкой;
+  после max_attempts попыток (или при JobError) оно помечается failed.
+- Периодические задания (@task(..., every=...)) ставит сам воркер: одна строка
+  на задачу (unique_key periodic:<имя>), после успешного выполнения она
+  возвращается в pending со сроком через интервал. Если строки нет (первый
+  запуск, исчерпаны попытки), воркер создает ее заново.
+- stats() отдает по каждой очереди число заданий по статусам, задержку
+  (возраст самого старого готового задания) и пропускную способность.
+
+Очередь — единственный механизм фоновой работы приложения: потоков в
+процессах веб-сервера нет, задания выполняет `flask worker`.
+
+Обработчики регистрируются декоратором @task('имя', queue=..., timeout=...)
+в модулях приложения; аргументы задания — JSON-совместимые именованные параметры.
+"""
+import json
+import multiprocessing
+import os
+import random
+import signal
+import socket
+import time
+import uuid
+from collections import namedtuple
+from contextlib import contextmanager
+from datetime import datetime, timedelta
+
+import click
+from flask import current_app
+from sqlalchemy import and_, case, func, or_, update
+from app import db
+from app.models import Job
+
+STATUSES = ('pending', 'running', 'done', 'failed')
+CLAIM_CANDIDATES = 10
+
+PERIODIC_PREFIX = 'periodic:'
+
+Task = namedtuple('Task', 'name func queue timeout max_attempts every')
+_tasks = {}
+
+
+class JobError(ValueError):
+    """Неизвестная задача или некорректные параметры задания"""
+
+
+def task(name, queue='default', timeout=None, max_attempts=None, every=None):
+    """
+    Регистрирует функцию как обработчик задания name.
+    every — периодическое задание без аргументов: интервал в секундах или имя
+    параметра конфигурации с интервалом (пустое значение выключает задание).
+    """
+    def decorator(func):
+        _tasks[name] = Task(name, func, queue, timeout, max_attempts, every)
+        return func
+    return decorator
+
+
+def registered_tasks():
+    return dict(_tasks)
+
+
+def init_app(app):
+    app.config.setdefault('JOBS_POLL_SECONDS', 1.0)
+    app.config.setdefault('JOBS_VISIBILITY_TIMEOUT', 300)
+    app.config.setdefault('JOBS_MAX_ATTEMPTS', 5)
+    app.config.setdefault('JOBS_RETRY_BASE_SECONDS', 10)
+    app.config.setdefault('JOBS_RETRY_MAX_SECONDS', 3600)
+    app.config.setdefault('JOBS_KEEP_FINISHED_DAYS', 7)
+    app.config.setdefault('JOBS_PERIODIC_CHECK_SECONDS', 60)
+
+
+# ===== Постановка в очередь =====
+
+def enqueue(name, delay=0, run_at=None, unique=False, max_attempts=None, **payload):
+    """
+    Добавляет задание в текущую транзакцию (видно воркерам после commit).
+    unique=True: если такое же задание уже ожидает, новое не создается.
+    max_attempts — число попыток вместо заданного у задачи.
+    """
+    spec = _tasks.get(name)
+    if spec is None:
+        raise JobError(f'Неизвестная задача: {name}')
+    unique_key = None
+    if unique:
+        unique_key = f'{name}:{json.dumps(payload, sort_keys=True, default=str)}'[:200]
+        existing = Job.query.filter(Job.unique_key == unique_key, Job.status == 'pending').first()
+        if existing is not None:
+            return existing
+
+    job = Job(
+        queue=spec.queue,
+        task=name,
+        payload=payload or None,
+        unique_key=unique_key,
+        max_attempts=max_attempts or spec.max_attempts or current_app.config['JOBS_MAX_ATTEMPTS'],
+        run_at=run_at or datetime.utcnow() + timedelta(seconds=delay)
+    )
+    db.session.add(job)
+    return job
+
+
+# ===== Периодические задания =====
+
+def _interval(spec):
+    """Интервал периодической задачи в секундах или None"""
+    every = spec.every
+    if isinstance(every, str):
+        every = current_app.config.get(every)
+    return every or None
+
+
+def ensure_periodic(queues=None, now=None):
+    """Создает строки периодических задач очередей queues, которых нет среди ожидающих и выполняемых"""
+    now = now or datetime.utcnow()
+    created = 0
+    for spec in _tasks.values():
+        if not _interval(spec) or (queues and spec.queue not in queues):
+            continue
+        unique_key = PERIODIC_PREFIX + spec.name
+        exists = db.session.query(Job.id).filter(
+            Job.unique_key == unique_key, Job.status.in_(('pending', 'running'))
+        ).first()
+        if exists is None:
+            db.session.add(Job(
+                queue=spec.queue, task=spec.name, unique_key=unique_key, run_at=now,
+                max_attempts=spec.max_attempts or current_app.config['JOBS_MAX_ATTEMPTS']
+            ))
+            created += 1
+    db.session.commit()
+    return created
+
+
+def _reschedule(job_id, token, unique_key, interval, now):
+    """Периодическое задание после успеха снова ждет; лишняя копия (гонка воркеров) завершается"""
+    duplicate = db.session.query(Job.id).filter(
+        Job.unique_key == unique_key, Job.id != job_id, Job.status.in_(('pending', 'running'))
+    ).first()
+    if duplicate is not None:
+        _finish(job_id, token, status='done', last_error=None, finished_at=now)
+        return
+    _finish(job_id, token, status='pending', attempts=0, last_error=None, finished_at=now,
+            run_at=now + timedelta(seconds=interval))
+
+
+# ===== Захват и выполнение =====
+
+def _available(now):
+    """Готовые к выполнению: ожидающие по сроку и захваченные с истекшим таймаутом"""
+    return or_(
+        and_(Job.status == 'pending', Job.run_at <= now),
+        and_(Job.status == 'running', Job.locked_until < now)
+    )
+
+
+def _timeout(name):
+    spec = _tasks.get(name)
+    return (spec and spec.timeout) or current_app.config['JOBS_VISIBILITY_TIMEOUT']
+
+
+def claim(queues=None, worker_id=None, now=None):
+    """Захватывает одно готовое задание из очередей queues (None — из всех)"""
+    now = now or datetime.utcnow()
+    query = db.session.query(Job.id, Job.task).filter(_available(now))
+    if queues:
+        query = query.filter(Job.queue.in_(queues))
+    candidates = query.order_by(Job.run_at, Job.id).limit(CLAIM_CANDIDATES).all()
+
+    for job_id, name in candidates:
+        token = uuid.uuid4().hex
+        claimed = db.session.execute(
+            update(Job).where(Job.id == job_id, _available(now)).values(
+                status='running', claim_token=token, locked_by=worker_id,
+                locked_until=now + timedelta(seconds=_timeout(name)),
+                attempts=Job.attempts + 1, started_at=now
+            )
+        ).rowcount
+        db.session.commit()
+        if claimed:
+            return db.session.get(Job, job_id)
+    db.session.commit()
+    return None
+
+
+def _backoff(attempts):
+    config = current_app.config
+    delay = min(config['JOBS_RETRY_BASE_SECONDS'] * 2 ** (attempts - 1), config['JOBS_RETRY_MAX_SECONDS'])
+    # Разброс, чтобы повторы после общего сбоя не приходили одновременно
+    return timedelta(seconds=delay * random.uniform(1, 1.2))
+
+
+def _finish(job_id, token, **values):
+    # Задание могли перезахватить после истечения таймаута — чужой результат не затираем
+    db.session.execute(
+        update(Job).where(Job.id == job_id, Job.claim_token == token)
+        .values(claim_token=None, locked_until=None, **values)
+    )
+    db.session.commit()
+
+
+def execute(job):
+    """Выполняет захваченное задание и записывает результат; True при успехе"""
+    job_id, token, name, unique_key = job.id, job.claim_token, job.task, job.unique_key
+    attempts, max_attempts, payload = job.attempts, job.max_attempts, job.payload or {}
+    spec = _tasks.get(name)
+    try:
+        if attempts > max_attempts:
+            raise JobError('Превышено число попыток (задание не завершилось за таймаут видимости)')
+        if spec is None:
+            raise JobError(f'Неизвестная задача: {name}')
+        spec.func(**payload)
+        db.session.commit()
+    except Exception as e:
+        db.session.rollback()
+        current_app.logger.exception('Ошибка задания %s (%s), попытка %s', job_id, name, attempts)
+        now = datetime.utcnow()
+        if attempts >= max_attempts or isinstance(e, JobError):
+            _finish(job_id, token, status='failed', last_error=str(e), finished_at=now)
+        else:
+            _finish(job_id, token, status='pending', last_error=str(e), run_at=now + _backoff(attempts))
+        return False
+
+    now = datetime.utcnow()
+    interval = _interval(spec)
+    if interval and unique_key == PERIODIC_PREFIX + name:
+        _reschedule(job_id, token, unique_key, interval, now)
+    else:
+        _finish(job_id, token, status='done', last_error=None, finished_at=now)
+    return True
+
+
+def purge_finished(now=None):
+    """Удаляет выполненные задания старше JOBS_KEEP_FINISHED_DAYS (ошибочные остаются для разбора)"""
+    now = now or datetime.utcnow()
+    border = now - timedelta(days=current_app.config['JOBS_KEEP_FINISHED_DAYS'])
+    deleted = Job.query.filter(Job.status == 'done', Job.finished_at < border) \
+        .delete(synchronize_session=False)
+    db.session.commit()
+    return deleted
+
+
+class Worker:
+    """Цикл одного процесса: захват, выполнение, ожидание новых заданий"""
+
+    PURGE_INTERVAL = 3600
+
+    def __init__(self, queues=None, worker_id=None):
+        self.queues = list(queues) if queues else None
+        self.worker_id = worker_id or f'{socket.gethostname()}:{os.getpid()}'
+        self.stopping = False
+        self._last_purge = None
+        self._last_schedule = None
+
+    def stop(self, *args):
+        """Завершение после текущего задания (обработчик SIGTERM/SIGINT)"""
+        self.stopping = True
+
+    def work(self, burst=False, max_jobs=None):
+        """
+        Выполняет задания; burst=True — выход, когда очередь опустела
+        (периодические задания в этом режиме не создаются).
+        """
+        processed = 0
+        while not self.stopping and (max_jobs is None or processed < max_jobs):
+            if not burst:
+                self._maybe_schedule()
+            job = claim(self.queues, self.worker_id)
+            if job is not None:
+                execute(job)
+                processed += 1
+                continue
+            if burst:
+                break
+            self._maybe_purge()
+            db.session.remove()
+            time.sleep(current_app.config['JOBS_POLL_SECONDS'])
+        return processed
+
+    def _maybe_schedule(self):
+        interval = current_app.config['JOBS_PERIODIC_CHECK_SECONDS']
+        if self._last_schedule is None or time.monotonic() - self._last_schedule >= interval:
+            ensure_periodic(self.queues)
+            self._last_schedule = time.monotonic()
+
+    def _maybe_purge(self):
+        if self._last_purge is None or time.monotonic() - self._last_purge >= self.PURGE_INTERVAL:
+            purge_finished()
+            self._last_purge = time.monotonic()
+
+
+# ===== Метрики =====
+
+def stats(now=None):
+    """По очередям: задания по статусам, задержка очереди и выполненные за минуту и час"""
+    now = now or datetime.utcnow()
+    queues = {}
+
+    def entry(queue):
+        return queues.setdefault(queue, {
+            **dict.fromkeys(STATUSES, 0),
+            'lag_seconds': 0.0,
+            'done_last_minute': 0,
+            'done_last_hour': 0,
+            'failed_last_hour': 0
+        })
+
+    for queue, status, count in db.session.query(Job.queue, Job.status, func.count(Job.id)) \
+            .group_by(Job.queue, Job.status):
+        entry(queue)[status] = count
+
+    for queue, oldest in db.session.query(Job.queue, func.min(Job.run_at)) \
+            .filter(_available(now)).group_by(Job.queue):
+        entry(queue)['lag_seconds'] = round(max((now - oldest).total_seconds(), 0), 3)
+
+    minute_ago = now - timedelta(minutes=1)
+    recent = db.session.query(
+        Job.queue, Job.status,
+        func.count(Job.id),
+        func.sum(case((Job.finished_at >= minute_ago, 1), else_=0))
+    ).filter(Job.finished_at >= now - timedelta(hours=1)).group_by(Job.queue, Job.status)
+    for queue, status, last_hour, last_minute in recent:
+        if status == 'done':
+            entry(queue)['done_last_hour'] = last_hour
+            entry(queue)['done_last_minute'] = int(last_minute or 0)
+        elif status == 'failed':
+            entry(queue)['failed_last_hour'] = last_hour
+
+    return {'generated_at': now.isoformat(), 'queues': queues}
+
+
+# ===== Процессы воркеров =====
+
+@contextmanager
+def _stop_signals(handler):
+    """SIGTERM и SIGINT вызывают handler; прежние обработчики восстанавливаются на выходе"""
+    previous = {sig: signal.signal(sig, handler) for sig in (signal.SIGTERM, signal.SIGINT)}
+    try:
+        yield
+    finally:
+        for sig, old in previous.items():
+            signal.signal(sig, old)
+
+
+def _worker_process(queues, burst):
+    """Точка входа дочернего процесса: собственное приложение и соединения с базой"""
+    from app import create_app
+
+    app = create_app()
+    worker = Worker(queues)
+    with _stop_signals(worker.stop), app.app_context():
+        worker.work(burst=burst)
+
+
+@click.command('worker')
+@click.option('-n', '--processes', default=1, show_default=True, help='Число процессов-воркеров')
+@click.option('-q', '--queue', 'queues', multiple=True, help='Очередь (можно несколько); по умолчанию все')
+@click.option('--burst', is_flag=True, help='Завершиться, когда очередь опустеет')
+def worker_command(processes, queues, burst):
+    """Запустить обработку фоновых заданий"""
+    if processes <= 1:
+        worker = Worker(queues)
+        with _stop_signals(worker.stop):
+            processed = worker.work(burst=burst)
+        click.echo(f'✅ Выполнено заданий: {processed}')
+        return
+
+    # spawn: дочерним процессам не достаются соединения и потоки родителя
+    context = multiprocessing.get_context('spawn')
+    pool = {}
+    stopping = []
+
+    def start(index):
+        process = context.Process(target=_worker_process, args=(queues, burst), name=f'5s-worker-{index}')
+        process.start()
+        pool[index] = process
+
+    def shutdown(*args):
+        stopping.append(True)
+        for process in pool.values():
+            if process.is_alive():
+                process.terminate()
+
+    with _stop_signals(shutdown):
+        for index in range(processes):
+            start(index)
+        click.echo(f'✅ Запущено воркеров: {processes}')
+
+        while any(process.is_alive() for process in pool.values()):
+            time.sleep(1)
+            if burst or stopping:
+                continue
+            # Упавший процесс перезапускается
+            for index, process in list(pool.items()):
+                if not process.is_alive():
+                    click.echo(f'⚠️ Воркер {process.name} завершился с кодом {process.exitcode}, перезапуск')
+                    start(index)
+        for process in pool.values():
+            process.join()
+
+
+@click.command('jobs-enqueue')
+@click.argument('name')
+@click.option('--payload', default='{}', help='Аргументы задания (JSON-объект)')
+def enqueue_command(name, payload):
+    """Поставить задание в очередь (например, rollup.rebuild)"""
+    try:
+        job = enqueue(name, **json.loads(payload))
+    except (JobError, ValueError, TypeError) as e:
+        raise click.ClickException(str(e))
+    db.session.commit()
+    click.echo(f'✅ Задание {job.id} ({name}) поставлено в очередь {job.queue}')
+
+
+@click.command('jobs-stats')
+def stats_command():
+    """Показать состояние очередей заданий"""
+    for queue, values in sorted(stats()['queues'].items()):
+        click.echo(f'{queue}: ' + ', '.join(f'{key}={value}' for key, value in values.items()))
@@ -0,0 +1,281 @@
+"""
+Рейтинг участков и отделов по скользящему окну (по умолчанию 30 дней).
+
+В памяти процесса хранятся суммы окна по каждому участку и отделу и
+упорядоченный список рейтинга. Новая проверка или аудит после фиксации
+транзакции меняет одну запись участка и одну запись отдела: позиция
+находится бинарным поиском, поэтому топ-k отдается срезом за O(k), а место
+отдельного участка — за O(log n).
+
+Полная загрузка из area_daily_stats и audits_5s выполняется при первом
+обращении, при смене дня (окно сдвигается), после изменения участков и не
+реже раза в LEADERBOARD_REFRESH_SECONDS — так учитываются записи других
+процессов. Изменение места считается относительно рейтинга по окну,
+заканчивающемуся вчера.
+"""
+import threading
+import time
+from bisect import bisect_left, insort
+from datetime import datetime, timedelta
+
+from sqlalchemy import event, func
+from app import db
+from app.models import AreaDailyStats as Daily, Area5S as Area, Audit5S as Audit
+
+SCOPES = ('area', 'department')
+LEADERBOARD_MAX_LIMIT = 100
+
+
+class Ranking:
+    """Ключи, упорядоченные по убыванию средней оценки"""
+
+    def __init__(self):
+        self._order = []
+        self._positions = {}
+
+    def __len__(self):
+        return len(self._order)
+
+    def update(self, key, average, checks):
+        self.remove(key)
+        item = ((-average, -checks), key)
+        self._positions[key] = item
+        insort(self._order, item)
+
+    def remove(self, key):
+        item = self._positions.pop(key, None)
+        if item is not None:
+            del self._order[bisect_left(self._order, item)]
+
+    def rank(self, key):
+        """Место ключа (с 1) или None, если ключ не участвует в рейтинге"""
+        item = self._positions.get(key)
+        return None if item is None else bisect_left(self._order, item) + 1
+
+    def top(self, k):
+        return [key for _, key in self._order[:k]]
+
+
+class _Totals:
+    __slots__ = ('checks', 'score_sum', 'audits', 'audit_sum')
+
+    def __init__(self):
+        self.checks = self.score_sum = self.audits = self.audit_sum = 0
+
+    def average(self):
+        return self.score_sum / self.checks if self.checks else None
+
+    def audit_average(self):
+        return self.audit_sum / self.audits if self.audits else None
+
+
+def _build_ranking(totals):
+    ranking = Ranking()
+    for key, item in totals.items():
+        if item.checks:
+            ranking.update(key, item.average(), item.checks)
+    return ranking
+
+
+class Leaderboard:
+    """Рейтинги участков и отделов с инкрементальным обновлением"""
+
+    def __init__(self, clock=time.monotonic, today=None):
+        self._lock = threading.RLock()
+        self._clock = clock
+        self._today = today or (lambda: datetime.utcnow().date())
+        self.window_days = 30
+        self.refresh_seconds = 300
+        self.reset()
+
+    def init_app(self, app):
+        app.config.setdefault('LEADERBOARD_WINDOW_DAYS', 30)
+        app.config.setdefault('LEADERBOARD_REFRESH_SECONDS', 300)
+        self.window_days = app.config['LEADERBOARD_WINDOW_DAYS']
+        self.refresh_seconds = app.config['LEADERBOARD_REFRESH_SECONDS']
+        self.reset()
+        app.extensions['leaderboard'] = self
+
+    def reset(self):
+        with self._lock:
+            self.loaded_at = None
+            self.day = None
+            self.stale = True
+            self._areas = {}
+            self._totals = {scope: {} for scope in SCOPES}
+            self._rankings = {scope: Ranking() for scope in SCOPES}
+            self._previous = {scope: Ranking() for scope in SCOPES}
+
+    def invalidate(self):
+        """Полная перезагрузка при следующем чтении"""
+        self.stale = True
+
+    # ===== Загрузка =====
+
+    def _needs_reload(self):
+        return (self.stale or self.loaded_at is None or self.day != self._today()
+                or self._clock() - self.loaded_at >= self.refresh_seconds)
+
+    def _ensure_loaded(self):
+        if self._needs_reload():
+            self.load()
+
+    def load(self):
+        """Полная загрузка окна и окна предыдущего дня из агрегатов"""
+        today = self._today()
+        start = today - timedelta(days=self.window_days)
+        areas = {
+            area_id: (name, department or '')
+            for area_id, name, department in db.session.query(Area.id, Area.name, Area.department)
+            .filter(Area.is_active == True)  # noqa: E712
+        }
+
+        current = {scope: {} for scope in SCOPES}
+        previous = {scope: {} for scope in SCOPES}
+
+        def add(area_id, day, checks=0, score_sum=0, audits=0, audit_sum=0):
+            if area_id not in areas:
+                return
+            windows = []
+            if day > start:
+                windows.append(current)
+            if day < today:
+                windows.append(previous)
+            for totals in windows:
+                for scope, key in (('area', area_id), ('department', areas[area_id][1])):
+                    item = totals[scope].setdefault(key, _Totals())
+                    item.checks += checks
+                    item.score_sum += score_sum
+                    item.audits += audits
+                    item.audit_sum += audit_sum
+
+        for area_id, day, checks, score_sum in db.session.query(
+                Daily.area_id, Daily.day, Daily.check_count, Daily.score_sum).filter(Daily.day >= start):
+            add(area_id, day, checks=checks, score_sum=score_sum)
+
+        audit_day = func.date(Audit.audit_date, type_=db.Date)
+        for area_id, day, audits, audit_sum in db.session.query(
+                Audit.area_id, audit_day, func.count(Audit.id), func.coalesce(func.sum(Audit.total_score), 0)
+        ).filter(Audit.audit_date >= datetime.combine(start, datetime.min.time())) \
+         .group_by(Audit.area_id, audit_day):
+            add(area_id, day, audits=audits, audit_sum=audit_sum)
+
+        with self._lock:
+            self._areas = areas
+            self._totals = current
+            self._rankings = {scope: _build_ranking(current[scope]) for scope in SCOPES}
+            self._previous = {scope: _build_ranking(previous[scope]) for scope in SCOPES}
+            self.day = today
+            self.loaded_at = self._clock()
+            self.stale = False
+
+    # ===== Инкрементальные обновления =====
+
+    def _apply(self, area_id, when, checks=0, score_sum=0, audits=0, audit_sum=0):
+        with self._lock:
+            if self.loaded_at is None or self.stale:
+                return
+            if area_id not in self._areas:
+                # Новый участок: метаданные подтянет полная загрузка
+                self.stale = True
+                return
+            if when.date() <= self.day - timedelta(days=self.window_days) or when.date() > self.day:
+                return
+            for scope, key in (('area', area_id), ('department', self._areas[area_id][1])):
+                item = self._totals[scope].setdefault(key, _Totals())
+                item.checks += checks
+                item.score_sum += score_sum
+                item.audits += audits
+                item.audit_sum += audit_sum
+                if item.checks:
+                    self._rankings[scope].update(key, item.average(), item.checks)
+
+    def record_check(self, area_id, checked_at, score, count=1):
+        self._apply(area_id, checked_at, checks=count, score_sum=score or 0)
+
+    def record_audit(self, area_id, audit_date, total_score):
+        self._apply(area_id, audit_date, audits=1, audit_sum=total_score or 0)
+
+    # ===== Чтение =====
+
+    def _entry(self, scope, key, rank, total):
+        item = self._totals[scope][key]
+        previous_rank = self._previous[scope].rank(key)
+        entry = {'rank': rank}
+        if scope == 'area':
+            name, department = self._areas[key]
+            entry.update(area_id=key, area=name, department=department or None)
+        else:
+            entry['department'] = key or None
+        entry.update({
+            'checks': item.checks,
+            'average_score': round(item.average(), 2),
+            'audits': item.audits,
+            'audit_average': round(item.audit_average(), 2) if item.audits else None,
+            # Положительное значение — подъем в рейтинге со вчерашнего дня
+            'rank_delta': previous_rank - rank if previous_rank else None,
+            'percentile': round(100 * (total - rank) / (total - 1), 1) if total > 1 else 100.0
+        })
+        return entry
+
+    def top(self, scope, k=10):
+        """Первые k мест рейтинга"""
+        self._ensure_loaded()
+        with self._lock:
+            ranking = self._rankings[scope]
+            total = len(ranking)
+            return {
+                'scope': scope,
+                'window_days': self.window_days,
+                'total': total,
+                'entries': [self._entry(scope, key, rank, total)
+                            for rank, key in enumerate(ranking.top(k), start=1)]
+            }
+
+    def position(self, scope, key):
+        """Место одного участка или отдела; None, если у него нет проверок в окне"""
+        self._ensure_loaded()
+        with self._lock:
+            ranking = self._rankings[scope]
+            rank = ranking.rank(key)
+            return None if rank is None else self._entry(scope, key, rank, len(ranking))
+
+
+leaderboard = Leaderboard()
+
+
+# ===== Обновление после фиксации транзакции =====
+
+def record_check(area_id, checked_at, score, count=1):
+    """
+    Ставит проверки в очередь обновления рейтинга; применяются после фиксации
+    транзакции. score — сумма оценок count проверок одного участка за день.
+    """
+    db.session.info.setdefault('leaderboard_pending', []).append(
+        (leaderboard.record_check, (area_id, checked_at, score, count))
+    )
+
+
+def record_audit(area_id, audit_date, total_score):
+    db.session.info.setdefault('leaderboard_pending', []).append(
+        (leaderboard.record_audit, (area_id, audit_date, total_score))
+    )
+
+
+@event.listens_for(db.session, 'after_commit')
+def _apply_pending(session):
+    for apply, args in session.info.pop('leaderboard_pending', ()):
+        apply(*args)
+
+
+@event.listens_for(db.session, 'after_rollback')
+def _drop_pending(session):
+    session.info.pop('leaderboard_pending', None)
+
+
+@event.listens_for(Area, 'after_insert')
+@event.listens_for(Area, 'after_update')
+@event.listens_for(Area, 'after_delete')
+def _area_changed(mapper, connection, target):
+    # Название, отдел или активность участка изменились — рейтинг перестраивается целиком
+    leaderboard.invalidate()
@@ -2,12 +2,19 @@
 Инициализация SQLAlchemy моделей после создания db
 """
 from datetime import datetime
-from app import db
+from flask_login import UserMixin
+from app import db, scoring
+
+# Модели объявляются один раз: повторное объявление таблиц в metadata недопустимо
+_models = None
 
 def init_models():
     """Инициализирует модели SQLAlchemy"""
+    global _models
+    if _models is not None:
+        return _models
     
-    class User(db.Model):
+    class User(UserMixin, db.Model):
         __tablename__ = 'users_5s'
         
         id = db.Column(db.Integer, primary_key=True)
@@ -17,19 +24,31 @@ def init_models():
         role = db.Column(db.String(20), default='user')
         department = db.Column(db.String(100))
         position = db.Column(db.String(100))
+        phone = db.Column(db.String(30))
         is_active = db.Column(db.Boolean, default=True)
         created_at = db.Column(db.DateTime, default=datetime.utcnow)
+        last_login = db.Column(db.DateTime)
+
+        ROLE_DISPLAY = {
+            'admin': 'Администратор',
+            'manager': 'Менеджер',
+            'auditor': 'Аудитор',
+            'user': 'Пользователь'
+        }
 
         def set_password(self, password):
-            from werkzeug.security import generate_password_hash
-            self.password_hash = generate_password_hash(password)
+            from app.passwords import hash_password
+            self.password_hash = hash_password(password)
 
         def check_password(self, password):
             from werkzeug.security import check_password_hash
             return check_password_hash(self.password_hash, password)
 
-        def has_role(self, role_name):
-            return self.role == role_name or self.role == 'admin'
+        def has_role(self, *role_names):
+            return self.role in role_names or self.role == 'admin'
+
+        def get_role_display(self):
+            return self.ROLE_DISPLAY.get(self.role, self.role)
 
         def __repr__(self):
             return f'<User {self.username}>'
@@ -50,6 +69,13 @@ def init_models():
 
     class Check5S(db.Model):
         __tablename__ = 'checks_5s'
+        __table_args__ = (
+            # История участка: WHERE area_id = ? ORDER BY checked_at DESC, id DESC
+            db.Index('ix_checks_5s_area_checked_at', 'area_id', 'checked_at', 'id'),
+            db.Index('ix_checks_5s_user_checked_at', 'user_id', 'checked_at'),
+            # Последние проверки на дашборде
+            db.Index('ix_checks_5s_checked_at', 'checked_at'),
+        )
         
         id = db.Column(db.Integer, primary_key=True)
         area_id = db.Column(db.Integer, db.ForeignKey('areas_5s.id'), nullable=False)
@@ -66,9 +92,24 @@ def init_models():
         photos = db.Column(db.JSON)
         checked_at = db.Column(db.DateTime, default=datetime.utcnow)
         total_score = db.Column(db.Integer, default=0)
+        # Идентификатор, сгенерированный планшетом (идемпотентная синхронизация)
+        client_uuid = db.Column(db.String(36), unique=True)
+
+        area = db.relationship('Area5S')
+        user = db.relationship('User')
+
+        def calculate_score(self):
+            """Оценка проверки: 20 баллов за каждый выполненный критерий"""
+            self.total_score = scoring.check_score(getattr(self, flag) for flag in scoring.CHECK_FLAGS)
+            return self.total_score
 
     class Audit5S(db.Model):
         __tablename__ = 'audits_5s'
+        __table_args__ = (
+            db.Index('ix_audits_5s_area_audit_date', 'area_id', 'audit_date'),
+            db.Index('ix_audits_5s_auditor_id', 'auditor_id'),
+            db.Index('ix_audits_5s_audit_date', 'audit_date'),
+        )
         
         id = db.Column(db.Integer, primary_key=True)
         area_id = db.Column(db.Integer, db.ForeignKey('areas_5s.id'), nullable=False)
@@ -87,12 +128,196 @@ def init_models():
         audit_date = db.Column(db.DateTime, default=datetime.utcnow)
         next_audit_date = db.Column(db.DateTime)
 
+        area = db.relationship('Area5S')
+        auditor = db.relationship('User')
+
+        def calculate_total_score(self):
+            """Общая оценка аудита: сумма оценок пяти критериев"""
+            self.total_score = scoring.audit_total(getattr(self, field) for field in scoring.AUDIT_FIELDS)
+            return self.total_score
+
+        def get_grade(self):
+            """Буквенная оценка с учетом порогов отдела участка"""
+            department = self.area.department if self.area else None
+            return scoring.grade_for(self.total_score or 0, department)
+
+    class Photo5S(db.Model):
+        """Фото, сохраненное по хешу содержимого; проверки и аудиты ссылаются на id"""
+        __tablename__ = 'photos_5s'
+        
+        id = db.Column(db.String(64), primary_key=True)  # sha256 содержимого
+        extension = db.Column(db.String(10), nullable=False)
+        content_type = db.Column(db.String(50), nullable=False)
+        size = db.Column(db.Integer, nullable=False)
+        uploaded_by = db.Column(db.Integer, db.ForeignKey('users_5s.id'))
+        created_at = db.Column(db.DateTime, default=datetime.utcnow)
+
+    class AreaScoreRollup(db.Model):
+        """Накопительные показатели участка, обновляются при записи проверок и аудитов"""
+        __tablename__ = 'area_score_rollup'
+        __table_args__ = (
+            # Очередь аудитов: просроченные и ближайшие по возрастанию срока
+            db.Index('ix_area_score_rollup_next_audit_at', 'next_audit_at'),
+        )
+        
+        area_id = db.Column(db.Integer, db.ForeignKey('areas_5s.id'), primary_key=True)
+        
+        # Проверки
+        check_count = db.Column(db.Integer, default=0, nullable=False)
+        score_sum = db.Column(db.Integer, default=0, nullable=False)
+        last_check_at = db.Column(db.DateTime)
+        
+        # Количество выполненных критериев 5С
+        seiri_hits = db.Column(db.Integer, default=0, nullable=False)
+        seiton_hits = db.Column(db.Integer, default=0, nullable=False)
+        seiso_hits = db.Column(db.Integer, default=0, nullable=False)
+        seiketsu_hits = db.Column(db.Integer, default=0, nullable=False)
+        shitsuke_hits = db.Column(db.Integer, default=0, nullable=False)
+        
+        # Аудиты
+        audit_count = db.Column(db.Integer, default=0, nullable=False)
+        last_audit_at = db.Column(db.DateTime)
+        last_audit_score = db.Column(db.Integer)
+        last_audit_grade = db.Column(db.String(10))
+        next_audit_at = db.Column(db.DateTime)
+        
+        updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+        @property
+        def average_score(self):
+            return self.score_sum / self.check_count if self.check_count else 0
+
+    class AreaDailyStats(db.Model):
+        """Показатели проверок участка за день (UTC) для графиков динамики"""
+        __tablename__ = 'area_daily_stats'
+        __table_args__ = (
+            db.Index('ix_area_daily_stats_day', 'day'),
+        )
+        
+        area_id = db.Column(db.Integer, db.ForeignKey('areas_5s.id'), primary_key=True)
+        day = db.Column(db.Date, primary_key=True)
+        
+        check_count = db.Column(db.Integer, default=0, nullable=False)
+        score_sum = db.Column(db.Integer, default=0, nullable=False)
+        seiri_hits = db.Column(db.Integer, default=0, nullable=False)
+        seiton_hits = db.Column(db.Integer, default=0, nullable=False)
+        seiso_hits = db.Column(db.Integer, default=0, nullable=False)
+        seiketsu_hits = db.Column(db.Integer, default=0, nullable=False)
+        shitsuke_hits = db.Column(db.Integer, default=0, nullable=False)
+
+    class Notification5S(db.Model):
+        """Уведомление пользователя (низкая оценка проверки, просроченный аудит)"""
+        __tablename__ = 'notifications_5s'
+        __table_args__ = (
+            db.Index('ix_notifications_5s_user_created', 'user_id', 'created_at'),
+        )
+        
+        id = db.Column(db.Integer, primary_key=True)
+        user_id = db.Column(db.Integer, db.ForeignKey('users_5s.id'), nullable=False)
+        kind = db.Column(db.String(30), nullable=False)  # low_score, audit_overdue
+        area_id = db.Column(db.Integer, db.ForeignKey('areas_5s.id'))
+        check_id = db.Column(db.Integer, db.ForeignKey('checks_5s.id'))
+        title = db.Column(db.String(200), nullable=False)
+        message = db.Column(db.Text)
+        # Защита от повторов: одно уведомление на событие
+        dedup_key = db.Column(db.String(100), unique=True)
+        created_at = db.Column(db.DateTime, default=datetime.utcnow)
+        read_at = db.Column(db.DateTime)
+
+        user = db.relationship('User')
+
+    class NotificationOutbox(db.Model):
+        """Очередь доставки уведомлений (outbox), пишется в одной транзакции с событием"""
+        __tablename__ = 'notification_outbox'
+        __table_args__ = (
+            db.Index('ix_notification_outbox_status_next', 'status', 'next_attempt_at'),
+            db.Index('ix_notification_outbox_claim_token', 'claim_token'),
+        )
+        
+        id = db.Column(db.Integer, primary_key=True)
+        notification_id = db.Column(db.Integer, db.ForeignKey('notifications_5s.id'), nullable=False, unique=True)
+        user_id = db.Column(db.Integer, db.ForeignKey('users_5s.id'), nullable=False)
+        status = db.Column(db.String(20), default='pending', nullable=False)  # pending, sending, sent, failed
+        attempts = db.Column(db.Integer, default=0, nullable=False)
+        next_attempt_at = db.Column(db.DateTime, default=datetime.utcnow, nullable=False)
+        claim_token = db.Column(db.String(32))
+        claimed_at = db.Column(db.DateTime)
+        last_error = db.Column(db.Text)
+        created_at = db.Column(db.DateTime, default=datetime.utcnow)
+        sent_at = db.Column(db.DateTime)
+
+        notification = db.relationship('Notification5S')
+
+    class Report5S(db.Model):
+        """Задание на отчет 5С за месяц и готовый файл в дисковом кэше"""
+        __tablename__ = 'reports_5s'
+        __table_args__ = (
+            # Поиск готового или строящегося отчета с теми же параметрами и данными
+            db.Index('ix_reports_5s_cache_key', 'cache_key'),
+        )
+        
+        id = db.Column(db.Integer, primary_key=True)
+        department = db.Column(db.String(100))  # None — все отделы
+        period_start = db.Column(db.Date, nullable=False)
+        period_end = db.Column(db.Date, nullable=False)  # не включительно
+        format = db.Column(db.String(10), default='html', nullable=False)  # html, pdf
+        data_version = db.Column(db.String(64), nullable=False)
+        cache_key = db.Column(db.String(64), nullable=False)
+        
+        status = db.Column(db.String(20), default='pending', nullable=False)  # pending, running, done, failed
+        attempts = db.Column(db.Integer, default=0, nullable=False)
+        error = db.Column(db.Text)
+        file_size = db.Column(db.Integer)
+        
+        requested_by = db.Column(db.Integer, db.ForeignKey('users_5s.id'))
+        created_at = db.Column(db.DateTime, default=datetime.utcnow)
+        finished_at = db.Column(db.DateTime)
+
+    class Job(db.Model):
+        """Задание фоновой очереди (выполняется процессами `flask worker`)"""
+        __tablename__ = 'job_queue'
+        __table_args__ = (
+            # Выборка следующего задания: очередь, статус, время готовности
+            db.Index('ix_job_queue_queue_status_run_at', 'queue', 'status', 'run_at'),
+            # Задания с истекшим таймаутом видимости
+            db.Index('ix_job_queue_status_locked_until', 'status', 'locked_until'),
+            db.Index('ix_job_queue_finished_at', 'finished_at'),
+        )
+        
+        id = db.Column(db.Integer, primary_key=True)
+        queue = db.Column(db.String(50), default='default', nullable=False)
+        task = db.Column(db.String(100), nullable=False)
+        payload = db.Column(db.JSON)
+        # Для заданий без аргументов: одно ожидающее задание на ключ
+        unique_key = db.Column(db.String(200))
+        
+        status = db.Column(db.String(20), default='pending', nullable=False)  # pending, running, done, failed
+        attempts = db.Column(db.Integer, default=0, nullable=False)
+        max_attempts = db.Column(db.Integer, default=5, nullable=False)
+        run_at = db.Column(db.DateTime, default=datetime.utcnow, nullable=False)
+        locked_until = db.Column(db.DateTime)
+        locked_by = db.Column(db.String(100))
+        claim_token = db.Column(db.String(32))
+        last_error = db.Column(db.Text)
+        
+        created_at = db.Column(db.DateTime, default=datetime.utcnow)
+        started_at = db.Column(db.DateTime)
+        finished_at = db.Column(db.DateTime)
+
     print("✅ SQLAlchemy модели инициализированы")
     
     # Возвращаем классы для использования в других модулях
-    return {
+    _models = {
         'User': User,
         'Area5S': Area5S,
         'Check5S': Check5S,
-        'Audit5S': Audit5S
-    }
\ No newline at end of file
+        'Audit5S': Audit5S,
+        'AreaScoreRollup': AreaScoreRollup,
+        'AreaDailyStats': AreaDailyStats,
+        'Photo5S': Photo5S,
+        'Notification5S': Notification5S,
+        'NotificationOutbox': NotificationOutbox,
+        'Report5S': Report5S,
+        'Job': Job
+    }
+    return _models
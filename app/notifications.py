@@ -0,0 +1,340 @@
+"""
+Уведомления ответственных за участки.
+
+- Низкая оценка проверки (ниже NOTIFY_LOW_SCORE_THRESHOLD) и просроченный аудит
+  создают запись notifications_5s и строку очереди notification_outbox в той же
+  транзакции, что и само событие: уведомление не теряется и не отправляется
+  для отмененной записи.
+- Доставкой занимается задание notifications.deliver очереди заданий
+  (`flask worker`): его ставит та же транзакция, что создала уведомление,
+  и оно же периодически (NOTIFY_POLL_SECONDS) досылает повторы и строки,
+  оставшиеся после перезапуска. Задание забирает пачку строк очереди (захват
+  по claim_token: несколько воркеров могут выполнять доставку одновременно),
+  объединяет уведомления одного пользователя в одно сообщение и передает
+  их транспорту. Запрос, создавший проверку, доставки не ждет.
+- Просроченные аудиты ищет периодическое задание notifications.overdue
+  (NOTIFY_OVERDUE_SCAN_SECONDS) — независимо от того, были ли новые проверки.
+- Неудачная отправка повторяется с экспоненциальной задержкой, после
+  NOTIFY_MAX_ATTEMPTS попыток строка помечается failed.
+
+Транспорт (NOTIFICATION_TRANSPORT): 'file' — JSON-строки в файл (по умолчанию,
+для разработки и тестов), 'smtp' — почта через SMTP_HOST/SMTP_PORT, либо
+любой объект с методом send_batch(messages).
+"""
+import json
+import os
+import smtplib
+import threading
+import uuid
+from datetime import datetime, timedelta
+from email.message import EmailMessage
+
+import click
+from flask import current_app
+from sqlalchemy import event, update
+from sqlalchemy.exc import IntegrityError
+from app import db, jobs
+from app.models import (
+    Area5S as Area, AreaScoreRollup as Rollup, Notification5S as Notification,
+    NotificationOutbox as Outbox, User
+)
+
+LOW_SCORE = 'low_score'
+AUDIT_OVERDUE = 'audit_overdue'
+
+
+def init_app(app):
+    app.config.setdefault('NOTIFY_LOW_SCORE_THRESHOLD', 60)
+    app.config.setdefault('NOTIFY_BATCH_SIZE', 100)
+    app.config.setdefault('NOTIFY_MAX_ATTEMPTS', 5)
+    app.config.setdefault('NOTIFY_RETRY_BASE_SECONDS', 30)
+    app.config.setdefault('NOTIFY_CLAIM_TIMEOUT', 300)
+    app.config.setdefault('NOTIFY_POLL_SECONDS', 30)
+    app.config.setdefault('NOTIFY_OVERDUE_SCAN_SECONDS', 3600)
+    app.config.setdefault('NOTIFICATION_TRANSPORT', 'file')
+    app.config.setdefault('NOTIFICATION_FILE', os.path.join(app.instance_path, 'notifications.jsonl'))
+
+    app.extensions['notifications'] = make_transport(app)
+
+
+# ===== Транспорты =====
+
+class FileTransport:
+    """Пишет сообщения JSON-строками в файл (замена почты в разработке и тестах)"""
+
+    def __init__(self, path):
+        self.path = path
+        self._lock = threading.Lock()
+
+    def send_batch(self, messages):
+        os.makedirs(os.path.dirname(self.path) or '.', exist_ok=True)
+        with self._lock, open(self.path, 'a', encoding='utf-8') as f:
+            for message in messages:
+                f.write(json.dumps(message, ensure_ascii=False) + '\n')
+        return {}
+
+
+class SMTPTransport:
+    """Отправка почтой; одно SMTP-соединение на пачку сообщений"""
+
+    def __init__(self, host, port=25, sender='5s@localhost', username=None, password=None,
+                 use_tls=False, timeout=10):
+        self.host = host
+        self.port = port
+        self.sender = sender
+        self.username = username
+        self.password = password
+        self.use_tls = use_tls
+        self.timeout = timeout
+
+    def send_batch(self, messages):
+        """Отправляет сообщения; возвращает {индекс: ошибка} для неотправленных"""
+        errors = {}
+        with smtplib.SMTP(self.host, self.port, timeout=self.timeout) as smtp:
+            if self.use_tls:
+                smtp.starttls()
+            if self.username:
+                smtp.login(self.username, self.password)
+            for index, message in enumerate(messages):
+                email = EmailMessage()
+                email['From'] = self.sender
+                email['To'] = message['to']
+                email['Subject'] = message['subject']
+                email.set_content(message['body'])
+                try:
+                    smtp.send_message(email)
+                except smtplib.SMTPException as e:
+                    errors[index] = str(e)
+        return errors
+
+
+def make_transport(app):
+    transport = app.config['NOTIFICATION_TRANSPORT']
+    if transport == 'file':
+        return FileTransport(app.config['NOTIFICATION_FILE'])
+    if transport == 'smtp':
+        return SMTPTransport(
+            app.config['SMTP_HOST'], app.config.get('SMTP_PORT', 25),
+            sender=app.config.get('SMTP_SENDER', '5s@localhost'),
+            username=app.config.get('SMTP_USERNAME'), password=app.config.get('SMTP_PASSWORD'),
+            use_tls=app.config.get('SMTP_USE_TLS', False)
+        )
+    return transport
+
+
+# ===== Создание уведомлений =====
+
+def _enqueue(user_id, kind, title, message, area_id=None, check_id=None, dedup_key=None):
+    notification = Notification(user_id=user_id, kind=kind, title=title, message=message,
+                                area_id=area_id, check_id=check_id, dedup_key=dedup_key)
+    db.session.add(notification)
+    db.session.add(Outbox(notification=notification, user_id=user_id))
+    if not db.session.info.get('notifications_enqueued'):
+        # Доставка фиксируется вместе с уведомлением
+        jobs.enqueue('notifications.deliver', unique=True)
+        db.session.info['notifications_enqueued'] = True
+    return notification
+
+
+def notify_low_scores(checks):
+    """
+    Уведомляет ответственных о проверках с низкой оценкой.
+    checks — кортежи (check_id, area_id, user_id, total_score) в текущей транзакции.
+    """
+    threshold = current_app.config['NOTIFY_LOW_SCORE_THRESHOLD']
+    low = [check for check in checks if (check[3] or 0) < threshold]
+    if not low:
+        return []
+
+    areas = {
+        area_id: (name, responsible_id)
+        for area_id, name, responsible_id in db.session.query(
+            Area.id, Area.name, Area.responsible_person_id
+        ).filter(Area.id.in_({check[1] for check in low}))
+    }
+    created = []
+    for check_id, area_id, author_id, score in low:
+        name, responsible_id = areas.get(area_id, (None, None))
+        # Ответственный, сам проводивший проверку, о ней уже знает
+        if responsible_id is None or responsible_id == author_id:
+            continue
+        created.append(_enqueue(
+            responsible_id, LOW_SCORE,
+            f'Низкая оценка 5С: {name}',
+            f'Проверка №{check_id} участка «{name}» получила {score} баллов (порог {threshold}).',
+            area_id=area_id, check_id=check_id, dedup_key=f'{LOW_SCORE}:{check_id}'
+        ))
+    return created
+
+
+def notify_overdue_audits(now=None):
+    """Уведомляет ответственных о просроченных аудитах (по индексу next_audit_at)"""
+    now = now or datetime.utcnow()
+    overdue = db.session.query(
+        Rollup.area_id, Rollup.next_audit_at, Area.name, Area.responsible_person_id
+    ).join(Area, Area.id == Rollup.area_id) \
+     .filter(Rollup.next_audit_at <= now, Area.is_active == True,  # noqa: E712
+             Area.responsible_person_id.isnot(None)).all()
+    if not overdue:
+        return 0
+
+    keys = {row.area_id: f'{AUDIT_OVERDUE}:{row.area_id}:{row.next_audit_at:%Y%m%d%H%M%S}' for row in overdue}
+    known = {key for (key,) in db.session.query(Notification.dedup_key)
+             .filter(Notification.dedup_key.in_(list(keys.values())))}
+    created = 0
+    for row in overdue:
+        if keys[row.area_id] in known:
+            continue
+        _enqueue(
+            row.responsible_person_id, AUDIT_OVERDUE,
+            f'Просрочен аудит 5С: {row.name}',
+            f'Аудит участка «{row.name}» нужно было провести до {row.next_audit_at:%d.%m.%Y}.',
+            area_id=row.area_id, dedup_key=keys[row.area_id]
+        )
+        created += 1
+    try:
+        db.session.commit()
+    except IntegrityError:
+        # Тот же просроченный аудит одновременно обработал другой процесс
+        db.session.rollback()
+        return 0
+    return created
+
+
+# ===== Доставка =====
+
+def _backoff(attempts):
+    base = current_app.config['NOTIFY_RETRY_BASE_SECONDS']
+    return timedelta(seconds=min(base * 2 ** (attempts - 1), 3600))
+
+
+def _claim(batch_size, now):
+    """Захватывает пачку строк очереди; возвращает токен захвата или None"""
+    timeout = timedelta(seconds=current_app.config['NOTIFY_CLAIM_TIMEOUT'])
+    # Строки, захваченные упавшим процессом, возвращаются в очередь
+    db.session.execute(
+        update(Outbox).where(Outbox.status == 'sending', Outbox.claimed_at < now - timeout)
+        .values(status='pending', claim_token=None)
+    )
+    ids = [outbox_id for (outbox_id,) in db.session.query(Outbox.id).filter(
+        Outbox.status == 'pending', Outbox.next_attempt_at <= now
+    ).order_by(Outbox.next_attempt_at, Outbox.id).limit(batch_size)]
+    if not ids:
+        db.session.commit()
+        return None
+
+    token = uuid.uuid4().hex
+    db.session.execute(
+        update(Outbox).where(Outbox.id.in_(ids), Outbox.status == 'pending')
+        .values(status='sending', claim_token=token, claimed_at=now)
+    )
+    db.session.commit()
+    return token
+
+
+def _compose(email, notifications):
+    """Одно сообщение на пользователя: все его уведомления из пачки"""
+    if len(notifications) == 1:
+        subject = notifications[0].title
+    else:
+        subject = f'5С: {len(notifications)} новых уведомлений'
+    body = '\n\n'.join(f'{n.title}\n{n.message or ""}'.strip() for n in notifications)
+    return {'to': email, 'subject': subject, 'body': body,
+            'notification_ids': [n.id for n in notifications]}
+
+
+def deliver_pending(transport=None, batch_size=None, now=None):
+    """Доставляет одну пачку очереди; возвращает счетчики"""
+    transport = transport or current_app.extensions['notifications']
+    batch_size = batch_size or current_app.config['NOTIFY_BATCH_SIZE']
+    now = now or datetime.utcnow()
+    stats = {'notifications': 0, 'messages': 0, 'failed': 0}
+
+    token = _claim(batch_size, now)
+    if token is None:
+        return stats
+
+    rows = db.session.query(Outbox, Notification, User.email, User.is_active) \
+        .join(Notification, Notification.id == Outbox.notification_id) \
+        .join(User, User.id == Outbox.user_id) \
+        .filter(Outbox.claim_token == token).order_by(Outbox.id).all()
+
+    by_user = {}
+    for outbox, notification, email, is_active in rows:
+        by_user.setdefault((outbox.user_id, email, is_active), []).append((outbox, notification))
+
+    messages, groups, skipped = [], [], []
+    for (user_id, email, is_active), items in by_user.items():
+        if not email or not is_active:
+            skipped.extend(outbox for outbox, _ in items)
+            continue
+        messages.append(_compose(email, [notification for _, notification in items]))
+        groups.append([outbox for outbox, _ in items])
+
+    try:
+        errors = transport.send_batch(messages) if messages else {}
+    except Exception as e:  # транспорт недоступен: повтор всей пачки
+        errors = {index: str(e) for index in range(len(messages))}
+
+    max_attempts = current_app.config['NOTIFY_MAX_ATTEMPTS']
+    for index, group in enumerate(groups):
+        for outbox in group:
+            outbox.claim_token = None
+            if index in errors:
+                outbox.attempts += 1
+                outbox.last_error = errors[index]
+                outbox.status = 'failed' if outbox.attempts >= max_attempts else 'pending'
+                outbox.next_attempt_at = now + _backoff(outbox.attempts)
+            else:
+                outbox.status = 'sent'
+                outbox.sent_at = now
+        if index in errors:
+            stats['failed'] += len(group)
+        else:
+            stats['messages'] += 1
+            stats['notifications'] += len(group)
+    for outbox in skipped:
+        outbox.claim_token = None
+        outbox.status = 'failed'
+        outbox.last_error = 'Нет адреса или пользователь неактивен'
+        stats['failed'] += 1
+    db.session.commit()
+    return stats
+
+
+@jobs.task('notifications.deliver', queue='notifications', every='NOTIFY_POLL_SECONDS')
+def deliver_all(transport=None):
+    """Доставка всей очереди пачками"""
+    totals = {'notifications': 0, 'messages': 0, 'failed': 0}
+    while True:
+        stats = deliver_pending(transport)
+        for key, value in stats.items():
+            totals[key] += value
+        if not any(stats.values()):
+            return totals
+
+
+@jobs.task('notifications.overdue', queue='notifications', every='NOTIFY_OVERDUE_SCAN_SECONDS')
+def scan_overdue_audits():
+    """Периодическая проверка просроченных аудитов; доставку ставит _enqueue"""
+    return notify_overdue_audits()
+
+
+def run_once(transport=None):
+    """Проверка просроченных аудитов и доставка всей очереди"""
+    created = notify_overdue_audits()
+    return {**deliver_all(transport), 'overdue_created': created}
+
+
+@event.listens_for(db.session, 'after_commit')
+@event.listens_for(db.session, 'after_rollback')
+def _forget_enqueued(session):
+    session.info.pop('notifications_enqueued', None)
+
+
+@click.command('notifications-send')
+def send_notifications_command():
+    """Проверить просроченные аудиты и доставить очередь уведомлений"""
+    totals = run_once()
+    click.echo(f'✅ Отправлено сообщений: {totals["messages"]} (уведомлений: {totals["notifications"]}), '
+               f'ошибок: {totals["failed"]}, новых о просрочке: {totals["overdue_created"]}')
@@ -0,0 +1,241 @@
+"""
+Хеширование паролей вне потока запроса и защита /auth/login от перебора.
+
+- Проверка и генерация хешей (PBKDF2 werkzeug) выполняются в ограниченном пуле
+  потоков: hashlib отпускает GIL, поэтому пул дает реальный параллелизм, а его
+  размер ограничивает нагрузку на CPU в пик (пересменка). Если очередь пула
+  заполнена, запрос сразу получает 503 вместо ожидания.
+- Неудачные попытки считаются в скользящем окне по имени пользователя и по IP;
+  при превышении лимита вход отклоняется с 429. Истекшие ключи удаляются при
+  каждой неудаче, а число ключей ограничено LOGIN_MAX_TRACKED_KEYS: перебор
+  случайных имен не раздувает память.
+- После успешного входа хеш, созданный с устаревшими параметрами, прозрачно
+  пересчитывается с PASSWORD_HASH_METHOD.
+"""
+import threading
+import time
+from collections import OrderedDict, deque
+from functools import lru_cache
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeout
+from flask import current_app
+from werkzeug.security import check_password_hash, generate_password_hash
+
+DEFAULT_HASH_METHOD = 'pbkdf2:sha256:600000'
+
+# Хеш для несуществующих пользователей: время ответа не выдает, есть ли такой логин
+_DUMMY_HASH = None
+
+
+class HashingBusy(RuntimeError):
+    """Очередь пула хеширования заполнена или хеш не посчитан за отведенное время"""
+
+
+def init_app(app):
+    app.config.setdefault('PASSWORD_HASH_METHOD', DEFAULT_HASH_METHOD)
+    app.config.setdefault('PASSWORD_POOL_WORKERS', 4)
+    app.config.setdefault('PASSWORD_POOL_QUEUE', 64)
+    app.config.setdefault('PASSWORD_VERIFY_TIMEOUT', 10)
+    app.config.setdefault('LOGIN_WINDOW_SECONDS', 300)
+    app.config.setdefault('LOGIN_MAX_FAILURES_PER_USER', 5)
+    app.config.setdefault('LOGIN_MAX_FAILURES_PER_IP', 50)
+    app.config.setdefault('LOGIN_MAX_TRACKED_KEYS', 100000)
+
+    hashing_pool.configure(app.config['PASSWORD_POOL_WORKERS'], app.config['PASSWORD_POOL_QUEUE'])
+    login_throttle.configure(
+        app.config['LOGIN_WINDOW_SECONDS'],
+        app.config['LOGIN_MAX_FAILURES_PER_USER'],
+        app.config['LOGIN_MAX_FAILURES_PER_IP'],
+        app.config['LOGIN_MAX_TRACKED_KEYS']
+    )
+
+
+def hash_method():
+    return current_app.config.get('PASSWORD_HASH_METHOD', DEFAULT_HASH_METHOD)
+
+
+def hash_password(password):
+    """Хеш пароля с текущими параметрами (синхронно)"""
+    return generate_password_hash(password, method=hash_method())
+
+
+@lru_cache(maxsize=8)
+def _hash_prefix(method):
+    """
+    Префикс хеша, который werkzeug пишет для method: 'scrypt' дает
+    'scrypt:32768:8:1', 'pbkdf2' — 'pbkdf2:sha256:600000'
+    """
+    return generate_password_hash('', method=method).split('$', 1)[0]
+
+
+def needs_rehash(password_hash):
+    """Хеш создан другим методом или с другим числом итераций"""
+    return not password_hash or password_hash.split('$', 1)[0] != _hash_prefix(hash_method())
+
+
+class HashingPool:
+    """Ограниченный пул потоков для PBKDF2 с метриками очереди"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._executor = None
+        self._slots = None
+        self.workers = 0
+        self.max_pending = 0
+        self.reset_stats()
+
+    def configure(self, workers, queue_size):
+        with self._lock:
+            if self._executor is not None and (workers, workers + queue_size) == (self.workers, self.max_pending):
+                return
+            if self._executor is not None:
+                self._executor.shutdown(wait=False)
+            self.workers = workers
+            self.max_pending = workers + queue_size
+            self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='password-hash')
+            self._slots = threading.BoundedSemaphore(self.max_pending)
+
+    def reset_stats(self):
+        self.submitted = self.completed = self.rejected = self.timeouts = 0
+        self.queued = self.running = 0
+        self.wait_seconds = self.work_seconds = 0.0
+
+    def run(self, fn, *args, timeout=None):
+        """Выполняет fn в пуле и ждет результат; HashingBusy, если очередь заполнена или ответа нет за timeout"""
+        if not self._slots.acquire(blocking=False):
+            with self._lock:
+                self.rejected += 1
+            raise HashingBusy('Сервер перегружен, повторите вход позже')
+
+        enqueued_at = time.perf_counter()
+        with self._lock:
+            self.submitted += 1
+            self.queued += 1
+
+        def task():
+            started_at = time.perf_counter()
+            with self._lock:
+                self.queued -= 1
+                self.running += 1
+                self.wait_seconds += started_at - enqueued_at
+            try:
+                return fn(*args)
+            finally:
+                with self._lock:
+                    self.running -= 1
+                    self.completed += 1
+                    self.work_seconds += time.perf_counter() - started_at
+                self._slots.release()
+
+        try:
+            return self._executor.submit(task).result(timeout)
+        except FutureTimeout:
+            # Задача досчитается в пуле и освободит слот, запрос ее не ждет
+            with self._lock:
+                self.timeouts += 1
+            raise HashingBusy('Сервер перегружен, повторите вход позже') from None
+
+    def stats(self):
+        with self._lock:
+            done = self.completed or 1
+            return {
+                'workers': self.workers,
+                'max_pending': self.max_pending,
+                'queue_depth': self.queued,
+                'in_flight': self.running,
+                'submitted': self.submitted,
+                'completed': self.completed,
+                'rejected': self.rejected,
+                'timeouts': self.timeouts,
+                'avg_wait_ms': round(self.wait_seconds / done * 1000, 2),
+                'avg_hash_ms': round(self.work_seconds / done * 1000, 2)
+            }
+
+
+class LoginThrottle:
+    """Скользящее окно неудачных попыток входа по пользователю и по IP"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        # Ключи в порядке последней неудачи: истекшие и самые старые — в начале
+        self._failures = OrderedDict()
+        self.window = 300
+        self.limits = {'user': 5, 'ip': 50}
+        self.max_keys = 100000
+
+    def configure(self, window, max_per_user, max_per_ip, max_keys=100000):
+        with self._lock:
+            self.window = window
+            self.limits = {'user': max_per_user, 'ip': max_per_ip}
+            self.max_keys = max_keys
+            self._failures.clear()
+
+    def __len__(self):
+        with self._lock:
+            return len(self._failures)
+
+    def _recent(self, key, now):
+        attempts = self._failures.get(key)
+        if attempts is None:
+            return None
+        while attempts and attempts[0] <= now - self.window:
+            attempts.popleft()
+        if not attempts:
+            del self._failures[key]
+            return None
+        return attempts
+
+    def retry_after(self, username, ip, now=None):
+        """Секунды до разблокировки или 0, если вход разрешен"""
+        now = now or time.monotonic()
+        wait = 0
+        with self._lock:
+            for kind, value in (('user', username.lower()), ('ip', ip)):
+                attempts = self._recent((kind, value), now)
+                if attempts and len(attempts) >= self.limits[kind]:
+                    wait = max(wait, attempts[0] + self.window - now)
+        return int(wait) + 1 if wait else 0
+
+    def failure(self, username, ip, now=None):
+        now = now or time.monotonic()
+        with self._lock:
+            for key in (('user', username.lower()), ('ip', ip)):
+                attempts = self._failures.get(key)
+                if attempts is None:
+                    attempts = self._failures[key] = deque()
+                else:
+                    self._failures.move_to_end(key)
+                attempts.append(now)
+            # Ключи без попыток в окне и сверх лимита — из начала словаря
+            while self._failures:
+                key, attempts = next(iter(self._failures.items()))
+                if attempts[-1] > now - self.window and len(self._failures) <= self.max_keys:
+                    break
+                del self._failures[key]
+
+    def success(self, username):
+        with self._lock:
+            self._failures.pop(('user', username.lower()), None)
+
+
+hashing_pool = HashingPool()
+login_throttle = LoginThrottle()
+
+
+def verify_password(password_hash, password):
+    """Проверка пароля в пуле; для отсутствующего пользователя сверяет с фиктивным хешем"""
+    global _DUMMY_HASH
+    if password_hash is None:
+        if _DUMMY_HASH is None:
+            _DUMMY_HASH = hash_password('dummy-password')
+        password_hash = _DUMMY_HASH
+        hashing_pool.run(check_password_hash, password_hash, password,
+                         timeout=current_app.config['PASSWORD_VERIFY_TIMEOUT'])
+        return False
+    return hashing_pool.run(check_password_hash, password_hash, password,
+                            timeout=current_app.config['PASSWORD_VERIFY_TIMEOUT'])
+
+
+def rehash_in_pool(password):
+    """Новый хеш с текущими параметрами, вычисленный в пуле"""
+    return hashing_pool.run(generate_password_hash, password, hash_method(),
+                            timeout=current_app.config['PASSWORD_VERIFY_TIMEOUT'])
@@ -0,0 +1,213 @@
+"""
+Фотографии проверок и аудитов.
+
+- Загрузка читается из потока запроса порциями и сразу пишется во временный файл,
+  параллельно считается sha256; весь файл в памяти не держится.
+- Файлы адресуются по хешу содержимого: повторная загрузка того же фото не
+  создает копию (дедупликация).
+- Превью (WebP) строит задание photos.variants (`flask worker`), запрос
+  загрузки их не ждет. Задание ставится в той же транзакции, что и строка фото.
+- В JSON-полях photos проверок и аудитов хранятся только id фото (sha256).
+
+Раскладка каталога UPLOAD_FOLDER:
+    originals/ab/<sha256>.<ext>
+    variants/ab/<sha256>_<variant>.webp
+    tmp/
+"""
+import hashlib
+import os
+import tempfile
+from flask import current_app
+from sqlalchemy.exc import IntegrityError
+from app import db, jobs
+from app.models import Photo5S as Photo
+
+CHUNK_SIZE = 64 * 1024
+
+# Сигнатуры поддерживаемых форматов: расширение и MIME-тип
+SIGNATURES = (
+    (b'\x89PNG\r\n\x1a\n', 'png', 'image/png'),
+    (b'\xff\xd8\xff', 'jpg', 'image/jpeg'),
+    (b'GIF87a', 'gif', 'image/gif'),
+    (b'GIF89a', 'gif', 'image/gif'),
+)
+
+# Варианты превью: имя -> наибольшая сторона в пикселях
+VARIANTS = {
+    'thumb': 320,
+    'medium': 1280,
+}
+
+
+class PhotoError(ValueError):
+    """Некорректная загрузка или ссылка на фото"""
+
+
+def init_app(app):
+    app.config.setdefault('UPLOAD_FOLDER', os.path.join(app.instance_path, 'uploads'))
+    app.config.setdefault('ALLOWED_EXTENSIONS', {'png', 'jpg', 'jpeg', 'gif'})
+    app.config.setdefault('MAX_CONTENT_LENGTH', 16 * 1024 * 1024)
+
+
+def _detect_format(head):
+    allowed = current_app.config['ALLOWED_EXTENSIONS']
+    for signature, extension, content_type in SIGNATURES:
+        if head.startswith(signature) and (extension in allowed or extension == 'jpg' and 'jpeg' in allowed):
+            return extension, content_type
+    raise PhotoError('Неподдерживаемый формат изображения')
+
+
+def upload_root():
+    return current_app.config['UPLOAD_FOLDER']
+
+
+def original_path(photo_id, extension, root=None):
+    return os.path.join(root or upload_root(), 'originals', photo_id[:2], f'{photo_id}.{extension}')
+
+
+def variant_path(photo_id, variant, root=None):
+    return os.path.join(root or upload_root(), 'variants', photo_id[:2], f'{photo_id}_{variant}.webp')
+
+
+def save_upload(stream, user_id=None):
+    """
+    Сохраняет фото из потока. Возвращает (Photo5S, created);
+    created=False, если такое же содержимое уже загружено.
+    """
+    root = upload_root()
+    max_size = current_app.config['MAX_CONTENT_LENGTH']
+    tmp_dir = os.path.join(root, 'tmp')
+    os.makedirs(tmp_dir, exist_ok=True)
+
+    digest = hashlib.sha256()
+    size = 0
+    head = b''
+    fd, tmp_path = tempfile.mkstemp(dir=tmp_dir)
+    try:
+        with os.fdopen(fd, 'wb') as tmp:
+            while True:
+                chunk = stream.read(CHUNK_SIZE)
+                if not chunk:
+                    break
+                if len(head) < 16:
+                    head += chunk[:16]
+                size += len(chunk)
+                if max_size and size > max_size:
+                    raise PhotoError('Файл слишком большой')
+                digest.update(chunk)
+                tmp.write(chunk)
+
+        if not size:
+            raise PhotoError('Пустой файл')
+        extension, content_type = _detect_format(head)
+
+        photo_id = digest.hexdigest()
+        photo = db.session.get(Photo, photo_id)
+        if photo is not None:
+            return photo, False
+
+        path = original_path(photo_id, extension, root)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        # Атомарно: параллельная загрузка того же файла перезапишет идентичное содержимое
+        os.replace(tmp_path, path)
+        tmp_path = None
+
+        photo = Photo(id=photo_id, extension=extension, content_type=content_type,
+                      size=size, uploaded_by=user_id)
+        db.session.add(photo)
+        # Задание фиксируется вместе с фото: превью не теряются при сбое между коммитами
+        jobs.enqueue('photos.variants', photo_id=photo_id, path=path, root=root)
+        try:
+            db.session.commit()
+        except IntegrityError:
+            # То же фото одновременно загрузил другой запрос
+            db.session.rollback()
+            return db.session.get(Photo, photo_id), False
+    finally:
+        if tmp_path and os.path.exists(tmp_path):
+            os.remove(tmp_path)
+
+    return photo, True
+
+
+# ===== Превью в фоне =====
+
+@jobs.task('photos.variants', queue='photos')
+def build_variants(photo_id, path, root):
+    """
+    Строит WebP-превью всех размеров; уже существующие пропускаются.
+    Ошибку записывает в журнал и повторяет очередь заданий.
+    """
+    from PIL import Image, ImageOps
+
+    built = []
+    for variant, max_side in VARIANTS.items():
+        target = variant_path(photo_id, variant, root)
+        if os.path.exists(target):
+            continue
+        os.makedirs(os.path.dirname(target), exist_ok=True)
+        with Image.open(path) as image:
+            # Для JPEG декодирование сразу в уменьшенном масштабе
+            image.draft('RGB', (max_side, max_side))
+            image = ImageOps.exif_transpose(image)
+            image.thumbnail((max_side, max_side))
+            if image.mode not in ('RGB', 'RGBA'):
+                image = image.convert('RGBA' if 'transparency' in image.info else 'RGB')
+            tmp_target = target + '.tmp'
+            image.save(tmp_target, 'WEBP', quality=80, method=4)
+            os.replace(tmp_target, target)
+        built.append(variant)
+    return built
+
+
+# ===== Отдача файлов =====
+
+def resolve_file(photo_id, variant):
+    """
+    Путь и MIME-тип файла для отдачи. Возвращает (path, content_type, immutable);
+    если превью еще не построено, отдается оригинал без долгого кэширования.
+    """
+    photo = db.session.get(Photo, photo_id)
+    if photo is None:
+        return None
+    original = original_path(photo.id, photo.extension)
+    if variant != 'original':
+        path = variant_path(photo.id, variant)
+        if os.path.exists(path):
+            return path, 'image/webp', True
+        return original, photo.content_type, False
+    return original, photo.content_type, True
+
+
+def photo_etag(photo_id, variant):
+    return f'{photo_id}-{variant}'
+
+
+# ===== Ссылки на фото в проверках и аудитах =====
+
+def normalize_refs(values):
+    """
+    Проверяет список ссылок на фото и возвращает список id.
+    Допускаются только id ранее загруженных фото.
+    """
+    if values is None:
+        return []
+    if not isinstance(values, list) or not all(isinstance(value, str) for value in values):
+        raise PhotoError('photos должен быть списком id загруженных фото')
+
+    refs = list(dict.fromkeys(value.lower() for value in values))
+    if refs:
+        known = {photo_id for (photo_id,) in db.session.query(Photo.id).filter(Photo.id.in_(refs))}
+        missing = [ref for ref in refs if ref not in known]
+        if missing:
+            raise PhotoError(f'Фото не найдены: {", ".join(missing)}')
+    return refs
+
+
+def serialize_photo(photo):
+    return {
+        'id': photo.id,
+        'content_type': photo.content_type,
+        'size': photo.size,
+        'created_at': photo.created_at.isoformat() if photo.created_at else None
+    }
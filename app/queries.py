@@ -0,0 +1,186 @@
+"""
+Агрегирующие запросы для списков участков и дашбордов
+"""
+import base64
+import json
+from datetime import datetime
+from flask import url_for
+from sqlalchemy import and_, cast, desc, func, or_
+from sqlalchemy.orm import contains_eager, joinedload
+from app import db
+from app.models import Area5S as Area, AreaScoreRollup as Rollup, Check5S as Check, User
+
+CHECKS_PAGE_DEFAULT = 50
+CHECKS_PAGE_MAX = 200
+
+
+def area_summary_query(active_only=True):
+    """
+    Сводка по участкам одним запросом: участок, ответственный,
+    дата последней проверки и средняя оценка.
+    Показатели читаются из area_score_rollup, пользователи присоединяются через JOIN.
+    """
+    query = db.session.query(
+        Area,
+        User.username.label('responsible_person'),
+        Rollup.last_check_at.label('last_check'),
+        (cast(Rollup.score_sum, db.Float) / func.nullif(Rollup.check_count, 0)).label('average_score')
+    ).outerjoin(User, User.id == Area.responsible_person_id) \
+     .outerjoin(Rollup, Rollup.area_id == Area.id)
+
+    if active_only:
+        query = query.filter(Area.is_active == True)  # noqa: E712
+
+    return query.order_by(Area.id)
+
+
+def serialize_area_summary(row):
+    """Преобразует строку сводки в словарь для JSON-ответа"""
+    area = row[0]
+    return {
+        'id': area.id,
+        'name': area.name,
+        'description': area.description,
+        'department': area.department,
+        'location': area.location,
+        'responsible_person': row.responsible_person,
+        'responsible_person_id': area.responsible_person_id,
+        'created_at': area.created_at.isoformat(),
+        'last_check': row.last_check.isoformat() if row.last_check else None,
+        'average_score': row.average_score or 0
+    }
+
+
+def area_summaries(active_only=True):
+    """Список сводок по всем участкам"""
+    return [serialize_area_summary(row) for row in area_summary_query(active_only)]
+
+
+def department_stats_query():
+    """
+    Отделы: количество активных участков и средняя оценка проверок.
+    Одна строка area_score_rollup на участок, поэтому участки не размножаются JOIN-ом.
+    """
+    average = cast(func.sum(Rollup.score_sum), db.Float) / func.nullif(func.sum(Rollup.check_count), 0)
+    return db.session.query(
+        Area.department,
+        func.count(Area.id),
+        average
+    ).outerjoin(Rollup, Rollup.area_id == Area.id) \
+     .filter(Area.is_active == True) \
+     .group_by(Area.department)
+
+
+def dashboard_stats():
+    """
+    Данные для дашборда. Счетчики проверок и аудитов суммируются по area_score_rollup,
+    последние проверки загружаются вместе с участком и автором.
+    """
+    total_areas = Area.query.filter_by(is_active=True).count()
+    total_checks, total_audits = db.session.query(
+        func.coalesce(func.sum(Rollup.check_count), 0),
+        func.coalesce(func.sum(Rollup.audit_count), 0)
+    ).one()
+
+    recent_checks = Check.query.options(joinedload(Check.area), joinedload(Check.user)) \
+        .order_by(desc(Check.checked_at)).limit(5).all()
+
+    return {
+        'total_areas': total_areas,
+        'total_checks': total_checks,
+        'total_audits': total_audits,
+        'recent_checks': [{
+            'id': check.id,
+            'area_name': check.area.name,
+            'user': check.user.username,
+            'score': check.total_score,
+            'checked_at': check.checked_at.isoformat()
+        } for check in recent_checks],
+        'department_stats': [{
+            'department': dept,
+            'area_count': count,
+            'avg_score': round(avg_score or 0, 2)
+        } for dept, count, avg_score in department_stats_query()]
+    }
+
+
+# ===== История проверок (keyset-пагинация) =====
+
+def encode_cursor(checked_at, check_id):
+    """Курсор страницы: позиция последней выданной проверки"""
+    raw = json.dumps([checked_at.isoformat(), check_id]).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip('=')
+
+
+def decode_cursor(cursor):
+    """Разбирает курсор; ValueError при некорректном значении"""
+    try:
+        raw = base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4))
+        checked_at, check_id = json.loads(raw)
+        return datetime.fromisoformat(checked_at), int(check_id)
+    except (TypeError, ValueError, UnicodeDecodeError) as e:
+        raise ValueError('Некорректный курсор') from e
+
+
+def area_checks_page(area_id, limit=CHECKS_PAGE_DEFAULT, cursor=None, since=None,
+                     until=None, user_id=None, min_score=None):
+    """
+    Страница истории проверок участка, от новых к старым.
+    Пагинация по ключу (checked_at, id): стоимость запроса не зависит от глубины страницы.
+    Возвращает (проверки, next_cursor).
+    """
+    query = db.session.query(Check).join(Check.user) \
+        .options(contains_eager(Check.user)) \
+        .filter(Check.area_id == area_id)
+
+    if since is not None:
+        query = query.filter(Check.checked_at >= since)
+    if until is not None:
+        query = query.filter(Check.checked_at < until)
+    if user_id is not None:
+        query = query.filter(Check.user_id == user_id)
+    if min_score is not None:
+        query = query.filter(Check.total_score >= min_score)
+    if cursor is not None:
+        checked_at, check_id = decode_cursor(cursor)
+        query = query.filter(or_(
+            Check.checked_at < checked_at,
+            and_(Check.checked_at == checked_at, Check.id < check_id)
+        ))
+
+    # Лишняя строка показывает, есть ли следующая страница
+    checks = query.order_by(desc(Check.checked_at), desc(Check.id)).limit(limit + 1).all()
+
+    next_cursor = None
+    if len(checks) > limit:
+        checks = checks[:limit]
+        next_cursor = encode_cursor(checks[-1].checked_at, checks[-1].id)
+
+    return checks, next_cursor
+
+
+def serialize_check(check):
+    """Проверка для JSON-ответа (пользователь должен быть загружен заранее)"""
+    return {
+        'id': check.id,
+        'area_id': check.area_id,
+        'user': check.user.username,
+        's_seiri': check.s_seiri,
+        's_seiton': check.s_seiton,
+        's_seiso': check.s_seiso,
+        's_seiketsu': check.s_seiketsu,
+        's_shitsuke': check.s_shitsuke,
+        'total_score': check.total_score,
+        'notes': check.notes,
+        'photos': [serialize_photo_ref(photo_id) for photo_id in check.photos or []],
+        'checked_at': check.checked_at.isoformat()
+    }
+
+
+def serialize_photo_ref(photo_id):
+    """Ссылка на фото для списков: по умолчанию превью, оригинал — отдельной ссылкой"""
+    return {
+        'id': photo_id,
+        'url': url_for('api.get_photo', photo_id=photo_id, variant='thumb'),
+        'original_url': url_for('api.get_photo', photo_id=photo_id)
+    }
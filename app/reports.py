@@ -0,0 +1,375 @@
+"""
+Отчеты 5С за месяц по отделу (или по всем отделам) в HTML и PDF.
+
+- Запрос только создает задание reports_5s и задание очереди reports.render;
+  строит отчет процесс `flask worker`, веб-запрос не ждет рендеринга.
+- Данные берутся из агрегатов: area_daily_stats (проверки за месяц и
+  динамика по неделям) и area_score_rollup (последний аудит), поэтому объем
+  работы зависит от числа участков, а не от числа проверок.
+- Готовый файл хранится в REPORTS_FOLDER под ключом cache_key — хеш
+  параметров и версии данных (контрольные суммы агрегатов периода). Повторный
+  запрос с теми же параметрами, пока данные не менялись, отдает готовый файл
+  или уже поставленное задание.
+"""
+import base64
+import calendar
+import hashlib
+import os
+import uuid
+from datetime import datetime, timedelta
+
+from flask import current_app, render_template, url_for
+from sqlalchemy import cast, func
+from app import analytics, db, jobs, photos
+from app.models import (
+    AreaDailyStats as Daily, AreaScoreRollup as Rollup, Area5S as Area, Audit5S as Audit,
+    Check5S as Check, Report5S as Report
+)
+from app.rollup import S_FIELDS
+
+FORMATS = {
+    'html': 'text/html; charset=utf-8',
+    'pdf': 'application/pdf',
+}
+# Меняется вместе с разметкой отчета, чтобы старые файлы кэша не отдавались
+LAYOUT_VERSION = 1
+
+FONT_CANDIDATES = (
+    '/usr/share/fonts/truetype/dejavu/DejaVuSans.ttf',
+    '/usr/share/fonts/dejavu/DejaVuSans.ttf',
+    '/Library/Fonts/Arial Unicode.ttf',
+    'C:/Windows/Fonts/arial.ttf',
+)
+
+
+class ReportError(ValueError):
+    """Некорректные параметры отчета"""
+
+
+def parse_month(value):
+    """'2024-03' -> (date(2024, 3, 1), date(2024, 4, 1))"""
+    try:
+        start = datetime.strptime(value or '', '%Y-%m').date()
+    except ValueError:
+        raise ReportError('month: месяц в формате ГГГГ-ММ')
+    days = calendar.monthrange(start.year, start.month)[1]
+    return start, start + timedelta(days=days)
+
+
+def report_path(report, root=None):
+    root = root or current_app.config['REPORTS_FOLDER']
+    return os.path.join(root, report.cache_key[:2], f'{report.cache_key}.{report.format}')
+
+
+# ===== Версия данных и постановка в очередь =====
+
+def _area_filter(query, department):
+    query = query.filter(Area.is_active == True)  # noqa: E712
+    return query.filter(Area.department == department) if department else query
+
+
+def data_version(department, start, end):
+    """
+    Контрольные суммы данных отчета: проверки периода, все аудиты (в отчете
+    последний аудит участка) и состав участков
+    """
+    checks = _area_filter(db.session.query(
+        func.count(Daily.day), func.sum(Daily.check_count), func.sum(Daily.score_sum),
+        *(func.sum(getattr(Daily, f'{name}_hits')) for name in S_FIELDS)
+    ).join(Area, Area.id == Daily.area_id), department) \
+        .filter(Daily.day >= start, Daily.day < end).one()
+    audits = _area_filter(db.session.query(
+        func.count(Audit.id), func.sum(Audit.total_score), func.max(Audit.id)
+    ).join(Area, Area.id == Audit.area_id), department).one()
+    areas = _area_filter(db.session.query(func.count(Area.id), func.max(Area.id)), department).one()
+    digest = hashlib.sha256(repr((tuple(checks), tuple(audits), tuple(areas))).encode())
+    return digest.hexdigest()[:16]
+
+
+def cache_key(department, start, file_format, version):
+    raw = f'{LAYOUT_VERSION}|{department or ""}|{start.isoformat()}|{file_format}|{version}'
+    return hashlib.sha256(raw.encode()).hexdigest()
+
+
+def request_report(month, department=None, file_format='html', user_id=None):
+    """
+    Находит готовый или строящийся отчет с теми же параметрами и данными либо
+    ставит новое задание. Возвращает (отчет, создан ли новый).
+    """
+    if file_format not in FORMATS:
+        raise ReportError(f'format: одно из {", ".join(FORMATS)}')
+    start, end = parse_month(month)
+    department = department or None
+    version = data_version(department, start, end)
+    key = cache_key(department, start, file_format, version)
+
+    existing = Report.query.filter(
+        Report.cache_key == key, Report.status.in_(('pending', 'running', 'done'))
+    ).order_by(Report.id.desc()).first()
+    if existing and (existing.status != 'done' or os.path.exists(report_path(existing))):
+        return existing, False
+
+    report = Report(department=department, period_start=start, period_end=end, format=file_format,
+                    data_version=version, cache_key=key, requested_by=user_id)
+    db.session.add(report)
+    db.session.flush()
+    # Задание очереди фиксируется вместе с отчетом и выполняется процессом `flask worker`
+    jobs.enqueue('reports.render', report_id=report.id,
+                 max_attempts=current_app.config['REPORT_MAX_ATTEMPTS'])
+    db.session.commit()
+    return report, True
+
+
+def serialize_report(report):
+    done = report.status == 'done'
+    return {
+        'id': report.id,
+        'department': report.department,
+        'month': report.period_start.strftime('%Y-%m'),
+        'format': report.format,
+        'status': report.status,
+        'error': report.error,
+        'file_size': report.file_size,
+        'created_at': report.created_at.isoformat() if report.created_at else None,
+        'finished_at': report.finished_at.isoformat() if report.finished_at else None,
+        'status_url': url_for('api.get_report', report_id=report.id),
+        'download_url': url_for('api.download_report', report_id=report.id) if done else None
+    }
+
+
+# ===== Данные отчета =====
+
+def _has_photos():
+    # None в JSON-столбце сохраняется как JSON null, пустой список — как []
+    return func.coalesce(cast(Check.photos, db.String), 'null').notin_(('null', '[]'))
+
+
+def _latest_photos(department, start, end, per_area):
+    """До per_area последних фото каждого участка за период (один запрос с оконной функцией)"""
+    position = func.row_number().over(
+        partition_by=Check.area_id, order_by=(Check.checked_at.desc(), Check.id.desc())
+    ).label('position')
+    since, until = (datetime.combine(day, datetime.min.time()) for day in (start, end))
+    recent = _area_filter(db.session.query(Check.area_id, Check.photos, position)
+                          .join(Area, Area.id == Check.area_id), department) \
+        .filter(Check.checked_at >= since, Check.checked_at < until, _has_photos()).subquery()
+
+    found = {}
+    for area_id, refs in db.session.query(recent.c.area_id, recent.c.photos) \
+            .filter(recent.c.position <= per_area).order_by(recent.c.area_id, recent.c.position):
+        bucket = found.setdefault(area_id, [])
+        bucket.extend(ref for ref in refs or () if len(bucket) < per_area)
+    return found
+
+
+def build_report_data(report):
+    """Показатели участков, динамика по неделям и фото для рендеринга"""
+    start, end = report.period_start, report.period_end
+    month = db.session.query(
+        Daily.area_id.label('area_id'),
+        func.sum(Daily.check_count).label('check_count'),
+        func.sum(Daily.score_sum).label('score_sum'),
+        *(func.sum(getattr(Daily, f'{name}_hits')).label(f'{name}_hits') for name in S_FIELDS)
+    ).filter(Daily.day >= start, Daily.day < end).group_by(Daily.area_id).subquery()
+
+    rows = _area_filter(db.session.query(
+        Area.id, Area.name, Area.department, month, Rollup.last_audit_grade, Rollup.last_audit_score,
+        Rollup.next_audit_at
+    ).outerjoin(month, month.c.area_id == Area.id)
+     .outerjoin(Rollup, Rollup.area_id == Area.id), report.department) \
+        .order_by(Area.department, Area.name).all()
+
+    per_area = current_app.config['REPORT_PHOTOS_PER_AREA']
+    area_photos = _latest_photos(report.department, start, end, per_area) if per_area else {}
+
+    areas = []
+    total_checks = total_score = 0
+    for row in rows:
+        count = row.check_count or 0
+        total_checks += count
+        total_score += row.score_sum or 0
+        areas.append({
+            'id': row.id,
+            'name': row.name,
+            'department': row.department or '',
+            'checks': count,
+            'average_score': round(row.score_sum / count, 1) if count else None,
+            'pass_rates': {name: round(100 * getattr(row, f'{name}_hits') / count) if count else None
+                           for name in S_FIELDS},
+            'last_audit_grade': row.last_audit_grade,
+            'last_audit_score': row.last_audit_score,
+            'next_audit_at': row.next_audit_at,
+            'photos': area_photos.get(row.id, [])
+        })
+
+    trend = analytics.trends('week', 'department', department=report.department, since=start, until=end)
+    return {
+        'title': f'Отчет 5С: {report.department or "все отделы"}, {start:%m.%Y}',
+        'period_start': start,
+        'period_end': end - timedelta(days=1),
+        'generated_at': datetime.utcnow(),
+        'areas': areas,
+        'area_count': len(areas),
+        'checks': total_checks,
+        'average_score': round(total_score / total_checks, 1) if total_checks else None,
+        'trend': trend['series'],
+        's_fields': S_FIELDS,
+    }
+
+
+def _thumbnail(photo_id):
+    path = photos.variant_path(photo_id, 'thumb')
+    return path if os.path.exists(path) else None
+
+
+# ===== Рендеринг =====
+
+def render_html(data, path):
+    thumbnails = {}
+    for area in data['areas']:
+        for photo_id in area['photos']:
+            thumb = _thumbnail(photo_id)
+            if thumb:
+                with open(thumb, 'rb') as f:
+                    thumbnails[photo_id] = 'data:image/webp;base64,' + base64.b64encode(f.read()).decode()
+    html = render_template('reports/department.html', data=data, thumbnails=thumbnails)
+    with open(path, 'w', encoding='utf-8') as f:
+        f.write(html)
+
+
+def _load_font(size):
+    from PIL import ImageFont
+
+    configured = current_app.config['REPORT_FONT_PATH']
+    for candidate in ([configured] if configured else []) + list(FONT_CANDIDATES):
+        if os.path.exists(candidate):
+            return ImageFont.truetype(candidate, size)
+    return ImageFont.load_default(size)
+
+
+class _PdfPages:
+    """Растровые страницы A4; каждая готовая страница сразу дописывается в файл"""
+    WIDTH, HEIGHT, MARGIN, DPI = 827, 1169, 50, 100
+
+    def __init__(self, path):
+        self.path = path
+        self.pages = 0
+        self.font = _load_font(13)
+        self.bold = _load_font(18)
+        self.page = None
+        self._new_page()
+
+    def _new_page(self):
+        from PIL import Image, ImageDraw
+
+        self.flush()
+        self.page = Image.new('RGB', (self.WIDTH, self.HEIGHT), 'white')
+        self.draw = ImageDraw.Draw(self.page)
+        self.y = self.MARGIN
+
+    def flush(self):
+        if self.page is not None:
+            self.page.save(self.path, 'PDF', resolution=self.DPI, append=self.pages > 0)
+            self.pages += 1
+            self.page = None
+
+    def ensure(self, height):
+        if self.y + height > self.HEIGHT - self.MARGIN:
+            self._new_page()
+
+    def row(self, columns, font=None, height=20):
+        self.ensure(height)
+        for x, value in columns:
+            self.draw.text((self.MARGIN + x, self.y), str(value), fill='black', font=font or self.font)
+        self.y += height
+
+    def images(self, paths, side=80):
+        from PIL import Image
+
+        self.ensure(side + 6)
+        for index, path in enumerate(paths):
+            with Image.open(path) as image:
+                image.thumbnail((side, side))
+                self.page.paste(image.convert('RGB'), (self.MARGIN + 20 + index * (side + 8), self.y))
+        self.y += side + 6
+
+
+def _fmt(value, suffix=''):
+    return '—' if value is None else f'{value}{suffix}'
+
+
+def render_pdf(data, path):
+    pages = _PdfPages(path)
+    pages.row([(0, data['title'])], font=pages.bold, height=30)
+    pages.row([(0, f'Период: {data["period_start"]:%d.%m.%Y} — {data["period_end"]:%d.%m.%Y}; '
+                   f'участков: {data["area_count"]}; проверок: {data["checks"]}; '
+                   f'средняя оценка: {_fmt(data["average_score"])}')], height=30)
+
+    pages.row([(0, 'Динамика по неделям')], font=pages.bold, height=28)
+    for series in data['trend']:
+        for point in series['points']:
+            pages.row([(0, series['department'] or '—'), (260, point['period']),
+                       (400, f'проверок: {point["checks"]}'), (560, f'средняя: {_fmt(point["average_score"])}')])
+
+    pages.row([(0, 'Участки')], font=pages.bold, height=36)
+    pages.row([(0, 'Участок'), (230, 'Отдел'), (390, 'Пров.'), (440, 'Средн.'),
+               (500, 'S1-S5, %'), (650, 'Аудит')])
+    for area in data['areas']:
+        rates = '/'.join(_fmt(area['pass_rates'][name]) for name in data['s_fields'])
+        pages.row([(0, area['name'][:28]), (230, area['department'][:20]), (390, area['checks']),
+                   (440, _fmt(area['average_score'])), (500, rates),
+                   (650, _fmt(area['last_audit_grade']))])
+        thumbs = [thumb for thumb in map(_thumbnail, area['photos']) if thumb]
+        if thumbs:
+            pages.images(thumbs)
+    pages.flush()
+
+
+RENDERERS = {'html': render_html, 'pdf': render_pdf}
+
+
+# ===== Выполнение заданий =====
+
+def init_app(app):
+    app.config.setdefault('REPORTS_FOLDER', os.path.join(app.instance_path, 'reports'))
+    app.config.setdefault('REPORT_PHOTOS_PER_AREA', 3)
+    app.config.setdefault('REPORT_FONT_PATH', None)
+    # Попытки задания reports.render; паузы между ними — JOBS_RETRY_BASE_SECONDS очереди
+    app.config.setdefault('REPORT_MAX_ATTEMPTS', 3)
+
+
+@jobs.task('reports.render', queue='reports', timeout=900)
+def render_report(report_id):
+    """Строит файл отчета (если его еще нет в кэше) и отмечает отчет выполненным"""
+    report = db.session.get(Report, report_id)
+    if report is None or report.status in ('done', 'failed'):
+        return
+    report.status = 'running'
+    report.attempts += 1
+    db.session.commit()
+
+    path = report_path(report)
+    try:
+        if not os.path.exists(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            tmp_path = f'{path}.{uuid.uuid4().hex}.tmp'
+            try:
+                RENDERERS[report.format](build_report_data(report), tmp_path)
+                os.replace(tmp_path, path)
+            finally:
+                if os.path.exists(tmp_path):
+                    os.remove(tmp_path)
+    except Exception as e:
+        # Ошибка записывается в отчет, повтор с задержкой — забота очереди
+        db.session.rollback()
+        failed = report.attempts >= current_app.config['REPORT_MAX_ATTEMPTS']
+        report.status = 'failed' if failed else 'pending'
+        report.error = str(e)
+        db.session.commit()
+        raise
+
+    report.status = 'done'
+    report.error = None
+    report.file_size = os.path.getsize(path)
+    report.finished_at = datetime.utcnow()
+    db.session.commit()
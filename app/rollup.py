@@ -0,0 +1,233 @@
+"""
+Накопительные таблицы показателей участков.
+
+- area_score_rollup — итог по участку за все время;
+- area_daily_stats — показатели проверок участка за день (графики динамики).
+
+Строки обновляются инкрементально при создании проверки или аудита,
+поэтому списки, дашборды и графики читают агрегаты вместо всей истории checks_5s.
+Команда `flask rollup-rebuild` пересчитывает таблицы целиком (заполнение и
+исправление расхождений). ROLLUP_REBUILD_SECONDS включает тот же пересчет
+периодическим заданием rollup.rebuild для `flask worker`; по умолчанию выключен:
+на большой истории пересчет долгий и держит блокировку записи таблиц.
+"""
+import click
+from sqlalchemy import case, func, insert, or_
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import joinedload
+from app import db, events, jobs, leaderboard, scheduling, scoring
+from app.models import (
+    AreaDailyStats as Daily, AreaScoreRollup as Rollup, Check5S as Check, Audit5S as Audit
+)
+
+S_FIELDS = ('seiri', 'seiton', 'seiso', 'seiketsu', 'shitsuke')
+
+
+def init_app(app):
+    # Например, 86400 — ежесуточный пересчет
+    app.config.setdefault('ROLLUP_REBUILD_SECONDS', None)
+
+
+def _latest(column, value):
+    """SQL-выражение: новое значение, если оно позже сохраненного"""
+    return case((or_(column.is_(None), column <= value), value), else_=column)
+
+
+# INSERT ... ON CONFLICT DO NOTHING по диалекту базы
+_INSERT_IGNORE = {'sqlite': sqlite.insert, 'postgresql': postgresql.insert}
+
+
+def _insert_missing(model, **key):
+    """Создает пустую строку с ключом; строка, созданная параллельной транзакцией, не ошибка"""
+    dialect_insert = _INSERT_IGNORE.get(db.session.get_bind(model).dialect.name)
+    if dialect_insert is not None:
+        db.session.execute(dialect_insert(model).values(**key).on_conflict_do_nothing())
+        return
+    try:
+        with db.session.begin_nested():
+            db.session.execute(insert(model).values(**key))
+    except IntegrityError:
+        pass
+
+
+def _upsert(area_id, values, model=Rollup, **key):
+    """Атомарно применяет выражения UPDATE, создавая строку участка при необходимости"""
+    query = db.session.query(model).filter_by(area_id=area_id, **key)
+    if not query.update(values, synchronize_session=False):
+        # Две первые записи по участку могут прийти одновременно: вставка без
+        # конфликта, затем UPDATE применяется к строке, чья бы она ни была
+        _insert_missing(model, area_id=area_id, **key)
+        query.update(values, synchronize_session=False)
+
+
+def _check_values(count, score_sum, last_check_at, hits):
+    values = {
+        Rollup.check_count: Rollup.check_count + count,
+        Rollup.score_sum: Rollup.score_sum + score_sum,
+        Rollup.last_check_at: _latest(Rollup.last_check_at, last_check_at),
+    }
+    values.update(_hit_values(Rollup, hits))
+    return values
+
+
+def _daily_values(count, score_sum, hits):
+    values = {
+        Daily.check_count: Daily.check_count + count,
+        Daily.score_sum: Daily.score_sum + score_sum,
+    }
+    values.update(_hit_values(Daily, hits))
+    return values
+
+
+def _hit_values(model, hits):
+    values = {}
+    for name in S_FIELDS:
+        if hits[name]:
+            column = getattr(model, f'{name}_hits')
+            values[column] = column + hits[name]
+    return values
+
+
+def apply_check(check):
+    """Учитывает новую проверку в накопительных показателях участка"""
+    hits = {name: int(bool(getattr(check, f's_{name}'))) for name in S_FIELDS}
+    score = check.total_score or 0
+    _upsert(check.area_id, _check_values(1, score, check.checked_at, hits))
+    _upsert(check.area_id, _daily_values(1, score, hits), model=Daily, day=check.checked_at.date())
+    leaderboard.record_check(check.area_id, check.checked_at, score)
+    events.record('check', {
+        'id': check.id,
+        'area_id': check.area_id,
+        'user_id': check.user_id,
+        'total_score': check.total_score,
+        'checked_at': check.checked_at.isoformat()
+    }, areas=[check.area_id])
+
+
+def apply_check_rows(rows):
+    """
+    Учитывает пакет проверок (словари со столбцами checks_5s):
+    показатели складываются по участкам, одно обновление на участок.
+    """
+    by_area = {}
+    by_day = {}
+    for row in rows:
+        for acc in (
+            by_area.setdefault(row['area_id'], _new_acc(row)),
+            by_day.setdefault((row['area_id'], row['checked_at'].date()), _new_acc(row)),
+        ):
+            acc['count'] += 1
+            acc['score_sum'] += row['total_score'] or 0
+            acc['last_check_at'] = max(acc['last_check_at'], row['checked_at'])
+            for name in S_FIELDS:
+                acc['hits'][name] += int(bool(row[f's_{name}']))
+
+    for area_id, acc in by_area.items():
+        _upsert(area_id, _check_values(acc['count'], acc['score_sum'], acc['last_check_at'], acc['hits']))
+    for (area_id, day), acc in by_day.items():
+        _upsert(area_id, _daily_values(acc['count'], acc['score_sum'], acc['hits']), model=Daily, day=day)
+        leaderboard.record_check(area_id, acc['last_check_at'], acc['score_sum'], count=acc['count'])
+    if by_area:
+        # Пакет — одно событие, подробности клиент берет из событий area_score
+        events.record('checks', {
+            'count': sum(acc['count'] for acc in by_area.values()),
+            'area_ids': sorted(by_area)
+        }, areas=by_area)
+
+
+def _new_acc(row):
+    return {'count': 0, 'score_sum': 0, 'last_check_at': row['checked_at'], 'hits': dict.fromkeys(S_FIELDS, 0)}
+
+
+def apply_audit(audit, grade):
+    """Учитывает новый аудит: счетчик, данные последнего аудита и срок следующего"""
+    is_latest = or_(Rollup.last_audit_at.is_(None), Rollup.last_audit_at <= audit.audit_date)
+    _upsert(audit.area_id, {
+        Rollup.audit_count: Rollup.audit_count + 1,
+        Rollup.last_audit_score: case((is_latest, audit.total_score), else_=Rollup.last_audit_score),
+        Rollup.last_audit_grade: case((is_latest, grade), else_=Rollup.last_audit_grade),
+        Rollup.next_audit_at: case((is_latest, audit.next_audit_date), else_=Rollup.next_audit_at),
+        Rollup.last_audit_at: _latest(Rollup.last_audit_at, audit.audit_date),
+    })
+    leaderboard.record_audit(audit.area_id, audit.audit_date, audit.total_score)
+    events.record('audit', {
+        'id': audit.id,
+        'area_id': audit.area_id,
+        'total_score': audit.total_score,
+        'grade': grade,
+        'audit_date': audit.audit_date.isoformat(),
+        'next_audit_date': audit.next_audit_date.isoformat() if audit.next_audit_date else None
+    }, areas=[audit.area_id])
+
+
+@jobs.task('rollup.rebuild', queue='maintenance', timeout=3600, max_attempts=1, every='ROLLUP_REBUILD_SECONDS')
+def rebuild_rollups():
+    """Полностью пересчитывает area_score_rollup и area_daily_stats по checks_5s и audits_5s"""
+    db.session.query(Rollup).delete(synchronize_session=False)
+    db.session.query(Daily).delete(synchronize_session=False)
+
+    # Проверки: один сгруппированный INSERT ... SELECT
+    hit_columns = [
+        func.sum(case((getattr(Check, f's_{name}') == True, 1), else_=0))  # noqa: E712
+        for name in S_FIELDS
+    ]
+    check_stats = db.session.query(
+        Check.area_id,
+        func.count(Check.id),
+        func.coalesce(func.sum(Check.total_score), 0),
+        func.max(Check.checked_at),
+        *hit_columns
+    ).group_by(Check.area_id)
+    db.session.execute(insert(Rollup).from_select(
+        ['area_id', 'check_count', 'score_sum', 'last_check_at'] +
+        [f'{name}_hits' for name in S_FIELDS],
+        check_stats
+    ))
+
+    # Показатели по дням
+    day = func.date(Check.checked_at)
+    daily_stats = db.session.query(
+        Check.area_id,
+        day,
+        func.count(Check.id),
+        func.coalesce(func.sum(Check.total_score), 0),
+        *hit_columns
+    ).group_by(Check.area_id, day)
+    db.session.execute(insert(Daily).from_select(
+        ['area_id', 'day', 'check_count', 'score_sum'] + [f'{name}_hits' for name in S_FIELDS],
+        daily_stats
+    ))
+
+    # Аудиты: количество и последний аудит каждого участка
+    audit_stats = db.session.query(
+        Audit.area_id.label('area_id'),
+        func.count(Audit.id).label('audit_count'),
+        func.max(Audit.audit_date).label('last_audit_at')
+    ).group_by(Audit.area_id).subquery()
+    latest_audits = db.session.query(Audit, audit_stats.c.audit_count).join(
+        audit_stats,
+        (Audit.area_id == audit_stats.c.area_id) & (Audit.audit_date == audit_stats.c.last_audit_at)
+    ).options(joinedload(Audit.area)).order_by(Audit.id)
+
+    for audit, audit_count in latest_audits:
+        grade = scoring.grade_for(audit.total_score or 0, audit.area.department)
+        _upsert(audit.area_id, {
+            Rollup.audit_count: audit_count,
+            Rollup.last_audit_at: audit.audit_date,
+            Rollup.last_audit_score: audit.total_score,
+            Rollup.last_audit_grade: grade,
+            Rollup.next_audit_at: audit.next_audit_date or scheduling.next_audit_date(
+                audit.audit_date, grade, department=audit.area.department),
+        })
+
+    db.session.commit()
+    leaderboard.leaderboard.invalidate()
+    return db.session.query(Rollup).count()
+
+
+@click.command('rollup-rebuild')
+def rebuild_rollup_command():
+    """Пересчитать таблицы area_score_rollup и area_daily_stats по всей истории"""
+    count = rebuild_rollups()
+    click.echo(f'✅ Показатели пересчитаны для {count} участков')
@@ -0,0 +1,107 @@
+"""
+Планирование аудитов 5С.
+
+Дата следующего аудита участка считается по истории оценок: базовый интервал
+задается классом последнего аудита (AUDIT_INTERVAL_DAYS), при ухудшении класса
+относительно предыдущего аудита интервал сокращается вдвое, а при повторном
+высшем классе — увеличивается в полтора раза.
+
+Дата сохраняется в audits_5s.next_audit_date и в строке участка
+area_score_rollup.next_audit_at. Индекс по next_audit_at служит очередью с
+приоритетом: список просроченных и ближайших аудитов — диапазонный запрос по
+индексу, без просмотра истории аудитов.
+"""
+from datetime import datetime, timedelta
+
+from flask import current_app
+from app import db, scoring
+from app.models import Area5S as Area, AreaScoreRollup as Rollup, User
+
+DEFAULT_AUDIT_INTERVAL_DAYS = {'A': 90, 'B': 60, 'C': 30, 'D': 14}
+DUE_LIST_MAX = 200
+
+
+def intervals():
+    configured = current_app.config.get('AUDIT_INTERVAL_DAYS') or {}
+    return {**DEFAULT_AUDIT_INTERVAL_DAYS, **configured}
+
+
+def _grade_rank(grade, department=None):
+    """Позиция класса от лучшего (0) к худшему"""
+    grades = [name for name, _ in scoring.thresholds_for(department)]
+    return grades.index(grade) if grade in grades else len(grades)
+
+
+def next_audit_date(audit_date, grade, previous_grade=None, department=None):
+    """Дата следующего аудита по классу текущего и предыдущего аудита"""
+    days = intervals().get(grade, min(intervals().values()))
+    if previous_grade is not None:
+        current_rank = _grade_rank(grade, department)
+        if current_rank > _grade_rank(previous_grade, department):
+            days /= 2
+        elif current_rank == 0 and previous_grade == grade:
+            days *= 1.5
+    return audit_date + timedelta(days=round(days))
+
+
+def schedule_audit(audit, grade):
+    """
+    Заполняет audit.next_audit_date, если дата не задана аудитором явно.
+    Вызывается до rollup.apply_audit: предыдущий класс берется из строки участка.
+    """
+    if audit.next_audit_date is None:
+        previous = db.session.query(Rollup.last_audit_grade, Rollup.last_audit_at) \
+            .filter(Rollup.area_id == audit.area_id).first()
+        previous_grade = None
+        if previous and previous.last_audit_at and previous.last_audit_at <= audit.audit_date:
+            previous_grade = previous.last_audit_grade
+        department = audit.area.department if audit.area else None
+        audit.next_audit_date = next_audit_date(audit.audit_date, grade, previous_grade, department)
+    return audit.next_audit_date
+
+
+def due_audits(within_days=0, department=None, limit=50, now=None):
+    """
+    Аудиты к проведению: участки без аудитов и участки, у которых
+    next_audit_at наступает в течение within_days дней, по возрастанию срока.
+    """
+    now = now or datetime.utcnow()
+    horizon = now + timedelta(days=within_days)
+
+    base = db.session.query(
+        Area.id, Area.name, Area.department, User.username,
+        Rollup.last_audit_at, Rollup.last_audit_grade, Rollup.next_audit_at
+    ).outerjoin(User, User.id == Area.responsible_person_id) \
+     .filter(Area.is_active == True)  # noqa: E712
+    if department:
+        base = base.filter(Area.department == department)
+
+    # Участки без аудитов: строки rollup нет или аудитов в ней не было
+    never = base.outerjoin(Rollup, Rollup.area_id == Area.id) \
+        .filter(Rollup.last_audit_at.is_(None)).order_by(Area.id).limit(limit).all()
+    scheduled = base.join(Rollup, Rollup.area_id == Area.id) \
+        .filter(Rollup.next_audit_at <= horizon) \
+        .order_by(Rollup.next_audit_at, Area.id).limit(max(limit - len(never), 0)).all()
+
+    return [_due_entry(row, now) for row in never + scheduled]
+
+
+def _due_entry(row, now):
+    area_id, name, department, responsible, last_audit_at, last_grade, next_audit_at = row
+    if last_audit_at is None:
+        status = 'never_audited'
+    elif next_audit_at <= now:
+        status = 'overdue'
+    else:
+        status = 'upcoming'
+    return {
+        'area_id': area_id,
+        'area': name,
+        'department': department,
+        'responsible_person': responsible,
+        'last_audit_at': last_audit_at.isoformat() if last_audit_at else None,
+        'last_grade': last_grade,
+        'next_audit_at': next_audit_at.isoformat() if next_audit_at else None,
+        'days_overdue': (now - next_audit_at).days if status == 'overdue' else 0,
+        'status': status
+    }
@@ -0,0 +1,137 @@
+"""
+Расчет оценок 5С для проверок и аудитов.
+
+Одна и та же формула доступна в двух видах:
+- для одной записи (используется моделями Check5S и Audit5S при создании);
+- векторно на массивах NumPy (пересчет истории, бэкфилл).
+
+Пороги оценок аудита настраиваются по отделам в конфигурации:
+GRADE_THRESHOLDS = {'Производство': [('A', 95), ('B', 80), ('C', 65), ('D', 0)]}
+"""
+import click
+from flask import current_app, has_app_context
+
+S_NAMES = ('seiri', 'seiton', 'seiso', 'seiketsu', 'shitsuke')
+CHECK_FLAGS = tuple(f's_{name}' for name in S_NAMES)
+AUDIT_FIELDS = tuple(f'{name}_score' for name in S_NAMES)
+
+# Проверка: 20 баллов за каждый выполненный критерий, максимум 100
+CHECK_POINTS_PER_S = 20
+# Аудит: каждый критерий оценивается от 0 до 20, сумма — от 0 до 100
+AUDIT_MAX_S_SCORE = 20
+
+DEFAULT_GRADE_THRESHOLDS = (('A', 90), ('B', 75), ('C', 60), ('D', 0))
+
+
+def _numpy():
+    try:
+        import numpy
+    except ImportError as e:
+        raise RuntimeError('Для пакетного расчета оценок требуется numpy') from e
+    return numpy
+
+
+# ===== Одна запись =====
+
+def check_score(flags):
+    """Оценка проверки по пяти флагам (последовательность bool)"""
+    return CHECK_POINTS_PER_S * sum(1 for flag in flags if flag)
+
+
+def audit_total(scores):
+    """Общая оценка аудита: сумма оценок пяти критериев"""
+    return sum(int(score or 0) for score in scores)
+
+
+def is_valid_audit_score(value):
+    return isinstance(value, int) and not isinstance(value, bool) and 0 <= value <= AUDIT_MAX_S_SCORE
+
+
+def thresholds_for(department=None):
+    """Пороги оценок отдела (по убыванию минимального балла)"""
+    configured = {}
+    if has_app_context():
+        configured = current_app.config.get('GRADE_THRESHOLDS') or {}
+    thresholds = configured.get(department) or configured.get('default') or DEFAULT_GRADE_THRESHOLDS
+    return sorted(thresholds, key=lambda item: item[1], reverse=True)
+
+
+def grade_for(total, department=None, thresholds=None):
+    """Буквенная оценка аудита по общему баллу"""
+    thresholds = thresholds or thresholds_for(department)
+    for grade, minimum in thresholds:
+        if total >= minimum:
+            return grade
+    return thresholds[-1][0]
+
+
+# ===== Векторный расчет =====
+
+def check_scores_array(flags):
+    """Оценки проверок: flags — массив формы (n, 5) из bool/0/1"""
+    np = _numpy()
+    return np.asarray(flags, dtype=bool).sum(axis=1, dtype=np.int64) * CHECK_POINTS_PER_S
+
+
+def audit_totals_array(scores):
+    """Общие оценки аудитов: scores — массив формы (n, 5)"""
+    np = _numpy()
+    return np.asarray(scores, dtype=np.int64).sum(axis=1)
+
+
+def grades_array(totals, department=None, thresholds=None):
+    """Буквенные оценки для массива общих баллов (те же правила, что grade_for)"""
+    np = _numpy()
+    ascending = sorted(thresholds or thresholds_for(department), key=lambda item: item[1])
+    grades = np.array([grade for grade, _ in ascending])
+    minimums = np.array([minimum for _, minimum in ascending])
+    index = np.searchsorted(minimums, np.asarray(totals), side='right') - 1
+    return grades[np.clip(index, 0, None)]
+
+
+# ===== Пересчет истории =====
+
+def rescore_checks(chunk_size=50000):
+    """
+    Пересчитывает total_score всех проверок порциями по id.
+    Обновляются только строки, оценка которых изменилась. Возвращает их количество.
+    """
+    np = _numpy()
+    from sqlalchemy import bindparam, update
+    from app import db
+    from app.models import Check5S as Check
+
+    columns = [Check.id, Check.total_score] + [getattr(Check, flag) for flag in CHECK_FLAGS]
+    statement = update(Check.__table__) \
+        .where(Check.__table__.c.id == bindparam('check_id')) \
+        .values(total_score=bindparam('new_score'))
+
+    updated = 0
+    last_id = 0
+    while True:
+        rows = db.session.query(*columns).filter(Check.id > last_id) \
+            .order_by(Check.id).limit(chunk_size).all()
+        if not rows:
+            break
+
+        data = np.array([[value or 0 for value in row] for row in rows], dtype=np.int64)
+        scores = check_scores_array(data[:, 2:])
+        changed = np.nonzero(scores != data[:, 1])[0]
+        if len(changed):
+            db.session.execute(statement, [
+                {'check_id': int(data[i, 0]), 'new_score': int(scores[i])} for i in changed
+            ])
+            updated += len(changed)
+
+        last_id = int(data[-1, 0])
+
+    db.session.commit()
+    return updated
+
+
+@click.command('rescore-checks')
+@click.option('--chunk-size', default=50000, show_default=True, help='Размер порции проверок')
+def rescore_checks_command(chunk_size):
+    """Пересчитать оценки всех проверок (после этого выполните rollup-rebuild)"""
+    updated = rescore_checks(chunk_size)
+    click.echo(f'✅ Обновлено оценок: {updated}')
@@ -0,0 +1,349 @@
+"""
+Генератор синтетических данных для нагрузочных тестов и демонстраций.
+
+`flask seed` заполняет пустую базу: отделы, участки, пользователи, проверки
+за несколько лет и аудиты с метаданными фото (файлы фото не создаются).
+
+- Строки вставляются пакетным INSERT Core (executemany) порциями по
+  chunk_size, без ORM-объектов; id назначаются заранее, поэтому внешние
+  ключи не требуют обратных запросов.
+- Все случайные величины берутся из random.Random(seed): одинаковые
+  параметры дают одинаковую базу.
+- Оценки проверок правдоподобны: у каждого участка свой базовый уровень,
+  летом (отпуска) и в конце декабря он проседает, а за годы внедрения 5С
+  постепенно растет. Аудиты идут по расписанию app.scheduling: интервал
+  зависит от класса предыдущего аудита. С параметром audits создается ровно
+  столько аудитов, поровну на участки и через равные интервалы.
+
+После вставки пересчитываются накопительные таблицы (rollup-rebuild).
+"""
+import hashlib
+import math
+import random
+import time
+from datetime import datetime, timedelta
+
+import click
+from flask import current_app
+from app import db, passwords, scheduling, scoring
+from app.cache import invalidate_dashboard
+from app.models import Area5S as Area, Audit5S as Audit, Check5S as Check, Photo5S as Photo, User
+from app.rollup import rebuild_rollups
+
+DEFAULT_PASSWORD = 'demo12345'
+DEPARTMENT_NAMES = (
+    'Производство', 'Склад', 'Сборка', 'Механообработка', 'Сварка', 'Покраска',
+    'Логистика', 'Контроль качества', 'Ремонтная служба', 'Офис'
+)
+AREA_KINDS = (
+    'Участок', 'Линия', 'Пост', 'Зона хранения', 'Рабочее место', 'Стеллаж', 'Кладовая'
+)
+POSITIONS = {
+    'admin': ('Администратор системы',),
+    'manager': ('Начальник отдела',),
+    'auditor': ('Аудитор 5С',),
+    'user': ('Оператор', 'Слесарь', 'Кладовщик', 'Мастер участка', 'Наладчик'),
+}
+# Пункты 5С выполняются с разной вероятностью: «стандартизация» и «дисциплина» сложнее
+S_OFFSETS = (0.05, 0.03, 0.0, -0.04, -0.07)
+# Смена: проверки с 7:00 до 20:00
+SHIFT_START_HOUR = 7
+SHIFT_SECONDS = 13 * 3600
+
+
+class SeedError(RuntimeError):
+    """База не пуста или параметры генерации некорректны"""
+
+
+def department_names(count):
+    names = list(DEPARTMENT_NAMES[:count])
+    for n in range(len(names), count):
+        names.append(f'{DEPARTMENT_NAMES[n % len(DEPARTMENT_NAMES)]} {n // len(DEPARTMENT_NAMES) + 1}')
+    return names
+
+
+def seasonal_factor(day):
+    """Сдвиг вероятности выполнения пункта 5С в зависимости от времени года"""
+    # Плавный спад к середине июля (отпуска) и провал в последние дни декабря
+    summer = -0.08 * (1 + math.cos(2 * math.pi * (day.timetuple().tm_yday - 196) / 365.25)) / 2
+    year_end = -0.05 if day.month == 12 and day.day >= 20 else 0.0
+    return summer + year_end
+
+
+def _chunks(rows, size):
+    chunk = []
+    for row in rows:
+        chunk.append(row)
+        if len(chunk) == size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
+def _insert(model, columns, rows, chunk_size, native=()):
+    """
+    Пакетная вставка кортежей `rows` (значения в порядке `columns`).
+    Типы колонок применяются к порции целиком, а строки уходят в executemany
+    драйвера: обработка параметров Core на каждую строку обходится дороже самой вставки.
+    Колонки `native` уже содержат значения, понятные драйверу (bool), и не преобразуются.
+    """
+    table = model.__table__
+    dialect = db.session.get_bind().dialect
+    compiled = table.insert().compile(dialect=dialect, column_keys=columns)
+    statement = str(compiled)
+    order = [columns.index(key) for key in compiled.positiontup] if dialect.positional else None
+    processors = [None if name in native else table.c[name].type.dialect_impl(dialect).bind_processor(dialect)
+                  for name in columns]
+    connection = db.session.connection()
+
+    count = 0
+    for chunk in _chunks(rows, chunk_size):
+        values = [list(map(process, column)) if process else column
+                  for process, column in zip(processors, zip(*chunk))]
+        if order is not None:
+            params = list(zip(*(values[index] for index in order)))
+        else:
+            params = [dict(zip(columns, row)) for row in zip(*values)]
+        connection.exec_driver_sql(statement, params)
+        count += len(chunk)
+    return count
+
+
+def _drop_indexes(*models):
+    """
+    Индексы удаляются на время вставки и строятся заново по готовым данным
+    (_create_indexes): это в разы быстрее обновления B-дерева на каждую строку.
+    DDL выполняется в транзакции сеанса, поэтому откат при ошибке возвращает индексы.
+    """
+    indexes = [index for model in models for index in model.__table__.indexes]
+    for index in indexes:
+        index.drop(db.session.connection())
+    return indexes
+
+
+def _create_indexes(indexes):
+    for index in indexes:
+        index.create(db.session.connection())
+
+
+def _clamp(value, low=0.02, high=0.99):
+    return min(max(value, low), high)
+
+
+def generate(departments=8, areas=1000, users=200, checks=1000000, years=3, photo_share=0.3,
+             seed=5, chunk_size=50000, password=DEFAULT_PASSWORD, now=None, audits=None):
+    """
+    Заполняет пустую базу и возвращает число созданных строк по таблицам.
+    Проверки распределяются равномерно по дням последних `years` лет.
+    audits — точное число аудитов; None — сколько даст расписание app.scheduling.
+    """
+    if min(departments, areas, users) < 1 or checks < 0 or years <= 0:
+        raise SeedError('Нужны хотя бы один отдел, участок и пользователь')
+    if audits is not None and audits < 0:
+        raise SeedError('Число аудитов не может быть отрицательным')
+    if db.session.query(User.id).first() or db.session.query(Area.id).first():
+        raise SeedError('База не пуста: генератор заполняет только пустую базу (см. --drop)')
+
+    np = scoring._numpy()
+    rng = random.Random(seed)
+    now = (now or datetime.utcnow()).replace(microsecond=0)
+    end_day = now.replace(hour=0, minute=0, second=0)
+    days = max(int(years * 365), 1)
+    start_day = end_day - timedelta(days=days - 1)
+    counts = {}
+
+    # ===== Отделы и пользователи =====
+    dept_names = department_names(departments)
+    # Один хеш на всех: PBKDF2 для каждого пользователя занял бы минуты
+    password_hash = passwords.hash_password(password)
+
+    user_rows, dept_users, auditors = [], {name: [] for name in dept_names}, []
+    for n in range(users):
+        department = dept_names[n % departments]
+        if n == 0:
+            role, username = 'admin', 'admin'
+        elif n <= departments:
+            role, username = 'manager', f'manager{n}'
+        elif n % 10 == 1:
+            role, username = 'auditor', f'auditor{n}'
+        else:
+            role, username = 'user', f'user{n}'
+        user_id = n + 1
+        user_rows.append((
+            user_id, username, f'{username}@5s.local', password_hash, role, department,
+            rng.choice(POSITIONS[role]), True, start_day - timedelta(days=rng.randint(1, 365))
+        ))
+        dept_users[department].append(user_id)
+        if role in ('admin', 'auditor'):
+            auditors.append(user_id)
+    counts['users'] = _insert(User, [
+        'id', 'username', 'email', 'password_hash', 'role', 'department', 'position', 'is_active', 'created_at'
+    ], user_rows, chunk_size)
+    counts['departments'] = departments
+    # Отдел без сотрудников (пользователей меньше, чем отделов) проверяют все
+    pools = [dept_users[name] or list(range(1, users + 1)) for name in dept_names]
+
+    # ===== Участки =====
+    area_rows, area_quality = [], []
+    for n in range(areas):
+        department = dept_names[n % departments]
+        kind = AREA_KINDS[rng.randrange(len(AREA_KINDS))]
+        area_rows.append((
+            n + 1, f'{kind} {n + 1}', department, f'{kind} отдела «{department}»',
+            f'Корпус {n % 5 + 1}, пролет {n % 12 + 1}', rng.choice(pools[n % departments]),
+            rng.random() > 0.02, start_day
+        ))
+        # Базовый уровень участка и ежегодный прирост после внедрения 5С
+        area_quality.append((rng.uniform(0.45, 0.85), rng.uniform(0.0, 0.08)))
+    counts['areas'] = _insert(Area, [
+        'id', 'name', 'department', 'description', 'location', 'responsible_person_id', 'is_active', 'created_at'
+    ], area_rows, chunk_size)
+
+    # ===== Проверки =====
+    # Генерируются порциями в numpy; время проверок возрастает вместе с id
+    np_rng = np.random.default_rng(seed)
+    base = np.array([quality[0] for quality in area_quality])
+    growth = np.array([quality[1] for quality in area_quality])
+    season = np.array([seasonal_factor(start_day + timedelta(days=day)) for day in range(days)])
+    offsets = np.array(S_OFFSETS)
+    area_pool = np.arange(areas) % departments
+    pool_users = np.array([user_id for pool in pools for user_id in pool])
+    pool_len = np.array([len(pool) for pool in pools])
+    pool_start = np.concatenate(([0], np.cumsum(pool_len)[:-1]))
+    origin = np.datetime64(start_day, 's')
+    check_columns = ['area_id', 'user_id', *scoring.CHECK_FLAGS, 'total_score', 'checked_at']
+
+    indexes = _drop_indexes(Check, Audit)
+    counts['checks'] = 0
+    for begin in range(0, checks, chunk_size):
+        position = np.arange(begin, min(begin + chunk_size, checks), dtype=np.int64) * days
+        day, within = np.divmod(position, checks)
+        seconds = SHIFT_START_HOUR * 3600 + (within * SHIFT_SECONDS) // checks
+        checked_at = origin + (day * 86400 + seconds).astype('timedelta64[s]')
+
+        area = np_rng.integers(0, areas, len(day))
+        level = base[area] + growth[area] * (day / 365.25) + season[day]
+        flags = np_rng.random((len(day), len(offsets))) < np.clip(level[:, None] + offsets, 0.02, 0.99)
+        pool = area_pool[area]
+        user = pool_users[pool_start[pool] + (np_rng.random(len(day)) * pool_len[pool]).astype(np.int64)]
+
+        counts['checks'] += _insert(Check, check_columns, zip(
+            (area + 1).tolist(), user.tolist(), *(flags[:, index].tolist() for index in range(len(offsets))),
+            scoring.check_scores_array(flags).tolist(), checked_at.astype(datetime).tolist()
+        ), chunk_size, native=scoring.CHECK_FLAGS)
+
+    # ===== Аудиты и фото =====
+    photo_rows = []
+    # Интервал до следующего аудита зависит только от классов и отдела
+    intervals = {}
+
+    def next_audit(audit_date, grade, previous_grade, department):
+        key = (grade, previous_grade, department)
+        if key not in intervals:
+            intervals[key] = scheduling.next_audit_date(start_day, grade, previous_grade, department) - start_day
+        return audit_date + intervals[key]
+
+    def audit_photos(auditor_id, audit_date):
+        refs = []
+        if rng.random() < photo_share:
+            for _ in range(rng.randint(1, 3)):
+                photo_id = hashlib.sha256(f'{seed}:{len(photo_rows)}'.encode()).hexdigest()
+                photo_rows.append((
+                    photo_id, 'jpg', 'image/jpeg', rng.randint(80 * 1024, 2 * 1024 * 1024), auditor_id, audit_date
+                ))
+                refs.append(photo_id)
+        return refs or None
+
+    def slot_date(step, slot):
+        """Случайный день внутри интервала slot, рабочее время"""
+        day = (start_day + step * (slot + rng.random())).replace(hour=0, minute=0, second=0, microsecond=0)
+        return day + timedelta(hours=rng.randint(9, 16))
+
+    def audit_rows():
+        end = end_day + timedelta(days=1)
+        for area_index, (area_id, _, _, department, *_) in enumerate(area_rows):
+            base, growth = area_quality[area_index]
+            thresholds = scoring.thresholds_for(department)
+            # Заданное число аудитов делится поровну, остаток — первым участкам
+            quota = None if audits is None else audits // areas + (area_index < audits % areas)
+            if quota is None:
+                audit_date = start_day + timedelta(days=rng.randrange(30), hours=rng.randint(9, 16))
+            elif quota:
+                step = (end - start_day) / quota
+                audit_date = slot_date(step, 0)
+            else:
+                continue
+            previous_grade = None
+            made = 0
+            while audit_date < end and (quota is None or made < quota):
+                years_in = (audit_date - start_day).days / 365.25
+                level = base + growth * years_in + seasonal_factor(audit_date)
+                scores = [
+                    max(0, min(scoring.AUDIT_MAX_S_SCORE,
+                               round(rng.gauss(_clamp(level + s_offset), 0.08) * scoring.AUDIT_MAX_S_SCORE)))
+                    for s_offset in S_OFFSETS
+                ]
+                total = scoring.audit_total(scores)
+                grade = scoring.grade_for(total, thresholds=thresholds)
+                made += 1
+                if quota is None:
+                    next_date = next_audit(audit_date, grade, previous_grade, department)
+                else:
+                    next_date = slot_date(step, made)
+                auditor_id = rng.choice(auditors)
+                yield (area_id, auditor_id, *scores, total, audit_date, next_date,
+                       audit_photos(auditor_id, audit_date), f'Класс {grade}')
+                previous_grade = grade
+                # Фактический аудит — в пределах нескольких дней от плановой даты
+                if quota is None:
+                    audit_date = next_date + timedelta(days=rng.randint(-3, 5), hours=rng.randint(-2, 2))
+                else:
+                    audit_date = next_date
+
+    counts['audits'] = _insert(Audit, [
+        'area_id', 'auditor_id', *scoring.AUDIT_FIELDS, 'total_score', 'audit_date', 'next_audit_date',
+        'photos', 'comments'
+    ], audit_rows(), chunk_size)
+    counts['photos'] = _insert(Photo, [
+        'id', 'extension', 'content_type', 'size', 'uploaded_by', 'created_at'
+    ], photo_rows, chunk_size)
+    _create_indexes(indexes)
+    db.session.commit()
+
+    rebuild_rollups()
+    invalidate_dashboard()
+    return counts
+
+
+@click.command('seed')
+@click.option('--departments', default=8, show_default=True)
+@click.option('--areas', default=1000, show_default=True)
+@click.option('--users', default=200, show_default=True)
+@click.option('--checks', default=1000000, show_default=True, help='Всего проверок')
+@click.option('--years', default=3.0, show_default=True, help='Глубина истории в годах')
+@click.option('--audits', type=int, default=None, help='Всего аудитов (по умолчанию — по расписанию)')
+@click.option('--photo-share', default=0.3, show_default=True, help='Доля аудитов с фото')
+@click.option('--seed', 'seed_value', default=5, show_default=True, help='Зерно генератора')
+@click.option('--chunk-size', default=50000, show_default=True, help='Строк в одном INSERT')
+@click.option('--password', default=DEFAULT_PASSWORD, show_default=True, help='Пароль всех пользователей')
+@click.option('--drop', is_flag=True, help='Удалить и заново создать все таблицы')
+def seed_command(departments, areas, users, checks, years, audits, photo_share, seed_value, chunk_size, password,
+                 drop):
+    """Заполнить базу синтетическими данными (отделы, участки, пользователи, проверки, аудиты)"""
+    if drop:
+        click.confirm(f'Все данные в {current_app.config["SQLALCHEMY_DATABASE_URI"]} будут удалены. Продолжить?',
+                      abort=True)
+        db.drop_all()
+    db.create_all()
+
+    started = time.perf_counter()
+    try:
+        counts = generate(departments, areas, users, checks, years, photo_share, seed_value, chunk_size, password,
+                          audits=audits)
+    except SeedError as e:
+        raise click.ClickException(str(e))
+    elapsed = time.perf_counter() - started
+    total = sum(value for key, value in counts.items() if key != 'departments')
+    click.echo(', '.join(f'{key}: {value}' for key, value in counts.items()))
+    click.echo(f'✅ Создано строк: {total} за {elapsed:.1f} с (вход: admin / {password})')
@@ -0,0 +1,148 @@
+"""
+Токены доступа для API-клиентов (киоски, планшеты) без серверной сессии.
+
+/auth/login выдает пару токенов:
+- access — короткоживущий, содержит id пользователя, имя и роль; блюпринт api
+  авторизует по нему без обращения к users_5s (Authorization: Bearer <token>);
+- refresh — долгоживущий, меняется на новую пару через /auth/token/refresh
+  (при этом проверяется, что пользователь активен).
+
+Токены подписываются SECRET_KEY (itsdangerous). Отозванные токены хранятся
+в списке отзыва по jti: проверка — поиск в словаре, O(1). Отзыв атомарен
+(проверка и запись под блокировкой или SET NX общего бэкенда): из двух
+одновременных обменов одного refresh-токена новую пару получает только один.
+"""
+import threading
+import time
+import uuid
+from flask import current_app, request
+from flask_login import UserMixin
+from itsdangerous import BadSignature, SignatureExpired, URLSafeTimedSerializer
+
+ACCESS = 'access'
+REFRESH = 'refresh'
+
+
+class TokenError(Exception):
+    """Недействительный, просроченный или отозванный токен"""
+
+
+def init_app(app):
+    app.config.setdefault('ACCESS_TOKEN_TTL', 15 * 60)
+    app.config.setdefault('REFRESH_TOKEN_TTL', 7 * 24 * 3600)
+    app.config.setdefault('TOKEN_REVOCATION_BACKEND', None)
+    revocation_list.configure(app.config['TOKEN_REVOCATION_BACKEND'])
+
+
+def _serializer(kind):
+    return URLSafeTimedSerializer(current_app.config['SECRET_KEY'], salt=f'5s-{kind}-token')
+
+
+def _ttl(kind):
+    return current_app.config['ACCESS_TOKEN_TTL' if kind == ACCESS else 'REFRESH_TOKEN_TTL']
+
+
+def issue(user, kind):
+    """Подписанный токен заданного типа для пользователя"""
+    claims = {
+        'uid': user.id,
+        'username': user.username,
+        'role': user.role,
+        'jti': uuid.uuid4().hex,
+        'exp': int(time.time()) + _ttl(kind),
+    }
+    return _serializer(kind).dumps(claims)
+
+
+def issue_pair(user):
+    return {
+        'access_token': issue(user, ACCESS),
+        'refresh_token': issue(user, REFRESH),
+        'token_type': 'Bearer',
+        'expires_in': _ttl(ACCESS)
+    }
+
+
+def decode(token, kind):
+    """Проверяет подпись, срок и отзыв; возвращает claims"""
+    try:
+        claims = _serializer(kind).loads(token, max_age=_ttl(kind))
+    except SignatureExpired as e:
+        raise TokenError('Срок действия токена истек') from e
+    except BadSignature as e:
+        raise TokenError('Недействительный токен') from e
+    if revocation_list.is_revoked(claims['jti']):
+        raise TokenError('Токен отозван')
+    return claims
+
+
+def bearer_token():
+    header = request.headers.get('Authorization', '')
+    scheme, _, token = header.partition(' ')
+    return token.strip() if scheme.lower() == 'bearer' and token.strip() else None
+
+
+class TokenUser(UserMixin):
+    """Пользователь из claims access-токена (без загрузки из базы)"""
+
+    def __init__(self, claims):
+        self.id = claims['uid']
+        self.username = claims['username']
+        self.role = claims['role']
+        self.claims = claims
+
+    def has_role(self, *role_names):
+        return self.role in role_names or self.role == 'admin'
+
+    def __repr__(self):
+        return f'<TokenUser {self.username}>'
+
+
+def load_user_from_request(req):
+    """request_loader Flask-Login: Bearer-токен принимается только блюпринтом api"""
+    if req.blueprint != 'api':
+        return None
+    token = bearer_token()
+    if token is None:
+        return None
+    try:
+        return TokenUser(decode(token, ACCESS))
+    except TokenError:
+        return None
+
+
+class RevocationList:
+    """Отозванные jti до истечения срока токена; опционально общий бэкенд кэша"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._revoked = {}
+        self.backend = None
+
+    def configure(self, backend=None):
+        with self._lock:
+            self._revoked.clear()
+            self.backend = backend
+
+    def revoke(self, jti, expires_at):
+        """Отзывает jti; False, если токен уже был отозван"""
+        ttl = max(int(expires_at - time.time()), 1)
+        if self.backend is not None:
+            return self.backend.add(f'revoked:{jti}', 1, ttl)
+        with self._lock:
+            if jti in self._revoked:
+                return False
+            self._revoked[jti] = expires_at
+            # Истекшие токены недействительны и без списка — убираем их
+            if len(self._revoked) % 1024 == 0:
+                now = time.time()
+                self._revoked = {key: exp for key, exp in self._revoked.items() if exp > now}
+            return True
+
+    def is_revoked(self, jti):
+        if self.backend is not None:
+            return self.backend.get(f'revoked:{jti}') is not None
+        return jti in self._revoked
+
+
+revocation_list = RevocationList()
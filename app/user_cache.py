@@ -0,0 +1,139 @@
+"""
+Кэш пользователей для user_loader Flask-Login.
+
+Без кэша каждый запрос с @login_required читает строку users_5s. Здесь хранится
+снимок столбцов пользователя (ограниченный LRU с TTL); на попадании из снимка
+собирается объект User и присоединяется к сессии через merge(load=False) — без SQL.
+current_user остается обычной моделью: изменения профиля сохраняются как раньше.
+
+Запись сбрасывается при любом изменении строки пользователя (профиль, пароль,
+деактивация) — по событиям SQLAlchemy после фиксации транзакции. Массовый
+query.update()/delete() по User событий строк не вызывает, поэтому после него
+сбрасывается весь кэш пользователей. SQL в обход ORM (db.session.execute(text(...)),
+другой клиент базы) кэш не видит: после такой правки нужен сброс вручную или
+ожидание USER_CACHE_TTL.
+
+По умолчанию кэш — в памяти процесса (LRUCacheBackend). Инвалидация срабатывает
+только в процессе, который изменил строку: при нескольких процессах (gunicorn
+-w N, `flask worker`) остальные видят старый снимок — роль, деактивацию — до
+USER_CACHE_LOCAL_TTL секунд (30). Это предел устаревания для рабочего режима.
+Общий USER_CACHE_BACKEND (SharedCacheBackend поверх redis-py) сбрасывается во
+всех процессах сразу и хранит снимки USER_CACHE_TTL. USER_CACHE_LOCAL=False
+выключает кэш в памяти: без общего бэкенда пользователь читается из базы.
+"""
+from datetime import datetime
+from sqlalchemy import event
+from sqlalchemy.orm import make_transient_to_detached, object_session
+from app import db
+from app.cache import LRUCacheBackend
+from app.models import User
+
+KEY_PREFIX = 'user:'
+# Хеш пароля в кэш не попадает: при обращении он дочитывается из базы
+_EXCLUDED_COLUMNS = {'password_hash'}
+_DATETIME_COLUMNS = {column.key for column in User.__table__.columns if isinstance(column.type, db.DateTime)}
+
+
+class UserCache:
+    """Кэш снимков пользователей по id"""
+
+    def __init__(self):
+        self.backend = None
+        self.ttl = 300
+        self.hits = 0
+        self.misses = 0
+
+    def init_app(self, app):
+        app.config.setdefault('USER_CACHE_BACKEND', None)
+        app.config.setdefault('USER_CACHE_TTL', 300)
+        app.config.setdefault('USER_CACHE_MAX_ENTRIES', 1024)
+        app.config.setdefault('USER_CACHE_LOCAL', True)
+        # Кэш в памяти процесса не видит изменений из других процессов: срок снимка короче
+        app.config.setdefault('USER_CACHE_LOCAL_TTL', 30)
+
+        self.backend = app.config['USER_CACHE_BACKEND']
+        self.ttl = app.config['USER_CACHE_TTL']
+        if self.backend is None and app.config['USER_CACHE_LOCAL']:
+            self.backend = LRUCacheBackend(app.config['USER_CACHE_MAX_ENTRIES'])
+            self.ttl = app.config['USER_CACHE_LOCAL_TTL']
+        self.hits = self.misses = 0
+        app.extensions['user_cache'] = self
+
+    def load(self, user_id):
+        """Пользователь, присоединенный к текущей сессии, или None"""
+        if self.backend is None:
+            return db.session.get(User, user_id)
+        snapshot = self.backend.get(KEY_PREFIX + str(user_id))
+        if snapshot is None:
+            self.misses += 1
+            user = db.session.get(User, user_id)
+            if user is not None:
+                self.backend.set(KEY_PREFIX + str(user_id), _snapshot(user), self.ttl)
+            return user
+
+        self.hits += 1
+        user = User(**_restore(snapshot))
+        make_transient_to_detached(user)
+        return db.session.merge(user, load=False)
+
+    def invalidate(self, user_id):
+        if self.backend is not None:
+            self.backend.delete(KEY_PREFIX + str(user_id))
+
+    def invalidate_all(self):
+        if self.backend is not None:
+            self.backend.clear()
+
+
+def _snapshot(user):
+    data = {}
+    for column in User.__table__.columns:
+        if column.key in _EXCLUDED_COLUMNS:
+            continue
+        value = getattr(user, column.key)
+        if column.key in _DATETIME_COLUMNS and value is not None:
+            value = value.isoformat()
+        data[column.key] = value
+    return data
+
+
+def _restore(snapshot):
+    data = dict(snapshot)
+    for key in _DATETIME_COLUMNS:
+        if data.get(key) is not None:
+            data[key] = datetime.fromisoformat(data[key])
+    return data
+
+
+user_cache = UserCache()
+
+
+# ===== Инвалидация по изменениям строк users_5s =====
+
+@event.listens_for(User, 'after_update')
+@event.listens_for(User, 'after_delete')
+def _remember_changed_user(mapper, connection, target):
+    object_session(target).info.setdefault('changed_user_ids', set()).add(target.id)
+
+
+@event.listens_for(db.session, 'do_orm_execute')
+def _remember_bulk_user_write(orm_execute_state):
+    # query.update()/delete() не вызывает after_update: затронутые id неизвестны
+    if ((orm_execute_state.is_update or orm_execute_state.is_delete)
+            and orm_execute_state.bind_mapper is not None
+            and orm_execute_state.bind_mapper.class_ is User):
+        orm_execute_state.session.info['users_bulk_changed'] = True
+
+
+@event.listens_for(db.session, 'after_commit')
+def _invalidate_changed_users(session):
+    if session.info.pop('users_bulk_changed', False):
+        user_cache.invalidate_all()
+    for user_id in session.info.pop('changed_user_ids', ()):
+        user_cache.invalidate(user_id)
+
+
+@event.listens_for(db.session, 'after_rollback')
+def _forget_changed_users(session):
+    session.info.pop('changed_user_ids', None)
+    session.info.pop('users_bulk_changed', None)
@@ -0,0 +1,355 @@
+# bench_api.py - Нагрузочный тест API на заполненной файловой SQLite
+#
+#   python benchmarks/bench_api.py                                  # 500 участков, 200 000 проверок
+#   python benchmarks/bench_api.py --areas 5000 --checks 5000000 --audits 100000 --db /tmp/5s-bench.db
+#   python benchmarks/bench_api.py --db /tmp/5s-bench.db --reuse    # база уже заполнена
+#   python benchmarks/bench_api.py --mode http --processes 8 --duration 20
+#   python benchmarks/bench_api.py --scenario areas --scenario dashboard -o before.json
+#
+# Режимы:
+#   client — Flask test client в одном процессе: время обработки без сети и сервера;
+#   http   — приложение под многопоточным werkzeug-сервером в отдельном процессе,
+#            нагрузку дают N процессов-клиентов (http.client, keep-alive, Bearer-токен).
+# Результат — JSON с пропускной способностью и p50/p95/p99 по каждому сценарию и
+# хешем коммита: два прогона на разных коммитах сравниваются построчно.
+import argparse
+import http.client
+import json
+import multiprocessing
+import os
+import random
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+# Служебные print приложения («✅ models.py загружен») уходят в stderr:
+# stdout — только JSON отчета, его можно перенаправить в файл
+REPORT_OUT, sys.stdout = sys.stdout, sys.stderr
+
+from app import create_app, db  # noqa: E402
+from app.seed import DEFAULT_PASSWORD  # noqa: E402
+
+
+# ===== Данные =====
+
+def bench_config(path, workdir):
+    """Файлы уведомлений, фото и отчетов — во временном каталоге, не в instance/ репозитория"""
+    return {
+        'SQLALCHEMY_DATABASE_URI': 'sqlite:///' + path,
+        'PROPAGATE_EXCEPTIONS': True,
+        # Метрики и SSE не нужны: измеряется само API
+        'METRICS_ENABLED': False,
+        'NOTIFICATION_FILE': os.path.join(workdir, 'notifications.jsonl'),
+        'UPLOAD_FOLDER': os.path.join(workdir, 'uploads'),
+        'REPORTS_FOLDER': os.path.join(workdir, 'reports'),
+    }
+
+
+def seed(app, args):
+    """Заполняет базу генератором `flask seed` (app/seed.py)"""
+    from app.seed import generate
+
+    with app.app_context():
+        db.create_all()
+        generate(departments=args.departments, areas=args.areas, users=args.users, checks=args.checks,
+                 years=args.years, audits=args.audits, seed=args.seed)
+        db.engine.dispose()
+
+
+def dataset(app):
+    from app.models import Area5S as Area, Audit5S as Audit, Check5S as Check, User
+
+    with app.app_context():
+        counts = {
+            'users': db.session.query(User).count(),
+            'areas': db.session.query(Area).count(),
+            'checks': db.session.query(Check).count(),
+            'audits': db.session.query(Audit).count(),
+        }
+        db.engine.dispose()
+    return counts
+
+
+# ===== Сценарии =====
+# Каждый сценарий по номеру запроса и генератору случайных чисел возвращает
+# (метод, путь, тело JSON, ожидаемый статус)
+
+def _areas(i, rng, areas):
+    return 'GET', '/api/areas', None, 200
+
+
+def _dashboard(i, rng, areas):
+    return 'GET', '/api/dashboard/stats', None, 200
+
+
+def _checks_read(i, rng, areas):
+    return 'GET', f'/api/checks/area/{rng.randint(1, areas)}?limit=50', None, 200
+
+
+def _checks_write(i, rng, areas):
+    flags = [rng.random() < 0.75 for _ in range(5)]
+    return 'POST', '/api/checks', {
+        'area_id': rng.randint(1, areas), 's_seiri': flags[0], 's_seiton': flags[1],
+        's_seiso': flags[2], 's_seiketsu': flags[3], 's_shitsuke': flags[4]
+    }, 201
+
+
+def _login(i, rng, areas):
+    return 'POST', '/auth/login', {'username': 'admin', 'password': DEFAULT_PASSWORD}, 200
+
+
+SCENARIOS = {
+    'areas': _areas,
+    'checks_read': _checks_read,
+    'checks_write': _checks_write,
+    'dashboard': _dashboard,
+    'login': _login,
+}
+
+
+def percentile(values, q):
+    if not values:
+        return None
+    if len(values) == 1:
+        return round(values[0] * 1000, 2)
+    return round(statistics.quantiles(values, n=100, method='inclusive')[q - 1] * 1000, 2)
+
+
+def summary(name, mode, latencies, errors, elapsed, **extra):
+    return {
+        'scenario': name,
+        'mode': mode,
+        **extra,
+        'ok': len(latencies),
+        'errors': errors,
+        'elapsed_s': round(elapsed, 3),
+        'requests_per_s': round(len(latencies) / elapsed, 1) if elapsed else None,
+        'p50_ms': percentile(latencies, 50),
+        'p95_ms': percentile(latencies, 95),
+        'p99_ms': percentile(latencies, 99),
+    }
+
+
+# ===== Flask test client =====
+
+def bench_client(app, name, requests, warmup, areas, seed_value):
+    rng = random.Random(seed_value)
+    client = app.test_client()
+    with client.session_transaction() as session:
+        session['_user_id'] = '1'
+        session['_fresh'] = True
+
+    def call(i):
+        method, path, payload, expected = SCENARIOS[name](i, rng, areas)
+        return client.open(path, method=method, json=payload).status_code == expected
+
+    for i in range(warmup):
+        call(i)
+    latencies, errors = [], 0
+    start = time.perf_counter()
+    for i in range(requests):
+        began = time.perf_counter()
+        if call(i):
+            latencies.append(time.perf_counter() - began)
+        else:
+            errors += 1
+    elapsed = time.perf_counter() - start
+    return summary(name, 'client', latencies, errors, elapsed)
+
+
+# ===== HTTP: сервер и процессы-клиенты =====
+
+def serve(db_path, workdir, ready):
+    from werkzeug.serving import WSGIRequestHandler, make_server
+
+    class KeepAliveHandler(WSGIRequestHandler):
+        protocol_version = 'HTTP/1.1'
+
+        def log_request(self, *args, **kwargs):
+            pass
+
+    app = create_app(bench_config(db_path, workdir))
+    server = make_server('127.0.0.1', 0, app, threaded=True, request_handler=KeepAliveHandler)
+    server.daemon_threads = True
+    ready.put(server.server_port)
+    server.serve_forever()
+
+
+class HttpClient:
+    def __init__(self, port):
+        self.port = port
+        self.connection = None
+        self.headers = {'Content-Type': 'application/json'}
+
+    def request(self, method, path, payload=None):
+        body = json.dumps(payload) if payload is not None else None
+        for attempt in range(2):
+            if self.connection is None:
+                self.connection = http.client.HTTPConnection('127.0.0.1', self.port, timeout=60)
+            try:
+                self.connection.request(method, path, body=body, headers=self.headers)
+                response = self.connection.getresponse()
+                data = response.read()
+                if response.getheader('Connection', '').lower() == 'close':
+                    self.close()
+                return response.status, data
+            except (ConnectionError, http.client.HTTPException):
+                # Сервер закрыл keep-alive соединение — повтор на новом
+                self.close()
+                if attempt:
+                    raise
+
+    def close(self):
+        if self.connection is not None:
+            self.connection.close()
+            self.connection = None
+
+    def authenticate(self):
+        status, data = self.request('POST', '/auth/login', {'username': 'admin', 'password': DEFAULT_PASSWORD})
+        if status != 200:
+            raise RuntimeError(f'Вход не выполнен: HTTP {status}')
+        self.headers['Authorization'] = 'Bearer ' + json.loads(data)['tokens']['access_token']
+
+
+def load_worker(port, name, duration, areas, seed_value, barrier, results):
+    rng = random.Random(seed_value)
+    client = HttpClient(port)
+    client.authenticate()
+    barrier.wait()
+    deadline = time.monotonic() + duration
+    latencies, errors, i = [], 0, 0
+    while time.monotonic() < deadline:
+        method, path, payload, expected = SCENARIOS[name](i, rng, areas)
+        began = time.perf_counter()
+        try:
+            status, _ = client.request(method, path, payload)
+            ok = status == expected
+        except OSError:
+            ok = False
+        if ok:
+            latencies.append(time.perf_counter() - began)
+        else:
+            errors += 1
+        i += 1
+    client.close()
+    results.put((latencies, errors))
+
+
+def bench_http(port, name, processes, duration, areas, seed_value):
+    context = multiprocessing.get_context('spawn')
+    # Процессы стартуют и входят в систему до начала замера
+    barrier = context.Barrier(processes + 1)
+    results = context.Queue()
+    workers = [
+        context.Process(target=load_worker,
+                        args=(port, name, duration, areas, seed_value + n, barrier, results))
+        for n in range(processes)
+    ]
+    for worker in workers:
+        worker.start()
+    barrier.wait()
+    start = time.perf_counter()
+
+    latencies, errors = [], 0
+    for _ in workers:
+        worker_latencies, worker_errors = results.get()
+        latencies.extend(worker_latencies)
+        errors += worker_errors
+    elapsed = time.perf_counter() - start
+    for worker in workers:
+        worker.join()
+    return summary(name, 'http', latencies, errors, elapsed, processes=processes)
+
+
+def git_commit():
+    try:
+        return subprocess.check_output(
+            ['git', 'rev-parse', '--short', 'HEAD'], cwd=os.path.dirname(__file__),
+            stderr=subprocess.DEVNULL, text=True).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Нагрузочный тест API системы 5С')
+    parser.add_argument('--db', help='Файл SQLite (по умолчанию временный)')
+    parser.add_argument('--reuse', action='store_true', help='Не заполнять базу, если файл уже есть')
+    parser.add_argument('--departments', type=int, default=8)
+    parser.add_argument('--users', type=int, default=200)
+    parser.add_argument('--areas', type=int, default=500)
+    parser.add_argument('--checks', type=int, default=200000)
+    parser.add_argument('--years', type=float, default=2, help='Глубина истории проверок и аудитов')
+    parser.add_argument('--audits', type=int, help='Всего аудитов (по умолчанию — по расписанию аудитов)')
+    parser.add_argument('--seed', type=int, default=5, help='Зерно генератора данных и запросов')
+    parser.add_argument('--mode', choices=['client', 'http', 'all'], default='all')
+    parser.add_argument('--scenario', choices=sorted(SCENARIOS), action='append',
+                        help='Сценарий (по умолчанию все)')
+    parser.add_argument('--requests', type=int, default=500, help='Запросов на сценарий в режиме client')
+    parser.add_argument('--login-requests', type=int, default=20,
+                        help='Запросов входа в режиме client (PBKDF2 — сотни мс на запрос)')
+    parser.add_argument('--warmup', type=int, default=20)
+    parser.add_argument('--processes', type=int, default=4, help='Процессов-клиентов в режиме http')
+    parser.add_argument('--duration', type=float, default=10, help='Секунд на сценарий в режиме http')
+    parser.add_argument('-o', '--output', help='Записать JSON в файл')
+    args = parser.parse_args()
+
+    tmp = tempfile.TemporaryDirectory()
+    db_path = os.path.abspath(args.db) if args.db else os.path.join(tmp.name, 'bench.db')
+
+    app = create_app(bench_config(db_path, tmp.name))
+    seed_s = None
+    if not (args.reuse and os.path.exists(db_path)):
+        if os.path.exists(db_path):
+            sys.exit(f'❌ {db_path} уже существует: укажите --reuse или другой файл')
+        print(f'🌱 Заполнение {db_path}...', file=sys.stderr)
+        started = time.perf_counter()
+        seed(app, args)
+        seed_s = round(time.perf_counter() - started, 1)
+    counts = dataset(app)
+    names = args.scenario or sorted(SCENARIOS)
+    results = []
+
+    if args.mode in ('client', 'all'):
+        for name in names:
+            print(f'⏱️  client: {name}', file=sys.stderr)
+            with app.app_context():
+                requests = args.login_requests if name == 'login' else args.requests
+                warmup = min(args.warmup, requests)
+                results.append(bench_client(app, name, requests, warmup, counts['areas'], args.seed))
+                db.engine.dispose()
+
+    if args.mode in ('http', 'all'):
+        context = multiprocessing.get_context('spawn')
+        ready = context.Queue()
+        server = context.Process(target=serve, args=(db_path, tmp.name, ready), daemon=True)
+        server.start()
+        port = ready.get(timeout=60)
+        try:
+            for name in names:
+                print(f'⏱️  http x{args.processes}: {name}', file=sys.stderr)
+                results.append(bench_http(port, name, args.processes, args.duration, counts['areas'], args.seed))
+        finally:
+            server.terminate()
+            server.join()
+
+    report = {
+        'commit': git_commit(),
+        'created_at': datetime.utcnow().isoformat(timespec='seconds'),
+        'dataset': {**counts, 'seed': args.seed, 'seed_s': seed_s},
+        'results': results,
+    }
+    output = json.dumps(report, ensure_ascii=False, indent=2)
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            f.write(output + '\n')
+    else:
+        print(output, file=REPORT_OUT)
+    tmp.cleanup()
+
+
+if __name__ == '__main__':
+    main()
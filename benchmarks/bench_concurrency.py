@@ -0,0 +1,126 @@
+# bench_concurrency.py - Параллельные писатели POST /api/checks на файловой SQLite
+#
+#   python benchmarks/bench_concurrency.py                          # 8 потоков x 200 проверок
+#   python benchmarks/bench_concurrency.py --writers 16 --checks 100
+#
+# Сравниваются профили: baseline (журнал DELETE, synchronous=FULL, как до WAL)
+# и tuned (профиль по умолчанию из app/database.py).
+import argparse
+import json
+import os
+import statistics
+import sys
+import tempfile
+import threading
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from app import create_app, db  # noqa: E402
+
+PROFILES = {
+    'baseline': {'SQLITE_JOURNAL_MODE': 'DELETE', 'SQLITE_SYNCHRONOUS': 'FULL', 'SQLITE_MMAP_SIZE': 0},
+    'tuned': {},
+}
+
+
+def seed(app, writers):
+    from app.models import Area5S as Area, User
+
+    with app.app_context():
+        db.create_all()
+        users = []
+        for i in range(writers):
+            user = User(username=f'writer{i}', email=f'writer{i}@5s.local', password_hash='-')
+            db.session.add(user)
+            users.append(user)
+        db.session.add_all(Area(name=f'Участок {i}') for i in range(20))
+        db.session.commit()
+        return [user.id for user in users]
+
+
+def writer(app, user_id, count, latencies, errors, barrier):
+    client = app.test_client()
+    with client.session_transaction() as session:
+        session['_user_id'] = str(user_id)
+        session['_fresh'] = True
+    barrier.wait()
+    for i in range(count):
+        payload = {
+            'area_id': i % 20 + 1, 's_seiri': True, 's_seiton': i % 2 == 0,
+            's_seiso': True, 's_seiketsu': i % 3 == 0, 's_shitsuke': True
+        }
+        start = time.perf_counter()
+        try:
+            response = client.post('/api/checks', json=payload)
+            ok = response.status_code == 201
+        except Exception:  # "database is locked" и прочие ошибки драйвера
+            ok = False
+        elapsed = time.perf_counter() - start
+        if ok:
+            latencies.append(elapsed)
+        else:
+            errors.append(elapsed)
+
+
+def percentile(values, q):
+    if not values:
+        return None
+    return round(statistics.quantiles(values, n=100, method='inclusive')[q - 1] * 1000, 2)
+
+
+def bench_profile(name, writers, checks):
+    with tempfile.TemporaryDirectory() as tmp:
+        app = create_app({
+            'SQLALCHEMY_DATABASE_URI': 'sqlite:///' + os.path.join(tmp, 'bench.db'),
+            'PROPAGATE_EXCEPTIONS': True,
+            **PROFILES[name]
+        })
+        user_ids = seed(app, writers)
+
+        latencies, errors = [], []
+        barrier = threading.Barrier(writers + 1)
+        threads = [
+            threading.Thread(target=writer, args=(app, user_id, checks, latencies, errors, barrier))
+            for user_id in user_ids
+        ]
+        for thread in threads:
+            thread.start()
+        barrier.wait()
+        start = time.perf_counter()
+        for thread in threads:
+            thread.join()
+        elapsed = time.perf_counter() - start
+
+        with app.app_context():
+            db.engine.dispose()
+
+    return {
+        'profile': name,
+        'writers': writers,
+        'checks': writers * checks,
+        'ok': len(latencies),
+        'errors': len(errors),
+        'elapsed_s': round(elapsed, 3),
+        'checks_per_s': round(len(latencies) / elapsed, 1),
+        'p50_ms': percentile(latencies, 50),
+        'p95_ms': percentile(latencies, 95),
+        'p99_ms': percentile(latencies, 99),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Бенчмарк параллельной записи проверок')
+    parser.add_argument('--writers', type=int, default=8)
+    parser.add_argument('--checks', type=int, default=200, help='Проверок на одного писателя')
+    parser.add_argument('--profile', choices=sorted(PROFILES), action='append',
+                        help='Профиль (по умолчанию все)')
+    args = parser.parse_args()
+
+    print('⏱️  Бенчмарк параллельной записи проверок 5С', file=sys.stderr)
+    results = [bench_profile(name, args.writers, args.checks) for name in args.profile or PROFILES]
+    print(json.dumps(results, ensure_ascii=False, indent=2))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,102 @@
+# bench_scoring.py - Сравнение построчного и векторного пересчета оценок проверок
+#
+#   python benchmarks/bench_scoring.py                      # 1 000 000 проверок в памяти
+#   python benchmarks/bench_scoring.py --db --checks 200000 # пересчет в SQLite через ORM и rescore_checks
+import argparse
+import json
+import os
+import sys
+import tempfile
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from app import scoring  # noqa: E402
+
+
+def timed(fn):
+    start = time.perf_counter()
+    result = fn()
+    return result, time.perf_counter() - start
+
+
+def bench_memory(count, seed):
+    rng = np.random.default_rng(seed)
+    flags = rng.integers(0, 2, size=(count, 5)).astype(bool)
+    rows = flags.tolist()
+
+    row_scores, row_time = timed(lambda: [scoring.check_score(row) for row in rows])
+    vec_scores, vec_time = timed(lambda: scoring.check_scores_array(flags))
+    assert vec_scores.tolist() == row_scores
+
+    return {
+        'mode': 'memory',
+        'checks': count,
+        'row_by_row_s': round(row_time, 4),
+        'vectorized_s': round(vec_time, 4),
+        'speedup': round(row_time / vec_time, 1) if vec_time else None,
+    }
+
+
+def seed_database(db, count, seed):
+    from sqlalchemy import insert
+    from app.models import Area5S as Area, Check5S as Check, User
+
+    rng = np.random.default_rng(seed)
+    db.session.execute(insert(User), [{'username': 'bench', 'email': 'bench@5s.local', 'password_hash': '-'}])
+    db.session.execute(insert(Area), [{'name': f'Участок {i}'} for i in range(100)])
+    flags = rng.integers(0, 2, size=(count, 5)).astype(bool)
+    area_ids = rng.integers(1, 101, size=count)
+    for start in range(0, count, 50000):
+        db.session.execute(insert(Check), [{
+            'area_id': int(area_ids[i]), 'user_id': 1, 'total_score': 0,
+            **dict(zip(scoring.CHECK_FLAGS, map(bool, flags[i])))
+        } for i in range(start, min(start + 50000, count))])
+    db.session.commit()
+
+
+def bench_database(count, seed):
+    from app import create_app, db
+    from app.models import Check5S as Check
+
+    results = {'mode': 'sqlite', 'checks': count}
+    for method in ('row_by_row', 'vectorized'):
+        with tempfile.TemporaryDirectory() as tmp:
+            app = create_app({'SQLALCHEMY_DATABASE_URI': 'sqlite:///' + os.path.join(tmp, 'bench.db')})
+            with app.app_context():
+                db.create_all()
+                seed_database(db, count, seed)
+
+                if method == 'row_by_row':
+                    def run():
+                        for check in Check.query.yield_per(5000):
+                            check.calculate_score()
+                        db.session.commit()
+                else:
+                    def run():
+                        scoring.rescore_checks()
+
+                _, elapsed = timed(run)
+                results[f'{method}_s'] = round(elapsed, 3)
+                db.session.remove()
+
+    results['speedup'] = round(results['row_by_row_s'] / results['vectorized_s'], 1)
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Бенчмарк пересчета оценок проверок')
+    parser.add_argument('--checks', type=int, default=1_000_000)
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--db', action='store_true', help='Пересчет в базе SQLite вместо массивов в памяти')
+    args = parser.parse_args()
+
+    print('⏱️  Бенчмарк пересчета оценок 5С', file=sys.stderr)
+    result = bench_database(args.checks, args.seed) if args.db else bench_memory(args.checks, args.seed)
+    print(json.dumps(result, ensure_ascii=False, indent=2))
+
+
+if __name__ == '__main__':
+    main()
@@ -19,4 +19,9 @@ class Config:
     PWA_NAME = 'Система 5С'
     PWA_DESCRIPTION = 'Система аудитов и самопроверок 5С'
     PWA_THEME_COLOR = '#0d6efd'
-    PWA_BACKGROUND_COLOR = '#ffffff'
\ No newline at end of file
+    PWA_BACKGROUND_COLOR = '#ffffff'
+    
+    # Метрики Prometheus (/metrics): вне debug/testing отдаются только с
+    # заголовком Authorization: Bearer <METRICS_TOKEN>, без токена — 404.
+    # METRICS_PUBLIC = True открывает эндпоинт без токена (например, за файрволом)
+    METRICS_TOKEN = os.environ.get('METRICS_TOKEN')
@@ -0,0 +1,91 @@
+# conftest.py - Общие фикстуры pytest для тестов системы 5С
+import pytest
+from flask import g
+
+from app import create_app, db
+
+
+@pytest.fixture
+def app():
+    """Приложение с базой данных в памяти"""
+    app = create_app({
+        'TESTING': True,
+        'SQLALCHEMY_DATABASE_URI': 'sqlite://',
+        # Быстрый хеш паролей для тестов
+        'PASSWORD_HASH_METHOD': 'pbkdf2:sha256:1000',
+    })
+
+    # Тесты держат один контекст приложения на все запросы, поэтому g живет дольше
+    # запроса; сбрасываем кэш пользователя Flask-Login, как после настоящего запроса
+    @app.teardown_request
+    def reset_login_user(exc):
+        g.pop('_login_user', None)
+
+    with app.app_context():
+        db.create_all()
+        yield app
+        db.session.remove()
+        db.drop_all()
+
+
+@pytest.fixture
+def client(app):
+    return app.test_client()
+
+
+@pytest.fixture
+def make_user(app):
+    """Создает пользователя с заданной ролью"""
+    from app.models import User
+
+    def _make_user(username, role='user', password='secret', **kwargs):
+        user = User(username=username, email=f'{username}@5s.local', role=role, **kwargs)
+        user.set_password(password)
+        db.session.add(user)
+        db.session.commit()
+        return user
+
+    return _make_user
+
+
+@pytest.fixture
+def login(client):
+    """Авторизует тестовый клиент от имени пользователя без запроса к /auth/login"""
+    def _login(user):
+        with client.session_transaction() as session:
+            session['_user_id'] = str(user.id)
+            session['_fresh'] = True
+        return client
+
+    return _login
+
+
+class QueryCounter:
+    """Считает SQL-запросы, отправленные движком"""
+
+    def __init__(self, engine):
+        self.engine = engine
+        self.statements = []
+        self.executions = []
+
+    def _before_cursor_execute(self, conn, cursor, statement, parameters, context, executemany):
+        self.statements.append(statement)
+        self.executions.append((statement, parameters))
+
+    def __enter__(self):
+        from sqlalchemy import event
+        event.listen(self.engine, 'before_cursor_execute', self._before_cursor_execute)
+        return self
+
+    def __exit__(self, *exc):
+        from sqlalchemy import event
+        event.remove(self.engine, 'before_cursor_execute', self._before_cursor_execute)
+
+    @property
+    def count(self):
+        return len(self.statements)
+
+
+@pytest.fixture
+def count_queries(app):
+    return lambda: QueryCounter(db.engine)
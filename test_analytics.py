@@ -0,0 +1,148 @@
+# test_analytics.py - Динамика оценок по дням, неделям и месяцам
+from datetime import date, datetime
+
+import pytest
+
+from app import db
+from app.models import AreaDailyStats as Daily, Area5S as Area, Check5S as Check
+from app.rollup import rebuild_rollups
+
+FLAGS = ('s_seiri', 's_seiton', 's_seiso', 's_seiketsu', 's_shitsuke')
+
+
+@pytest.fixture
+def areas(client, make_user, login):
+    manager = make_user('manager', role='manager')
+    login(manager)
+    warehouse = Area(name='Склад', department='Логистика')
+    shop = Area(name='Цех', department='Производство')
+    db.session.add_all([warehouse, shop])
+    db.session.commit()
+    return warehouse, shop
+
+
+def post_check(client, area, checked, **extra):
+    """Проверка через API; checked — список выполненных S"""
+    payload = {flag: flag in checked for flag in FLAGS}
+    response = client.post('/api/checks', json={'area_id': area.id, **payload, **extra})
+    assert response.status_code == 201
+    return db.session.get(Check, response.get_json()['check']['id'])
+
+
+def backdate(check, when):
+    check.checked_at = when
+    db.session.commit()
+
+
+def test_daily_stats_updated_on_write(client, areas):
+    warehouse, _ = areas
+    post_check(client, warehouse, ['s_seiri', 's_seiso'])
+    post_check(client, warehouse, ['s_seiri'])
+
+    (row,) = Daily.query.all()
+    assert (row.area_id, row.day) == (warehouse.id, datetime.utcnow().date())
+    assert (row.check_count, row.score_sum, row.seiri_hits, row.seiso_hits, row.seiton_hits) == (2, 60, 2, 1, 0)
+
+
+def test_batch_ingest_updates_daily_stats(client, areas):
+    warehouse, _ = areas
+    checks = [
+        {'client_uuid': f'00000000-0000-0000-0000-00000000000{i}', 'area_id': warehouse.id,
+         'checked_at': f'2024-03-0{i}T10:00:00', **{flag: True for flag in FLAGS}}
+        for i in range(1, 4)
+    ]
+    assert client.post('/api/checks/batch', json={'checks': checks}).status_code == 200
+    assert [(row.day, row.check_count, row.score_sum) for row in Daily.query.order_by(Daily.day)] == [
+        (date(2024, 3, day), 1, 100) for day in (1, 2, 3)
+    ]
+
+
+def seed_history(client, areas):
+    warehouse, shop = areas
+    # Понедельник 2024-01-01 и воскресенье 2024-01-07 — одна неделя; 2024-01-08 — следующая
+    for when, checked in (
+        (datetime(2024, 1, 1, 9), FLAGS),
+        (datetime(2024, 1, 7, 18), ['s_seiri']),
+        (datetime(2024, 1, 8, 9), ['s_seiri', 's_seiton']),
+        (datetime(2024, 2, 15, 9), FLAGS),
+    ):
+        backdate(post_check(client, warehouse, checked), when)
+    backdate(post_check(client, shop, ['s_seiso']), datetime(2024, 1, 3, 12))
+    rebuild_rollups()
+
+
+def test_weekly_trends_per_area(client, areas):
+    seed_history(client, areas)
+
+    data = client.get('/api/analytics/trends?bucket=week').get_json()
+    warehouse = data['series'][0]
+    assert (warehouse['area'], data['bucket']) == ('Склад', 'week')
+    assert [(p['period'], p['checks'], p['average_score']) for p in warehouse['points']] == [
+        ('2024-01-01', 2, 60.0), ('2024-01-08', 1, 40.0), ('2024-02-12', 1, 100.0)
+    ]
+    assert warehouse['points'][0]['pass_rates'] == {
+        'seiri': 1.0, 'seiton': 0.5, 'seiso': 0.5, 'seiketsu': 0.5, 'shitsuke': 0.5
+    }
+
+
+def test_monthly_trends_per_department(client, areas):
+    seed_history(client, areas)
+
+    data = client.get('/api/analytics/trends?bucket=month&group_by=department').get_json()
+    series = {s['department']: s['points'] for s in data['series']}
+    assert [(p['period'], p['checks']) for p in series['Логистика']] == [('2024-01-01', 3), ('2024-02-01', 1)]
+    assert series['Производство'][0]['pass_rates']['seiso'] == 1.0
+
+
+def test_filters_and_daily_buckets(client, areas):
+    warehouse, _ = areas
+    seed_history(client, areas)
+
+    data = client.get(
+        f'/api/analytics/trends?bucket=day&area_id={warehouse.id}&since=2024-01-02&until=2024-02-01'
+    ).get_json()
+    assert len(data['series']) == 1
+    assert [p['period'] for p in data['series'][0]['points']] == ['2024-01-07', '2024-01-08']
+
+    # Частично попавший в период последний день входит целиком
+    data = client.get(
+        f'/api/analytics/trends?bucket=day&area_id={warehouse.id}&since=2024-01-02&until=2024-01-08T12:00'
+    ).get_json()
+    assert [p['period'] for p in data['series'][0]['points']] == ['2024-01-07', '2024-01-08']
+    data = client.get(
+        f'/api/analytics/trends?bucket=day&area_id={warehouse.id}&since=2024-01-02&until=2024-01-08'
+    ).get_json()
+    assert [p['period'] for p in data['series'][0]['points']] == ['2024-01-07']
+
+
+def test_trends_read_only_daily_table(client, areas, count_queries):
+    seed_history(client, areas)
+    with count_queries() as counter:
+        client.get('/api/analytics/trends?bucket=month')
+    assert not [s for s in counter.statements if 'checks_5s' in s]
+
+
+def test_bucket_sql_per_dialect(app, monkeypatch):
+    from sqlalchemy.dialects import mysql, postgresql
+    from app import analytics
+
+    for dialect, expected in ((postgresql.dialect(), 'date_trunc'), (mysql.dialect(), 'weekday')):
+        monkeypatch.setattr(db.engine, 'dialect', dialect)
+        assert expected in str(analytics._bucket_expr('week').compile(dialect=dialect))
+
+
+def test_buckets_without_dialect_support(client, areas, monkeypatch):
+    from app import analytics
+
+    seed_history(client, areas)
+    params = [(bucket, group) for bucket in analytics.BUCKETS for group in analytics.GROUPS]
+    native = [analytics.trends(*args) for args in params]
+    # База без выражения периода: SQL группирует по дням, недели и месяцы сводятся в Python
+    monkeypatch.setattr(db.engine.dialect, 'name', 'oracle')
+    assert analytics._bucket_expr('week') is None
+    assert [analytics.trends(*args) for args in params] == native
+
+
+def test_invalid_parameters(client, areas):
+    assert client.get('/api/analytics/trends?bucket=year').status_code == 400
+    assert client.get('/api/analytics/trends?group_by=user').status_code == 400
@@ -0,0 +1,59 @@
+# test_area_queries.py - Сводка по участкам одним запросом
+from datetime import datetime, timedelta
+
+from app import db
+from app.rollup import rebuild_rollups
+from app.models import Area5S as Area, Check5S as Check
+
+
+def seed_areas(responsible, author, count, checks_per_area=3):
+    start = datetime(2024, 1, 1)
+    for i in range(count):
+        area = Area(name=f'Участок {i}', department='Производство',
+                    responsible_person_id=responsible.id if i % 2 == 0 else None)
+        db.session.add(area)
+        db.session.flush()
+        for j in range(checks_per_area):
+            db.session.add(Check(area_id=area.id, user_id=author.id,
+                                 total_score=20 * (j + 1),
+                                 checked_at=start + timedelta(days=j)))
+    db.session.commit()
+    rebuild_rollups()
+
+
+def test_areas_summary_values(client, make_user, login):
+    manager = make_user('manager1', role='manager')
+    seed_areas(manager, manager, 2)
+    db.session.add(Area(name='Пустой участок'))
+    db.session.add(Area(name='Закрытый участок', is_active=False))
+    db.session.commit()
+
+    response = login(manager).get('/api/areas')
+    assert response.status_code == 200
+    areas = {area['name']: area for area in response.get_json()}
+
+    assert set(areas) == {'Участок 0', 'Участок 1', 'Пустой участок'}
+    assert areas['Участок 0']['responsible_person'] == 'manager1'
+    assert areas['Участок 1']['responsible_person'] is None
+    assert areas['Участок 0']['average_score'] == 40
+    assert areas['Участок 0']['last_check'] == datetime(2024, 1, 3).isoformat()
+    assert areas['Пустой участок']['last_check'] is None
+    assert areas['Пустой участок']['average_score'] == 0
+
+
+def test_areas_query_count_does_not_grow(client, make_user, login, count_queries):
+    manager = make_user('manager1', role='manager')
+    login(manager)
+
+    seed_areas(manager, manager, 3)
+    client.get('/api/areas')  # прогрев кэша пользователей
+    with count_queries() as small:
+        client.get('/api/areas')
+
+    seed_areas(manager, manager, 50)
+    with count_queries() as large:
+        response = client.get('/api/areas')
+
+    assert len(response.get_json()) == 53
+    # Один сгруппированный запрос независимо от числа участков
+    assert small.count == large.count == 1
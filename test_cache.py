@@ -0,0 +1,99 @@
+# test_cache.py - Кэш статистики дашборда
+from app.cache import LRUCacheBackend, SharedCacheBackend, cache
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+class FakeRedis:
+    """Минимальный клиент с интерфейсом redis-py"""
+
+    def __init__(self):
+        self.data = {}
+
+    def get(self, key):
+        return self.data.get(key)
+
+    def set(self, key, value, ex=None, nx=False):
+        if nx and key in self.data:
+            return None
+        self.data[key] = value
+        return True
+
+    def delete(self, key):
+        self.data.pop(key, None)
+
+    def incr(self, key):
+        self.data[key] = int(self.data.get(key) or 0) + 1
+        return self.data[key]
+
+
+def test_lru_backend_ttl_and_eviction():
+    clock = FakeClock()
+    backend = LRUCacheBackend(max_entries=2, clock=clock)
+
+    backend.set('a', 1, ttl=10)
+    backend.set('b', 2, ttl=10)
+    backend.get('a')
+    backend.set('c', 3, ttl=10)
+    assert backend.get('b') is None  # вытеснена как давно не использованная
+    assert backend.get('a') == 1
+
+    clock.now = 11
+    assert backend.get('a') is None
+
+
+def test_shared_backend_roundtrip():
+    client = FakeRedis()
+    backend = SharedCacheBackend(client)
+    backend.set('dashboard:stats', {'total_areas': 3}, ttl=30)
+    assert '5s:dashboard:stats' in client.data
+    assert backend.get('dashboard:stats') == {'total_areas': 3}
+    backend.delete('dashboard:stats')
+    assert backend.get('dashboard:stats') is None
+
+
+def test_shared_backend_clear_is_seen_by_other_processes():
+    client = FakeRedis()
+    writer, reader = SharedCacheBackend(client), SharedCacheBackend(client)
+    writer.set('dashboard:stats', {'total_areas': 3}, ttl=30)
+    assert reader.get('dashboard:stats') == {'total_areas': 3}
+
+    writer.clear()
+    assert reader.get('dashboard:stats') is None
+    reader.set('dashboard:stats', {'total_areas': 4}, ttl=30)
+    assert writer.get('dashboard:stats') == {'total_areas': 4}
+
+
+def test_dashboard_stats_cached_and_invalidated_on_write(client, make_user, login, count_queries):
+    manager = make_user('manager1', role='manager')
+    login(manager)
+
+    first = client.get('/api/dashboard/stats').get_json()
+    with count_queries() as counter:
+        second = client.get('/api/dashboard/stats').get_json()
+
+    assert first == second
+    # Повторный запрос не обращается к таблицам статистики
+    assert not [s for s in counter.statements if 'areas_5s' in s or 'checks_5s' in s]
+    assert (cache.hits, cache.misses) == (1, 1)
+
+    response = client.post('/api/areas', json={'name': 'Новый участок', 'department': 'ОТК'})
+    assert response.status_code == 201
+
+    third = client.get('/api/dashboard/stats').get_json()
+    assert third['total_areas'] == first['total_areas'] + 1
+    assert cache.misses == 2
+
+
+def test_cache_stats_endpoint(client, make_user, login):
+    login(make_user('admin', role='admin'))
+    client.get('/api/dashboard/stats')
+    stats = client.get('/api/cache/stats').get_json()
+    assert stats['backend'] == 'LRUCacheBackend'
+    assert stats['misses'] == 1
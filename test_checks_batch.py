@@ -0,0 +1,85 @@
+# test_checks_batch.py - Пакетная загрузка проверок с планшетов
+import uuid
+
+from app import db
+from app.models import Area5S as Area, Check5S as Check, AreaScoreRollup as Rollup
+
+
+def make_item(area_id, **overrides):
+    item = {
+        'client_uuid': str(uuid.uuid4()),
+        'area_id': area_id,
+        's_seiri': True, 's_seiton': True, 's_seiso': False,
+        's_seiketsu': False, 's_shitsuke': True,
+        'checked_at': '2024-03-01T08:30:00',
+    }
+    item.update(overrides)
+    return item
+
+
+def setup_area():
+    area = Area(name='Цех')
+    db.session.add(area)
+    db.session.commit()
+    return area
+
+
+def test_batch_inserts_in_one_statement(client, make_user, login, count_queries):
+    login(make_user('user1'))
+    area = setup_area()
+    items = [make_item(area.id) for _ in range(200)]
+
+    with count_queries() as counter:
+        response = client.post('/api/checks/batch', json={'checks': items})
+
+    assert response.status_code == 200
+    data = response.get_json()
+    assert data['summary'] == {'created': 200, 'duplicate': 0, 'error': 0}
+    assert [r['index'] for r in data['results']] == list(range(200))
+    assert all(r['total_score'] == 60 for r in data['results'])
+    assert Check.query.count() == 200
+    inserts = [s for s in counter.statements if s.startswith('INSERT INTO checks_5s')]
+    assert len(inserts) == 1
+
+    rollup = db.session.get(Rollup, area.id)
+    assert rollup.check_count == 200
+    assert rollup.seiri_hits == 200 and rollup.seiso_hits == 0
+
+
+def test_retry_is_idempotent(client, make_user, login):
+    login(make_user('user1'))
+    area = setup_area()
+    items = [make_item(area.id) for _ in range(5)]
+
+    first = client.post('/api/checks/batch', json={'checks': items}).get_json()
+    second = client.post('/api/checks/batch', json={'checks': items}).get_json()
+
+    assert second['summary'] == {'created': 0, 'duplicate': 5, 'error': 0}
+    assert [r['id'] for r in second['results']] == [r['id'] for r in first['results']]
+    assert Check.query.count() == 5
+    assert db.session.get(Rollup, area.id).check_count == 5
+
+
+def test_per_item_errors_do_not_block_batch(client, make_user, login):
+    login(make_user('user1'))
+    area = setup_area()
+    repeated = str(uuid.uuid4())
+    items = [
+        make_item(area.id, client_uuid=repeated),
+        make_item(area.id, client_uuid=repeated),
+        make_item(9999),
+        make_item(area.id, client_uuid='not-a-uuid'),
+        {'area_id': area.id},
+        make_item(area.id, checked_at='вчера'),
+    ]
+
+    results = client.post('/api/checks/batch', json={'checks': items}).get_json()['results']
+
+    assert [r['status'] for r in results] == ['created', 'error', 'error', 'error', 'error', 'error']
+    assert Check.query.count() == 1
+
+
+def test_batch_payload_validation(client, make_user, login):
+    login(make_user('user1'))
+    assert client.post('/api/checks/batch', json={'checks': []}).status_code == 400
+    assert client.post('/api/checks/batch', json={'checks': [{}] * 501}).status_code == 413
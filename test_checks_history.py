@@ -0,0 +1,78 @@
+# test_checks_history.py - Постраничная история проверок участка
+from datetime import datetime, timedelta
+
+from app import db
+from app.models import Area5S as Area, Check5S as Check
+
+
+def seed_history(users, count):
+    area = Area(name='Цех')
+    db.session.add(area)
+    db.session.flush()
+    start = datetime(2024, 1, 1)
+    for i in range(count):
+        # Пары проверок с одинаковым временем проверяют устойчивость курсора
+        db.session.add(Check(area_id=area.id, user_id=users[i % len(users)].id,
+                             total_score=(i % 6) * 20, checked_at=start + timedelta(hours=i // 2)))
+    db.session.commit()
+    return area
+
+
+def fetch_all(client, url):
+    ids, cursor = [], None
+    while True:
+        response = client.get(url + (f'&cursor={cursor}' if cursor else ''))
+        assert response.status_code == 200
+        data = response.get_json()
+        ids.extend(check['id'] for check in data['checks'])
+        cursor = data['next_cursor']
+        if not cursor:
+            return ids
+
+
+def test_pages_cover_history_without_gaps(client, make_user, login):
+    user = make_user('user1')
+    area = seed_history([user], 25)
+    login(user)
+
+    ids = fetch_all(client, f'/api/checks/area/{area.id}?limit=7')
+
+    expected = [c.id for c in Check.query.order_by(Check.checked_at.desc(), Check.id.desc())]
+    assert ids == expected
+
+
+def test_filters(client, make_user, login):
+    first, second = make_user('user1'), make_user('user2')
+    area = seed_history([first, second], 24)
+    login(first)
+
+    data = client.get(
+        f'/api/checks/area/{area.id}?user_id={second.id}&min_score=60'
+        f'&since=2024-01-01T03:00:00&until=2024-01-01T10:00:00'
+    ).get_json()
+
+    assert data['next_cursor'] is None
+    assert data['checks']
+    for check in data['checks']:
+        assert check['user'] == 'user2'
+        assert check['total_score'] >= 60
+        assert '2024-01-01T03:00:00' <= check['checked_at'] < '2024-01-01T10:00:00'
+
+
+def test_page_query_count_is_constant(client, make_user, login, count_queries):
+    user = make_user('user1')
+    area = seed_history([user, make_user('user2')], 40)
+    login(user)
+
+    with count_queries() as counter:
+        data = client.get(f'/api/checks/area/{area.id}?limit=20').get_json()
+
+    assert len(data['checks']) == 20
+    # Загрузка пользователя сессии + одна страница с присоединенными авторами
+    assert counter.count == 2
+
+
+def test_invalid_arguments(client, make_user, login):
+    login(make_user('user1'))
+    assert client.get('/api/checks/area/1?cursor=not-a-cursor').status_code == 400
+    assert client.get('/api/checks/area/1?since=yesterday').status_code == 400
@@ -0,0 +1,90 @@
+# test_engine_profile.py - Конфигурация фабрики и профили движка базы данных
+import threading
+
+import pytest
+from sqlalchemy import text
+from sqlalchemy.pool import QueuePool, StaticPool
+
+from app import create_app, db
+from app.database import engine_options, sqlite_pragmas
+
+
+@pytest.fixture
+def file_app(tmp_path):
+    app = create_app({'SQLALCHEMY_DATABASE_URI': 'sqlite:///' + str(tmp_path / 'profile.db')})
+    with app.app_context():
+        db.create_all()
+        yield app
+        db.session.remove()
+        db.engine.dispose()
+
+
+def pragma(name):
+    return db.session.execute(text(f'PRAGMA {name}')).scalar()
+
+
+def test_factory_loads_config_class(app):
+    assert app.config['PWA_NAME'] == 'Система 5С'
+    assert app.config['SQLALCHEMY_DATABASE_URI'] == 'sqlite://'
+
+
+def test_factory_reads_prefixed_env(monkeypatch, tmp_path):
+    monkeypatch.setenv('FLASK_DB_POOL_SIZE', '3')
+    app = create_app({'SQLALCHEMY_DATABASE_URI': 'sqlite:///' + str(tmp_path / 'env.db')})
+    with app.app_context():
+        assert db.engine.pool.size() == 3
+
+
+def test_sqlite_file_uses_wal_profile(file_app):
+    assert pragma('journal_mode') == 'wal'
+    assert pragma('synchronous') == 1  # NORMAL
+    assert pragma('busy_timeout') == 5000
+    assert pragma('mmap_size') == 256 * 1024 * 1024
+    assert isinstance(db.engine.pool, QueuePool)
+    assert db.engine.pool.size() == 10
+
+
+def test_pragmas_applied_to_every_pooled_connection(file_app):
+    results = []
+
+    def read():
+        with file_app.app_context():
+            results.append(pragma('synchronous'))
+            db.session.remove()
+
+    threads = [threading.Thread(target=read) for _ in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert results == [1] * 4
+
+
+def test_memory_database_keeps_static_pool(app):
+    assert isinstance(db.engine.pool, StaticPool)
+
+
+def test_server_profile_pool_options():
+    config = {'DB_POOL_SIZE': 15, 'DB_MAX_OVERFLOW': 5, 'DB_POOL_TIMEOUT': 10, 'DB_POOL_RECYCLE': 900}
+    options = engine_options('postgresql://user:secret@db/five_s', config)
+    assert options == {
+        'pool_size': 15, 'max_overflow': 5, 'pool_timeout': 10,
+        'pool_recycle': 900, 'pool_pre_ping': True
+    }
+
+
+def test_explicit_engine_options_take_precedence(tmp_path):
+    app = create_app({
+        'SQLALCHEMY_DATABASE_URI': 'sqlite:///' + str(tmp_path / 'explicit.db'),
+        'SQLALCHEMY_ENGINE_OPTIONS': {'pool_size': 2},
+    })
+    with app.app_context():
+        assert db.engine.pool.size() == 2
+
+
+def test_invalid_pragma_value_rejected():
+    with pytest.raises(ValueError):
+        sqlite_pragmas({
+            'SQLITE_JOURNAL_MODE': 'wal; DROP TABLE users_5s', 'SQLITE_SYNCHRONOUS': 'NORMAL',
+            'SQLITE_BUSY_TIMEOUT_MS': 5000, 'SQLITE_MMAP_SIZE': 0
+        })
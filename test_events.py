@@ -0,0 +1,168 @@
+# test_events.py - Поток событий для живых дашбордов (SSE)
+import json
+import threading
+import uuid
+
+import pytest
+
+from app import db
+from app.events import EventHub, hub
+from app.models import Area5S as Area
+
+FLAGS = ('s_seiri', 's_seiton', 's_seiso', 's_seiketsu', 's_shitsuke')
+
+
+@pytest.fixture
+def area(app, make_user, login):
+    app.config.update(EVENTS_HEARTBEAT_SECONDS=0.05, EVENTS_STREAM_MAX_SECONDS=0.2)
+    manager = make_user('manager', role='manager')
+    area = Area(name='Цех', department='Производство')
+    db.session.add(area)
+    db.session.commit()
+    login(manager)
+    return area
+
+
+def parse_stream(text):
+    """Разбирает text/event-stream на (id, event, data); комментарии — ('comment', текст)"""
+    messages = []
+    for block in text.strip().split('\n\n'):
+        fields = {}
+        for line in block.splitlines():
+            name, _, value = line.partition(': ' if not line.startswith(':') else ' ')
+            fields[name] = value
+        if ':' in fields:
+            messages.append(('comment', fields[':']))
+        elif 'event' in fields:
+            messages.append((fields['id'], fields['event'], json.loads(fields['data'])))
+    return messages
+
+
+def read_stream(client, last_event_id=None):
+    headers = {'Last-Event-ID': last_event_id} if last_event_id else {}
+    response = client.get('/api/stream', headers=headers)
+    assert response.status_code == 200
+    assert response.mimetype == 'text/event-stream'
+    text = response.get_data(as_text=True)
+    response.close()
+    return parse_stream(text)
+
+
+def post_check(client, area, passed=5):
+    payload = {flag: i < passed for i, flag in enumerate(FLAGS)}
+    assert client.post('/api/checks', json={'area_id': area.id, **payload}).status_code == 201
+
+
+def test_hub_wait_returns_events_after_cursor():
+    events = EventHub()
+    events.publish('check', {'n': 1})
+    second = events.publish('check', {'n': 2})
+
+    batch, gap = events.wait(second - 1, timeout=0)
+    assert [item.data for item in batch] == [{'n': 2}]
+    assert not gap
+    assert events.wait(second, timeout=0.01) == ([], False)
+
+
+def test_hub_resume_point():
+    events = EventHub(history=3)
+    first = events.publish('check', {})
+    for _ in range(4):
+        events.publish('check', {})
+
+    assert events.resume_point(None) == (events.last_seq, False)
+    assert events.resume_point(events.event_id(events.last_seq - 1)) == (events.last_seq - 1, False)
+    # Буфер уже сдвинулся, другой процесс или мусор — разрыв
+    assert events.resume_point(events.event_id(first))[1]
+    assert events.resume_point('deadbeef-1')[1]
+    assert events.resume_point('мусор')[1]
+
+
+def test_heartbeat_without_events(client, area):
+    messages = read_stream(client)
+    assert messages
+    assert all(message == ('comment', 'heartbeat') for message in messages)
+
+
+def test_committed_check_is_streamed(client, area):
+    start = hub.event_id(hub.last_seq)
+    post_check(client, area, passed=4)
+
+    messages = [m for m in read_stream(client, start) if m[0] != 'comment']
+    assert [m[1] for m in messages] == ['check', 'area_score']
+    check, score = messages[0][2], messages[1][2]
+    assert (check['area_id'], check['total_score']) == (area.id, 80.0)
+    assert score['area_id'] == area.id
+    assert (score['check_count'], score['average_score']) == (1, 80.0)
+
+    # Переподключение с последним полученным идентификатором не повторяет события
+    assert all(m[0] == 'comment' for m in read_stream(client, messages[-1][0]))
+
+
+def test_audit_and_batch_events(client, area):
+    start = hub.event_id(hub.last_seq)
+    client.post('/api/audits', json={
+        'area_id': area.id, 'seiri_score': 20, 'seiton_score': 20, 'seiso_score': 20,
+        'seiketsu_score': 20, 'shitsuke_score': 15
+    })
+    response = client.post('/api/checks/batch', json={'checks': [
+        {'client_uuid': str(uuid.uuid4()), 'area_id': area.id, **dict.fromkeys(FLAGS, True)} for _ in range(3)
+    ]})
+    assert response.get_json()['summary']['created'] == 3
+
+    messages = [m for m in read_stream(client, start) if m[0] != 'comment']
+    assert [m[1] for m in messages] == ['audit', 'area_score', 'checks', 'area_score']
+    assert messages[0][2]['grade'] == 'A'
+    assert messages[2][2] == {'count': 3, 'area_ids': [area.id]}
+    assert messages[3][2]['check_count'] == 3
+
+
+def test_rolled_back_changes_are_not_published(app, area):
+    from app import events
+    seq = hub.last_seq
+    events.record('check', {'id': 1}, areas=[area.id])
+    db.session.rollback()
+    db.session.commit()
+    assert hub.last_seq == seq
+
+
+def test_unknown_event_id_sends_reset(client, area):
+    messages = read_stream(client, 'deadbeef-42')
+    assert messages[0][1] == 'reset'
+
+
+def test_stream_requires_login(app):
+    assert app.test_client().get('/api/stream').status_code == 401
+
+
+def test_subscriber_limit(client, area, app):
+    app.config['EVENTS_MAX_SUBSCRIBERS'] = 0
+    response = client.get('/api/stream')
+    assert response.status_code == 503
+    assert response.headers['Retry-After']
+
+
+def test_subscriber_slots_are_reserved_atomically(client, area, app):
+    app.config['EVENTS_MAX_SUBSCRIBERS'] = 1
+    assert hub.subscribe(1)
+    try:
+        assert client.get('/api/stream').status_code == 503
+    finally:
+        hub.unsubscribe()
+
+    start = hub.subscribers
+    results = []
+    threads = [threading.Thread(target=lambda: results.append(hub.subscribe(start + 5))) for _ in range(20)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert results.count(True) == 5 and hub.subscribers == start + 5
+    for _ in range(5):
+        hub.unsubscribe()
+
+    # Сервер закрывает ответ — место освобождается, даже если поток не читали
+    response = client.get('/api/stream')
+    assert hub.subscribers == start + 1
+    response.close()
+    assert hub.subscribers == start
@@ -0,0 +1,118 @@
+# test_export.py - Потоковая выгрузка проверок и аудитов в CSV и XLSX
+import csv
+import io
+import zipfile
+from datetime import datetime, timedelta
+from xml.etree import ElementTree
+
+import pytest
+
+from app import db, export
+from app.models import Area5S as Area, Audit5S as Audit, Check5S as Check
+
+SHEET_NS = {'s': 'http://schemas.openxmlformats.org/spreadsheetml/2006/main'}
+
+
+@pytest.fixture
+def seeded(make_user):
+    manager = make_user('manager', role='manager')
+    warehouse = Area(name='Склад', department='Логистика')
+    shop = Area(name='Цех', department='Производство')
+    db.session.add_all([warehouse, shop])
+    db.session.flush()
+    start = datetime(2024, 1, 1)
+    for i in range(30):
+        area = warehouse if i % 3 else shop
+        db.session.add(Check(area_id=area.id, user_id=manager.id, s_seiri=True, s_seiton=bool(i % 2),
+                             total_score=40, notes='=1+1' if i == 0 else None,
+                             checked_at=start + timedelta(days=i)))
+    db.session.add(Audit(area_id=shop.id, auditor_id=manager.id, seiri_score=20, seiton_score=20,
+                         seiso_score=20, seiketsu_score=18, shitsuke_score=17, total_score=95,
+                         audit_date=start))
+    db.session.commit()
+    return manager, warehouse, shop
+
+
+def read_csv(response):
+    assert response.status_code == 200
+    assert response.mimetype == 'text/csv'
+    text = response.get_data().decode('utf-8-sig')
+    return list(csv.reader(io.StringIO(text)))
+
+
+def read_xlsx(response):
+    assert response.status_code == 200
+    with zipfile.ZipFile(io.BytesIO(response.get_data())) as archive:
+        assert archive.testzip() is None
+        sheet = ElementTree.fromstring(archive.read('xl/worksheets/sheet1.xml'))
+    return [
+        [cell.findtext('s:v', namespaces=SHEET_NS) or cell.findtext('s:is/s:t', namespaces=SHEET_NS)
+         for cell in row.findall('s:c', SHEET_NS)]
+        for row in sheet.findall('s:sheetData/s:row', SHEET_NS)
+    ]
+
+
+def test_checks_csv_streams_all_rows(client, login, seeded, monkeypatch):
+    monkeypatch.setattr(export, 'EXPORT_BATCH_SIZE', 7)
+    login(seeded[0])
+
+    response = client.get('/api/export/checks')
+    assert response.is_streamed
+    assert 'attachment' in response.headers['Content-Disposition']
+
+    rows = read_csv(response)
+    assert rows[0] == list(export.CHECK_HEADERS)
+    assert len(rows) == 31
+    assert rows[1][2:5] == ['Цех', 'Производство', 'manager']
+    # Примечание, похожее на формулу, экранируется
+    assert rows[1][-1] == "'=1+1"
+
+
+def test_export_is_generated_in_batches(app, seeded, monkeypatch):
+    monkeypatch.setattr(export, 'EXPORT_BATCH_SIZE', 7)
+    batches = list(export.check_rows())
+    assert [len(batch) for batch in batches] == [7, 7, 7, 7, 2]
+
+
+def test_filters(client, login, seeded):
+    manager, warehouse, shop = seeded
+    login(manager)
+
+    assert len(read_csv(client.get(f'/api/export/checks?area_id={shop.id}'))) == 11
+    assert len(read_csv(client.get('/api/export/checks?department=Логистика'))) == 21
+    rows = read_csv(client.get('/api/export/checks?since=2024-01-10&until=2024-01-20'))
+    assert len(rows) == 11
+    assert rows[1][1] == '2024-01-10 00:00:00'
+
+
+def test_audits_xlsx(client, login, seeded):
+    login(seeded[0])
+
+    response = client.get('/api/export/audits?format=xlsx')
+    assert response.mimetype == export.FORMATS['xlsx']
+
+    rows = read_xlsx(response)
+    assert rows[0] == list(export.AUDIT_HEADERS)
+    assert len(rows) == 2
+    audit = dict(zip(rows[0], rows[1]))
+    assert audit['Участок'] == 'Цех'
+    assert audit['Общая оценка'] == '95'
+    assert audit['Класс'] == 'A'
+
+
+def test_checks_xlsx_matches_csv(client, login, seeded):
+    login(seeded[0])
+    rows = read_xlsx(client.get('/api/export/checks?format=xlsx'))
+    assert len(rows) == 31
+    assert rows[1][2] == 'Цех'
+
+
+def test_invalid_parameters(client, login, seeded):
+    login(seeded[0])
+    assert client.get('/api/export/checks?format=pdf').status_code == 400
+    assert client.get('/api/export/checks?since=вчера').status_code == 400
+
+
+def test_export_requires_manager(client, make_user, login, seeded):
+    login(make_user('user1'))
+    assert client.get('/api/export/checks').status_code == 403
@@ -0,0 +1,113 @@
+# test_instrumentation.py - Метрики маршрутов, /metrics в формате Prometheus, поиск N+1
+import logging
+import re
+
+import pytest
+
+from app import db
+from app.instrumentation import instrumentation, statement_template
+from app.models import Area5S as Area, User
+
+
+@pytest.fixture
+def metrics(app):
+    instrumentation.reset(app.config['METRICS_NAMESPACE'])
+    return app
+
+
+def scrape(client, **kwargs):
+    response = client.get('/metrics', **kwargs)
+    assert response.status_code == 200
+    assert response.content_type.startswith('text/plain; version=0.0.4')
+    return response.get_data(as_text=True)
+
+
+def sample(text, name, **labels):
+    """Значение метрики с заданными метками (порядок меток как в выводе)"""
+    for line in text.splitlines():
+        if line.startswith(name + '{') or line.startswith(name + ' '):
+            found = dict(re.findall(r'(\w+)="([^"]*)"', line))
+            if all(found.get(key) == str(value) for key, value in labels.items()):
+                return float(line.rsplit(' ', 1)[1])
+    return None
+
+
+def test_statement_template_collapses_in_lists():
+    assert statement_template('SELECT *\n  FROM t WHERE id IN (?, ?, ?)') == 'SELECT * FROM t WHERE id IN (?)'
+    assert statement_template('SELECT * FROM t WHERE id IN (?)') == 'SELECT * FROM t WHERE id IN (?)'
+
+
+def test_route_metrics(client, login, make_user, metrics):
+    login(make_user('manager', role='manager'))
+    db.session.add(Area(name='Цех'))
+    db.session.commit()
+
+    for _ in range(3):
+        assert client.get('/api/areas').status_code == 200
+    client.get('/api/areas/999')
+
+    text = scrape(client)
+    route = {'method': 'GET', 'route': '/api/areas'}
+    assert sample(text, 'five_s_http_requests_total', status=200, **route) == 3
+    assert sample(text, 'five_s_http_requests_total', route='/api/areas/<int:area_id>', status=404) == 1
+    assert sample(text, 'five_s_http_request_duration_seconds_count', **route) == 3
+    assert sample(text, 'five_s_http_request_duration_seconds_bucket', le='+Inf', **route) == 3
+    # Не больше двух SQL на запрос: пользователь (до попадания в кэш) и сводка участков
+    assert sample(text, 'five_s_http_request_sql_statements_sum', **route) >= 3
+    assert sample(text, 'five_s_http_request_sql_statements_bucket', le='2', **route) == 3
+    assert sample(text, 'five_s_http_request_sql_seconds_total', **route) > 0
+    assert sample(text, 'five_s_http_response_size_bytes_count', **route) == 3
+    assert sample(text, 'five_s_http_request_n_plus_one_total', **route) is None
+    # Запрос самих метрик не учитывается
+    assert 'route="/metrics"' not in text
+
+
+def test_n_plus_one_detected(app, client, make_user, metrics, caplog):
+    app.config['METRICS_N_PLUS_ONE_THRESHOLD'] = 3
+    user_ids = [make_user(f'user{i}').id for i in range(5)]
+
+    @app.route('/test/n-plus-one')
+    def n_plus_one():
+        db.session.expunge_all()
+        for user_id in user_ids:
+            db.session.get(User, user_id)
+        return 'ok'
+
+    with caplog.at_level(logging.WARNING):
+        client.get('/test/n-plus-one')
+
+    assert sample(scrape(client), 'five_s_http_request_n_plus_one_total', route='/test/n-plus-one') == 1
+    assert any('N+1' in record.getMessage() and '/test/n-plus-one' in record.getMessage()
+               for record in caplog.records)
+
+
+def test_unmatched_routes_share_one_label(client, metrics):
+    client.get('/no/such/page/1')
+    client.get('/no/such/page/2')
+    assert sample(scrape(client), 'five_s_http_requests_total', route='<unmatched>', status=404) == 2
+
+
+def test_metrics_token(app, client, metrics):
+    app.config['METRICS_TOKEN'] = 'secret'
+    assert client.get('/metrics').status_code == 401
+    scrape(client, headers={'Authorization': 'Bearer secret'})
+
+
+def test_metrics_require_token_in_production():
+    from app import create_app
+
+    app = create_app({'SQLALCHEMY_DATABASE_URI': 'sqlite://', 'METRICS_TOKEN': None})
+    assert not app.config['METRICS_PUBLIC']
+    assert app.test_client().get('/metrics').status_code == 404
+
+    app.config['METRICS_TOKEN'] = 'secret'
+    client = app.test_client()
+    assert client.get('/metrics').status_code == 401
+    scrape(client, headers={'Authorization': 'Bearer secret'})
+
+
+def test_server_timing_header(app, client, metrics):
+    app.config['METRICS_SERVER_TIMING'] = True
+    header = client.get('/').headers['Server-Timing']
+    assert header.startswith('app;dur=')
+    assert 'sql;dur=' in header
@@ -0,0 +1,235 @@
+# test_jobs.py - Фоновая очередь заданий: захват, повторы, таймаут видимости, метрики
+import io
+import os
+from datetime import datetime, timedelta
+
+import pytest
+from PIL import Image
+
+from app import create_app, db, jobs, photos
+from app.models import Area5S as Area, AreaScoreRollup as Rollup, Check5S as Check, Job, Report5S as Report
+
+calls = []
+
+
+@jobs.task('test.record', queue='test')
+def record(value=None):
+    calls.append(value)
+
+
+@jobs.task('test.flaky', queue='test', max_attempts=2)
+def flaky():
+    calls.append('flaky')
+    raise RuntimeError('сбой')
+
+
+@jobs.task('test.tick', queue='test', every='TEST_TICK_SECONDS')
+def tick():
+    calls.append('tick')
+
+
+@pytest.fixture(autouse=True)
+def reset_calls():
+    calls.clear()
+
+
+def test_job_is_visible_only_after_commit(app):
+    jobs.enqueue('test.record', value=1)
+    db.session.rollback()
+    assert jobs.claim() is None
+
+    jobs.enqueue('test.record', value=2)
+    db.session.commit()
+    job = jobs.claim(worker_id='w1')
+    assert (job.status, job.attempts, job.locked_by) == ('running', 1, 'w1')
+    assert jobs.execute(job)
+    assert calls == [2]
+    db.session.refresh(job)
+    assert (job.status, job.claim_token, job.finished_at is not None) == ('done', None, True)
+
+
+def test_unknown_task_rejected(app):
+    with pytest.raises(jobs.JobError):
+        jobs.enqueue('test.missing')
+
+
+def test_unique_jobs(app):
+    first = jobs.enqueue('test.record', unique=True)
+    db.session.commit()
+    assert jobs.enqueue('test.record', unique=True).id == first.id
+    assert jobs.enqueue('test.record', unique=True, value=1).id != first.id
+    assert jobs.enqueue('test.record', max_attempts=1).max_attempts == 1
+
+
+def test_queue_filter_and_delay(app):
+    jobs.enqueue('test.record', value='later', delay=60)
+    jobs.enqueue('test.record', value='now')
+    db.session.commit()
+
+    assert jobs.claim(queues=['other']) is None
+    job = jobs.claim(queues=['test'])
+    assert job.payload == {'value': 'now'}
+    assert jobs.claim(queues=['test']) is None
+    assert jobs.claim(now=datetime.utcnow() + timedelta(minutes=2)).payload == {'value': 'later'}
+
+
+def test_failures_retry_with_backoff(app):
+    app.config['JOBS_RETRY_BASE_SECONDS'] = 30
+    job = jobs.enqueue('test.flaky')
+    db.session.commit()
+    job_id = job.id
+
+    assert not jobs.execute(jobs.claim())
+    job = db.session.get(Job, job_id)
+    assert (job.status, job.attempts, job.last_error) == ('pending', 1, 'сбой')
+    delay = (job.run_at - datetime.utcnow()).total_seconds()
+    assert 25 <= delay <= 36
+    assert jobs.claim() is None
+
+    assert not jobs.execute(jobs.claim(now=job.run_at + timedelta(seconds=1)))
+    db.session.refresh(job)
+    assert (job.status, job.attempts) == ('failed', 2)
+    assert calls == ['flaky', 'flaky']
+
+
+def test_visibility_timeout_reclaims_job(app):
+    job = jobs.enqueue('test.record', value=1)
+    db.session.commit()
+    job_id = job.id
+
+    stuck = jobs.claim(worker_id='w1')
+    stale_token = stuck.claim_token
+    assert jobs.claim() is None
+
+    later = datetime.utcnow() + timedelta(seconds=app.config['JOBS_VISIBILITY_TIMEOUT'] + 1)
+    reclaimed = jobs.claim(worker_id='w2', now=later)
+    assert (reclaimed.id, reclaimed.attempts, reclaimed.locked_by) == (job_id, 2, 'w2')
+
+    # Результат зависшего воркера не затирает новый захват
+    jobs._finish(job_id, stale_token, status='failed')
+    db.session.refresh(reclaimed)
+    assert reclaimed.status == 'running'
+    assert jobs.execute(reclaimed)
+
+
+def test_worker_burst_and_stats(app):
+    for value in range(3):
+        jobs.enqueue('test.record', value=value)
+    jobs.enqueue('test.flaky')
+    db.session.commit()
+
+    before = jobs.stats()['queues']['test']
+    assert (before['pending'], before['done']) == (4, 0)
+    assert before['lag_seconds'] >= 0
+
+    assert jobs.Worker(['test']).work(burst=True) == 4
+    assert calls[:3] == [0, 1, 2]
+
+    after = jobs.stats()['queues']['test']
+    assert (after['done'], after['pending'], after['lag_seconds']) == (3, 1, 0.0)
+    assert after['done_last_minute'] == after['done_last_hour'] == 3
+
+
+def test_periodic_jobs(app):
+    app.config['TEST_TICK_SECONDS'] = 60
+    # Воркер без --burst сам создает строку периодической задачи
+    assert jobs.Worker(['test']).work(max_jobs=1) == 1
+    assert calls == ['tick']
+    job = Job.query.filter_by(task='test.tick').one()
+    assert (job.status, job.attempts, job.unique_key) == ('pending', 0, 'periodic:test.tick')
+    assert job.run_at > datetime.utcnow() + timedelta(seconds=55)
+    assert jobs.ensure_periodic(['test']) == 0
+    assert jobs.claim(['test']) is None
+
+    # Копия от параллельного воркера после выполнения закрывается
+    db.session.add(Job(queue='test', task='test.tick', unique_key='periodic:test.tick'))
+    db.session.commit()
+    assert jobs.Worker(['test']).work(burst=True) == 1
+    assert Job.query.filter_by(task='test.tick', status='pending').count() == 1
+
+    # Исчерпанные попытки не выключают задачу: строка создается заново
+    Job.query.filter_by(task='test.tick').update({'status': 'failed'})
+    db.session.commit()
+    assert jobs.ensure_periodic(['test']) == 1
+
+    app.config['TEST_TICK_SECONDS'] = None
+    Job.query.delete()
+    db.session.commit()
+    assert jobs.ensure_periodic(['test']) == 0
+
+
+def test_purge_keeps_failed(app):
+    old = datetime.utcnow() - timedelta(days=30)
+    db.session.add_all([
+        Job(task='test.record', queue='test', status='done', finished_at=old),
+        Job(task='test.record', queue='test', status='failed', finished_at=old),
+    ])
+    db.session.commit()
+    assert jobs.purge_finished() == 1
+    assert Job.query.one().status == 'failed'
+
+
+def test_stats_endpoint_requires_admin(client, make_user, login):
+    login(make_user('manager', role='manager'))
+    assert client.get('/api/jobs/stats').status_code == 403
+    login(make_user('admin', role='admin'))
+    assert 'queues' in client.get('/api/jobs/stats').get_json()
+
+
+def test_cli_enqueue_and_worker(app, make_user):
+    area = Area(name='Цех')
+    db.session.add(area)
+    db.session.flush()
+    db.session.add(Check(area_id=area.id, user_id=make_user('user1').id, total_score=80))
+    db.session.commit()
+    runner = app.test_cli_runner()
+
+    result = runner.invoke(args=['jobs-enqueue', 'rollup.rebuild'])
+    assert result.exit_code == 0, result.output
+    assert Job.query.one().queue == 'maintenance'
+    assert runner.invoke(args=['jobs-enqueue', 'test.missing']).exit_code != 0
+
+    result = runner.invoke(args=['worker', '--burst', '-q', 'maintenance'])
+    assert 'Выполнено заданий: 1' in result.output
+    assert db.session.get(Rollup, area.id).check_count == 1
+
+
+def test_report_request_enqueues_render_job(app, client, make_user, login, tmp_path):
+    app.config['REPORTS_FOLDER'] = str(tmp_path)
+    login(make_user('manager', role='manager'))
+    report_id = client.post('/api/reports', json={'month': '2024-03'}).get_json()['report']['id']
+    assert Job.query.filter_by(task='reports.render').count() == 1
+
+    jobs.Worker(['reports']).work(burst=True)
+    assert db.session.get(Report, report_id).status == 'done'
+
+
+def test_photo_variants_through_queue(app, make_user, tmp_path):
+    app.config['UPLOAD_FOLDER'] = str(tmp_path)
+    buffer = io.BytesIO()
+    Image.new('RGB', (64, 48), 'blue').save(buffer, 'PNG')
+    buffer.seek(0)
+    photo, _ = photos.save_upload(buffer, make_user('user1').id)
+
+    thumb = photos.variant_path(photo.id, 'thumb')
+    assert not os.path.exists(thumb)
+    assert jobs.Worker(['photos']).work(burst=True) == 1
+    assert os.path.exists(thumb)
+
+
+def test_worker_processes_share_file_database(tmp_path, monkeypatch):
+    uri = f'sqlite:///{tmp_path / "jobs.db"}'
+    monkeypatch.setenv('DATABASE_URL', uri)
+    monkeypatch.setenv('FLASK_SQLALCHEMY_DATABASE_URI', uri)
+    app = create_app({'SQLALCHEMY_DATABASE_URI': uri})
+    with app.app_context():
+        db.create_all()
+        for _ in range(6):
+            jobs.enqueue('rollup.rebuild')
+        db.session.commit()
+
+        result = app.test_cli_runner().invoke(args=['worker', '-n', '2', '--burst'])
+        assert result.exit_code == 0, result.output
+        assert {status for (status,) in db.session.query(Job.status)} == {'done'}
+        assert len({locked_by for (locked_by,) in db.session.query(Job.locked_by)}) >= 1
+        db.session.remove()
@@ -0,0 +1,158 @@
+# test_leaderboard.py - Рейтинг участков и отделов по скользящему окну
+from datetime import datetime, timedelta
+
+import pytest
+
+from app import db
+from app.leaderboard import Ranking
+from app.models import Area5S as Area, Check5S as Check
+from app.rollup import rebuild_rollups
+
+FLAGS = ('s_seiri', 's_seiton', 's_seiso', 's_seiketsu', 's_shitsuke')
+
+
+@pytest.fixture
+def areas(client, make_user, login):
+    manager = make_user('manager', role='manager')
+    login(manager)
+    created = [
+        Area(name='Склад', department='Логистика'),
+        Area(name='Цех 1', department='Производство'),
+        Area(name='Цех 2', department='Производство'),
+    ]
+    db.session.add_all(created)
+    db.session.commit()
+    return manager, created
+
+
+def post_check(client, area, passed):
+    """Проверка с оценкой 20 * passed"""
+    payload = {flag: i < passed for i, flag in enumerate(FLAGS)}
+    response = client.post('/api/checks', json={'area_id': area.id, **payload})
+    assert response.status_code == 201
+
+
+def board(client, scope='area', limit=10):
+    response = client.get(f'/api/leaderboard?scope={scope}&limit={limit}')
+    assert response.status_code == 200
+    return response.get_json()
+
+
+def test_ranking_orders_by_average_then_volume():
+    ranking = Ranking()
+    ranking.update('a', 80, 1)
+    ranking.update('b', 90, 1)
+    ranking.update('c', 80, 5)
+    assert ranking.top(3) == ['b', 'c', 'a']
+    ranking.update('a', 95, 2)
+    assert [ranking.rank(key) for key in 'abc'] == [1, 2, 3]
+    ranking.remove('b')
+    assert ranking.top(5) == ['a', 'c'] and len(ranking) == 2
+
+
+def test_area_leaderboard(client, areas):
+    _, (warehouse, shop1, shop2) = areas
+    post_check(client, warehouse, 3)
+    post_check(client, shop1, 5)
+    post_check(client, shop1, 4)
+
+    data = board(client)
+    assert data['total'] == 2
+    assert [(e['rank'], e['area'], e['average_score']) for e in data['entries']] == [
+        (1, 'Цех 1', 90.0), (2, 'Склад', 60.0)
+    ]
+    assert [e['percentile'] for e in data['entries']] == [100.0, 0.0]
+    assert board(client, limit=1)['entries'][0]['area'] == 'Цех 1'
+
+
+def test_incremental_updates_without_reload(client, areas, count_queries):
+    _, (warehouse, shop1, _) = areas
+    post_check(client, warehouse, 3)
+    post_check(client, shop1, 4)
+    board(client)
+
+    post_check(client, warehouse, 5)
+    post_check(client, warehouse, 5)
+    with count_queries() as counter:
+        data = board(client)
+    assert not [s for s in counter.statements if 'area_daily_stats' in s or 'checks_5s' in s]
+    assert [e['area'] for e in data['entries']] == ['Склад', 'Цех 1']
+    assert data['entries'][0]['checks'] == 3
+
+
+def test_department_scope_and_audits(client, areas):
+    _, (warehouse, shop1, shop2) = areas
+    post_check(client, warehouse, 2)
+    post_check(client, shop1, 5)
+    post_check(client, shop2, 3)
+    board(client, 'department')
+    response = client.post('/api/audits', json={
+        'area_id': shop2.id, 'seiri_score': 20, 'seiton_score': 20, 'seiso_score': 18,
+        'seiketsu_score': 16, 'shitsuke_score': 16
+    })
+    assert response.status_code == 201
+
+    data = board(client, 'department')
+    production = data['entries'][0]
+    assert (production['department'], production['checks'], production['average_score']) == ('Производство', 2, 80.0)
+    assert (production['audits'], production['audit_average']) == (1, 90.0)
+
+
+def test_rolling_window_and_rank_delta(client, areas):
+    _, (warehouse, shop1, shop2) = areas
+    now = datetime.utcnow()
+    # Вчера лидировал склад; сегодня цех 1 получает высокие оценки
+    rows = [
+        (warehouse, 90, now - timedelta(days=1)),
+        (shop1, 80, now - timedelta(days=2)),
+        (shop2, 100, now - timedelta(days=45)),  # вне окна
+    ]
+    for area, score, when in rows:
+        db.session.add(Check(area_id=area.id, user_id=areas[0].id, total_score=score, checked_at=when))
+    db.session.commit()
+    rebuild_rollups()
+
+    entries = board(client)['entries']
+    assert [(e['area'], e['rank'], e['rank_delta']) for e in entries] == [
+        ('Склад', 1, 0), ('Цех 1', 2, 0)
+    ]
+    assert entries[1]['average_score'] == 80.0
+
+    post_check(client, shop1, 5)
+    post_check(client, shop1, 5)
+    entries = board(client)['entries']
+    assert [(e['area'], e['rank_delta']) for e in entries] == [('Цех 1', 1), ('Склад', -1)]
+
+
+def test_area_position(client, areas):
+    _, (warehouse, shop1, shop2) = areas
+    post_check(client, warehouse, 1)
+    post_check(client, shop1, 2)
+
+    response = client.get(f'/api/leaderboard/areas/{warehouse.id}')
+    assert response.get_json()['rank'] == 2
+    assert client.get(f'/api/leaderboard/areas/{shop2.id}').status_code == 404
+
+
+def test_new_area_triggers_reload(client, areas):
+    board(client)
+    area = Area(name='Новый участок', department='Логистика')
+    db.session.add(area)
+    db.session.commit()
+    post_check(client, area, 5)
+    assert board(client)['entries'][0]['area'] == 'Новый участок'
+
+
+def test_rolled_back_check_not_counted(client, areas):
+    _, (warehouse, _, _) = areas
+    post_check(client, warehouse, 3)
+    board(client)
+
+    from app.leaderboard import record_check
+    record_check(warehouse.id, datetime.utcnow(), 100)
+    db.session.rollback()
+    assert board(client)['entries'][0]['checks'] == 1
+
+
+def test_invalid_scope(client, areas):
+    assert client.get('/api/leaderboard?scope=user').status_code == 400
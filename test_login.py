@@ -0,0 +1,160 @@
+# test_login.py - Вход: пул хеширования, ограничение попыток, обновление хешей
+import threading
+
+import pytest
+from werkzeug.security import generate_password_hash
+
+from app import db, passwords
+from app.models import User
+from app.passwords import HashingBusy, hashing_pool, login_throttle
+
+
+def login_request(client, username, password):
+    return client.post('/auth/login', json={'username': username, 'password': password})
+
+
+def test_login_success_and_failure(client, make_user):
+    make_user('user1', password='user123')
+
+    response = login_request(client, 'user1', 'user123')
+    assert response.status_code == 200
+    assert response.get_json()['user']['role_display'] == 'Пользователь'
+    assert login_request(client, 'user1', 'wrong').status_code == 401
+    assert login_request(client, 'nobody', 'wrong').status_code == 401
+    assert hashing_pool.stats()['completed'] == 3
+
+
+def test_login_rejects_non_string_credentials(client, make_user):
+    make_user('user1', password='user123')
+    for username, password in ((['user1'], 'user123'), ({'name': 'user1'}, 'x'), ('user1', 123456)):
+        assert login_request(client, username, password).status_code == 400
+    assert client.post('/auth/login', json=['user1', 'user123']).status_code == 400
+
+
+def test_login_verify_timeout_returns_503(app, client, make_user):
+    make_user('user1', password='user123')
+    hashing_pool.configure(workers=1, queue_size=1)
+    app.config['PASSWORD_VERIFY_TIMEOUT'] = 0.05
+    release = threading.Event()
+    started = threading.Event()
+
+    def blocker():
+        started.set()
+        release.wait(5)
+
+    thread = threading.Thread(target=hashing_pool.run, args=(blocker,))
+    thread.start()
+    started.wait(5)
+    try:
+        response = login_request(client, 'user1', 'user123')
+        assert response.status_code == 503
+        assert response.headers['Retry-After'] == '1'
+        assert hashing_pool.stats()['timeouts'] == 1
+    finally:
+        release.set()
+        thread.join()
+    # Брошенная проверка досчитывается в пуле и освобождает слот
+    hashing_pool.run(lambda: None)
+    assert hashing_pool.stats()['in_flight'] == 0
+
+
+def test_outdated_hash_upgraded_on_login(app, client, make_user):
+    user = make_user('user1')
+    user.password_hash = generate_password_hash('user123', method='pbkdf2:sha256:500')
+    db.session.commit()
+
+    assert login_request(client, 'user1', 'user123').status_code == 200
+
+    stored = db.session.get(User, user.id).password_hash
+    assert stored.startswith(app.config['PASSWORD_HASH_METHOD'] + '$')
+    assert login_request(client, 'user1', 'user123').status_code == 200
+
+
+def test_method_without_parameters_not_rehashed_every_login(app, client, make_user):
+    app.config['PASSWORD_HASH_METHOD'] = 'pbkdf2'
+    user = make_user('user1')
+    user.password_hash = generate_password_hash('user123', method='pbkdf2')
+    db.session.commit()
+    stored = user.password_hash
+
+    assert not passwords.needs_rehash(stored)
+    assert passwords.needs_rehash(generate_password_hash('user123', method='pbkdf2:sha256:500'))
+    assert login_request(client, 'user1', 'user123').status_code == 200
+    assert db.session.get(User, user.id).password_hash == stored
+
+
+def test_failures_throttled_per_user(app, client, make_user):
+    make_user('user1', password='user123')
+    for _ in range(app.config['LOGIN_MAX_FAILURES_PER_USER']):
+        assert login_request(client, 'user1', 'wrong').status_code == 401
+
+    response = login_request(client, 'USER1', 'user123')
+    assert response.status_code == 429
+    assert int(response.headers['Retry-After']) > 0
+
+    # Другой пользователь с того же адреса не блокируется
+    make_user('user2', password='user123')
+    assert login_request(client, 'user2', 'user123').status_code == 200
+
+
+def test_throttle_window_and_ip_limit():
+    login_throttle.configure(window=60, max_per_user=3, max_per_ip=4)
+    for i in range(3):
+        login_throttle.failure('user1', '10.0.0.1', now=100 + i)
+    assert login_throttle.retry_after('user1', '10.0.0.2', now=110) == 51
+    assert login_throttle.retry_after('user1', '10.0.0.2', now=161) == 0
+
+    login_throttle.failure('user2', '10.0.0.1', now=150)
+    assert login_throttle.retry_after('someone', '10.0.0.1', now=150) > 0
+
+    login_throttle.success('user1')
+    assert login_throttle.retry_after('user1', '10.0.0.2', now=110) == 0
+
+
+def test_throttle_forgets_expired_and_excess_keys():
+    login_throttle.configure(window=60, max_per_user=3, max_per_ip=4, max_keys=50)
+    for i in range(40):
+        login_throttle.failure(f'random{i}', '10.0.0.1', now=100)
+    assert len(login_throttle) == 41
+    # Через окно старые имена удаляются при следующей неудаче
+    login_throttle.failure('late', '10.0.0.2', now=200)
+    assert len(login_throttle) == 2
+
+    for i in range(100):
+        login_throttle.failure(f'flood{i}', '10.0.0.3', now=300)
+    assert len(login_throttle) == 50
+    # Адрес перебора обновляется каждой попыткой и не вытесняется
+    assert login_throttle.retry_after('anyone', '10.0.0.3', now=300) > 0
+
+
+def test_pool_rejects_when_queue_full(app):
+    hashing_pool.configure(workers=1, queue_size=0)
+    release = threading.Event()
+    started = threading.Event()
+
+    def blocker():
+        started.set()
+        release.wait(5)
+
+    thread = threading.Thread(target=hashing_pool.run, args=(blocker,))
+    thread.start()
+    started.wait(5)
+    try:
+        with pytest.raises(HashingBusy):
+            hashing_pool.run(lambda: None)
+        stats = hashing_pool.stats()
+        assert stats['in_flight'] == 1
+        assert stats['rejected'] == 1
+    finally:
+        release.set()
+        thread.join()
+
+
+def test_hashing_stats_requires_admin(client, make_user, login):
+    login(make_user('user1'))
+    assert client.get('/auth/hashing/stats').status_code == 403
+
+
+def test_hashing_stats(client, make_user, login):
+    login(make_user('admin', role='admin'))
+    assert 'queue_depth' in client.get('/auth/hashing/stats').get_json()
@@ -0,0 +1,179 @@
+# test_notifications.py - Уведомления ответственных: очередь, объединение, доставка
+import json
+from datetime import datetime, timedelta
+
+import pytest
+
+from app import db, jobs
+from app.models import (
+    Area5S as Area, Audit5S as Audit, Job, Notification5S as Notification, NotificationOutbox as Outbox
+)
+from app.notifications import FileTransport, deliver_pending, notify_low_scores, notify_overdue_audits
+from app.rollup import rebuild_rollups
+
+FLAGS = ('s_seiri', 's_seiton', 's_seiso', 's_seiketsu', 's_shitsuke')
+
+
+class FailingTransport:
+    def send_batch(self, messages):
+        raise ConnectionError('SMTP недоступен')
+
+
+@pytest.fixture
+def setup(client, make_user, login):
+    manager = make_user('manager', role='manager')
+    operator = make_user('operator')
+    area = Area(name='Цех', responsible_person_id=manager.id)
+    db.session.add(area)
+    db.session.commit()
+    login(operator)
+    return manager, operator, area
+
+
+def post_check(client, area, passed):
+    payload = {flag: i < passed for i, flag in enumerate(FLAGS)}
+    response = client.post('/api/checks', json={'area_id': area.id, **payload})
+    assert response.status_code == 201
+    return response.get_json()['check']['id']
+
+
+def read_messages(path):
+    if not path.exists():
+        return []
+    return [json.loads(line) for line in path.read_text(encoding='utf-8').splitlines()]
+
+
+def test_low_score_enqueued_without_delivery(client, setup, tmp_path):
+    manager, _, area = setup
+    check_id = post_check(client, area, 2)
+
+    (notification,) = Notification.query.all()
+    assert (notification.user_id, notification.kind, notification.check_id) == (manager.id, 'low_score', check_id)
+    assert Outbox.query.one().status == 'pending'
+    # Запрос не отправлял сообщений
+    assert not read_messages(tmp_path / 'sent.jsonl')
+
+
+def test_good_score_and_own_area_not_notified(client, setup, login):
+    manager, _, area = setup
+    post_check(client, area, 4)
+    login(manager)
+    post_check(client, area, 1)
+    assert Notification.query.count() == 0
+
+
+def test_delivery_coalesces_per_user(client, setup, tmp_path):
+    manager, _, area = setup
+    post_check(client, area, 1)
+    post_check(client, area, 2)
+    transport = FileTransport(str(tmp_path / 'sent.jsonl'))
+
+    stats = deliver_pending(transport)
+    assert stats == {'notifications': 2, 'messages': 1, 'failed': 0}
+    (message,) = read_messages(tmp_path / 'sent.jsonl')
+    assert message['to'] == manager.email
+    assert message['subject'] == '5С: 2 новых уведомлений'
+    assert {row.status for row in Outbox.query} == {'sent'}
+
+    assert deliver_pending(transport)['messages'] == 0
+
+
+def test_failed_delivery_retries_with_backoff(app, client, setup):
+    app.config['NOTIFY_MAX_ATTEMPTS'] = 2
+    post_check(client, setup[2], 0)
+    now = datetime.utcnow()
+
+    assert deliver_pending(FailingTransport(), now=now)['failed'] == 1
+    outbox = Outbox.query.one()
+    assert (outbox.status, outbox.attempts) == ('pending', 1)
+    assert outbox.next_attempt_at == now + timedelta(seconds=30)
+    assert deliver_pending(FailingTransport(), now=now)['failed'] == 0
+
+    deliver_pending(FailingTransport(), now=now + timedelta(minutes=1))
+    db.session.refresh(outbox)
+    assert (outbox.status, outbox.attempts, outbox.last_error) == ('failed', 2, 'SMTP недоступен')
+
+
+def test_stale_claim_is_returned_to_queue(app, client, setup, tmp_path):
+    post_check(client, setup[2], 0)
+    outbox = Outbox.query.one()
+    outbox.status, outbox.claim_token, outbox.claimed_at = 'sending', 'dead', datetime.utcnow() - timedelta(hours=1)
+    db.session.commit()
+
+    assert deliver_pending(FileTransport(str(tmp_path / 'sent.jsonl')))['notifications'] == 1
+
+
+def test_batch_ingest_notifies(client, setup):
+    _, _, area = setup
+    checks = [{'client_uuid': f'00000000-0000-0000-0000-00000000000{i}', 'area_id': area.id,
+               **{flag: False for flag in FLAGS}} for i in range(3)]
+    assert client.post('/api/checks/batch', json={'checks': checks}).status_code == 200
+    assert Outbox.query.count() == 3
+
+
+def test_rolled_back_check_leaves_no_notification(app, setup):
+    manager, operator, area = setup
+    notify_low_scores([(None, area.id, operator.id, 0)])
+    db.session.rollback()
+    assert Notification.query.count() == 0
+
+
+def test_overdue_audit_notified_once(app, setup):
+    manager, _, area = setup
+    db.session.add(Audit(area_id=area.id, auditor_id=manager.id, total_score=80,
+                         audit_date=datetime.utcnow() - timedelta(days=100),
+                         next_audit_date=datetime.utcnow() - timedelta(days=10)))
+    db.session.commit()
+    rebuild_rollups()
+
+    assert notify_overdue_audits() == 1
+    assert notify_overdue_audits() == 0
+    notification = Notification.query.one()
+    assert (notification.kind, notification.user_id) == ('audit_overdue', manager.id)
+
+
+def test_notifications_api(client, setup, login):
+    manager, _, area = setup
+    post_check(client, area, 1)
+    login(manager)
+
+    (item,) = client.get('/api/notifications?unread=1').get_json()
+    assert item['kind'] == 'low_score' and not item['read']
+    assert client.post(f'/api/notifications/{item["id"]}/read').status_code == 200
+    assert client.get('/api/notifications?unread=1').get_json() == []
+    assert client.post('/api/notifications/999/read').status_code == 404
+
+
+def test_check_commit_enqueues_delivery_job(app, client, setup, tmp_path):
+    outbox_file = tmp_path / 'sent.jsonl'
+    app.extensions['notifications'] = FileTransport(str(outbox_file))
+    post_check(client, setup[2], 0)
+    post_check(client, setup[2], 1)
+
+    # Одно ожидающее задание доставки, зафиксированное вместе с уведомлениями
+    assert Job.query.filter_by(task='notifications.deliver', status='pending').count() == 1
+    assert jobs.Worker(['notifications']).work(burst=True) == 1
+    (message,) = read_messages(outbox_file)
+    assert message['to'] == 'manager@5s.local'
+    assert len(message['notification_ids']) == 2
+
+
+def test_overdue_scan_runs_without_new_checks(app, setup, tmp_path):
+    manager, _, area = setup
+    outbox_file = tmp_path / 'sent.jsonl'
+    app.extensions['notifications'] = FileTransport(str(outbox_file))
+    db.session.add(Audit(area_id=area.id, auditor_id=manager.id, total_score=80,
+                         audit_date=datetime.utcnow() - timedelta(days=100),
+                         next_audit_date=datetime.utcnow() - timedelta(days=10)))
+    db.session.commit()
+    rebuild_rollups()
+
+    # Воркер сам ставит периодические задания; проверок с низкой оценкой не было
+    assert jobs.Worker(['notifications']).work(max_jobs=3) == 3
+    (message,) = read_messages(outbox_file)
+    assert message['to'] == 'manager@5s.local'
+    assert 'Просрочен аудит' in message['subject']
+    periodic = Job.query.filter(Job.unique_key.like('periodic:%')).all()
+    assert {(job.task, job.status) for job in periodic} == {
+        ('notifications.overdue', 'pending'), ('notifications.deliver', 'pending')
+    }
@@ -0,0 +1,177 @@
+# test_photos.py - Загрузка фото: потоковая запись, дедупликация, превью
+import io
+import os
+
+import pytest
+from PIL import Image
+
+from app import db, jobs, photos
+from app.models import Area5S as Area, Check5S as Check, Job, Photo5S as Photo
+
+
+def image_bytes(fmt='JPEG', size=(1600, 900), color=(200, 30, 30)):
+    buffer = io.BytesIO()
+    Image.new('RGB', size, color).save(buffer, fmt)
+    return buffer.getvalue()
+
+
+def build_variants():
+    """Выполняет поставленные задания превью, как `flask worker -q photos`"""
+    return jobs.Worker(['photos']).work(burst=True)
+
+
+@pytest.fixture
+def uploads(app, tmp_path):
+    app.config['UPLOAD_FOLDER'] = str(tmp_path)
+    return tmp_path
+
+
+def test_raw_upload_is_content_addressed_and_deduplicated(client, make_user, login, uploads):
+    login(make_user('user1'))
+    data = image_bytes()
+
+    first = client.post('/api/photos', data=data, content_type='image/jpeg')
+    second = client.post('/api/photos', data=data, content_type='image/jpeg')
+
+    assert first.status_code == 201
+    assert second.status_code == 200
+    photo_id = first.get_json()['photo']['id']
+    assert second.get_json() == {'photo': first.get_json()['photo'], 'duplicate': True}
+    assert Photo.query.count() == 1
+    assert os.path.getsize(photos.original_path(photo_id, 'jpg')) == len(data)
+    assert os.listdir(uploads / 'tmp') == []
+
+
+def test_variants_built_in_background(client, make_user, login, uploads):
+    login(make_user('user1'))
+    response = client.post('/api/photos', data={'photo': (io.BytesIO(image_bytes('PNG')), 'p.png')},
+                           content_type='multipart/form-data')
+    photo_id = response.get_json()['photo']['id']
+    # Задание зафиксировано вместе с фото
+    assert Job.query.filter_by(task='photos.variants', status='pending').count() == 1
+
+    assert build_variants() == 1
+
+    for variant, max_side in photos.VARIANTS.items():
+        with Image.open(photos.variant_path(photo_id, variant)) as image:
+            assert image.format == 'WEBP'
+            assert max(image.size) == min(max_side, 1600)
+
+
+def test_variant_failure_is_logged(client, make_user, login, uploads, caplog):
+    login(make_user('user1'))
+    # Сигнатура JPEG, но изображение не декодируется
+    response = client.post('/api/photos', data=b'\xff\xd8\xff' + b'0' * 100, content_type='image/jpeg')
+    assert response.status_code == 201
+    photo_id = response.get_json()['photo']['id']
+
+    build_variants()
+    job = Job.query.filter_by(task='photos.variants').one()
+    assert (job.payload['photo_id'], job.status) == (photo_id, 'pending')  # повтор позже
+    assert any(record.exc_info and 'photos.variants' in record.getMessage() for record in caplog.records)
+
+
+def test_rejects_unsupported_and_oversized(app, client, make_user, login, uploads):
+    login(make_user('user1'))
+    assert client.post('/api/photos', data=b'%PDF-1.4 ...', content_type='image/png').status_code == 400
+
+    app.config['MAX_CONTENT_LENGTH'] = 1024
+    assert client.post('/api/photos', data=image_bytes(), content_type='image/jpeg').status_code == 413
+    assert os.listdir(uploads / 'tmp') == []
+
+
+def test_checks_store_only_known_photo_refs(client, make_user, login, uploads):
+    login(make_user('user1'))
+    area = Area(name='Цех')
+    db.session.add(area)
+    db.session.commit()
+    photo_id = client.post('/api/photos', data=image_bytes(), content_type='image/jpeg').get_json()['photo']['id']
+
+    flags = {'s_seiri': True, 's_seiton': True, 's_seiso': True, 's_seiketsu': True, 's_shitsuke': True}
+    response = client.post('/api/checks', json=dict(flags, area_id=area.id, photos=[photo_id.upper()]))
+    assert response.status_code == 201
+    assert Check.query.one().photos == [photo_id]
+
+    response = client.post('/api/checks', json=dict(flags, area_id=area.id, photos=['data:image/png;base64,AAAA']))
+    assert response.status_code == 400
+
+
+def upload(client, data):
+    return client.post('/api/photos', data=data, content_type='image/jpeg').get_json()['photo']['id']
+
+
+def test_download_headers_and_conditional_get(client, make_user, login, uploads):
+    login(make_user('user1'))
+    data = image_bytes()
+    photo_id = upload(client, data)
+
+    response = client.get(f'/api/photos/{photo_id}')
+    assert response.status_code == 200
+    assert response.data == data
+    assert response.mimetype == 'image/jpeg'
+    assert response.headers['Accept-Ranges'] == 'bytes'
+    assert response.headers['Last-Modified']
+    assert 'immutable' in response.headers['Cache-Control']
+    assert 'max-age=31536000' in response.headers['Cache-Control']
+    assert 'private' in response.headers['Cache-Control']
+    assert 'public' not in response.headers['Cache-Control']
+
+    etag = response.headers['ETag']
+    cached = client.get(f'/api/photos/{photo_id}', headers={'If-None-Match': etag})
+    assert cached.status_code == 304
+    assert not cached.data
+    assert 'private' in cached.headers['Cache-Control']
+    assert 'public' not in cached.headers['Cache-Control']
+    assert 'immutable' in cached.headers['Cache-Control']
+
+
+def test_range_request(client, make_user, login, uploads):
+    login(make_user('user1'))
+    data = image_bytes()
+    photo_id = upload(client, data)
+
+    response = client.get(f'/api/photos/{photo_id}', headers={'Range': 'bytes=100-199'})
+    assert response.status_code == 206
+    assert response.data == data[100:200]
+    assert response.headers['Content-Range'] == f'bytes 100-199/{len(data)}'
+
+
+def test_thumbnail_variant_and_list_links(client, make_user, login, uploads):
+    login(make_user('user1'))
+    area = Area(name='Цех')
+    db.session.add(area)
+    db.session.commit()
+    photo_id = upload(client, image_bytes())
+    client.post('/api/checks', json={'area_id': area.id, 's_seiri': True, 's_seiton': False,
+                                     's_seiso': False, 's_seiketsu': False, 's_shitsuke': False,
+                                     'photos': [photo_id]})
+    build_variants()
+
+    check = client.get(f'/api/checks/area/{area.id}').get_json()['checks'][0]
+    link = check['photos'][0]
+    assert link['id'] == photo_id
+    assert 'variant=thumb' in link['url']
+
+    response = client.get(link['url'])
+    assert response.status_code == 200
+    assert response.mimetype == 'image/webp'
+    assert 'immutable' in response.headers['Cache-Control']
+
+
+def test_thumbnail_falls_back_to_original_until_built(client, make_user, login, uploads):
+    login(make_user('user1'))
+    photo_id = upload(client, image_bytes())
+    build_variants()
+    os.remove(photos.variant_path(photo_id, 'thumb'))
+
+    response = client.get(f'/api/photos/{photo_id}?variant=thumb')
+    assert response.status_code == 200
+    assert response.mimetype == 'image/jpeg'
+    assert 'no-cache' in response.headers['Cache-Control']
+    assert 'immutable' not in response.headers['Cache-Control']
+
+
+def test_unknown_photo_and_variant(client, make_user, login, uploads):
+    login(make_user('user1'))
+    assert client.get('/api/photos/' + 'a' * 64).status_code == 404
+    assert client.get('/api/photos/' + 'a' * 64 + '?variant=huge').status_code == 400
@@ -0,0 +1,124 @@
+# test_query_plans.py - Регрессия планов запросов (EXPLAIN QUERY PLAN, SQLite)
+#
+# SQL каждого эндпоинта перехватывается и прогоняется через EXPLAIN QUERY PLAN.
+# Горячие запросы к checks_5s и audits_5s не должны переходить на полный скан таблицы.
+import re
+from datetime import datetime, timedelta
+
+import pytest
+from sqlalchemy import desc
+
+from app import db
+from app.models import Area5S as Area, Check5S as Check, Audit5S as Audit
+
+HOT_TABLES = {'checks_5s', 'audits_5s'}
+SCAN_RE = re.compile(r'^SCAN (?:TABLE )?(\w+)')
+
+
+def explain(statement, parameters=()):
+    connection = db.engine.raw_connection()
+    try:
+        cursor = connection.cursor()
+        cursor.execute('EXPLAIN QUERY PLAN ' + statement, parameters)
+        return [row[-1] for row in cursor.fetchall()]
+    finally:
+        connection.close()
+
+
+def full_scans(plan, statement=''):
+    """
+    Строки плана с полным сканированием горячих таблиц.
+
+    Индексным считается только SEARCH: SCAN ... USING (COVERING) INDEX — тот же
+    проход по всем строкам, только по индексу. Исключение — выборка первых N
+    строк (ORDER BY ... LIMIT) в порядке индекса без сортировки: обход
+    останавливается после N строк.
+    """
+    top_n = ('ORDER BY' in statement and 'LIMIT' in statement
+             and not any('TEMP B-TREE' in detail for detail in plan))
+    return [detail for detail in plan
+            if (match := SCAN_RE.match(detail)) and match.group(1) in HOT_TABLES
+            and not (top_n and 'USING INDEX' in detail)]
+
+
+def assert_indexed(executions):
+    selects = [(s, p) for s, p in executions if s.lstrip().upper().startswith('SELECT')]
+    assert selects
+    for statement, parameters in selects:
+        plan = explain(statement, parameters)
+        assert not full_scans(plan, statement), f'Полный скан:\n{statement}\n{plan}'
+
+
+@pytest.fixture
+def seeded(app, make_user):
+    manager = make_user('manager1', role='manager')
+    start = datetime(2024, 1, 1)
+    for i in range(5):
+        area = Area(name=f'Участок {i}', department=f'Отдел {i % 2}', responsible_person_id=manager.id)
+        db.session.add(area)
+        db.session.flush()
+        for j in range(20):
+            db.session.add(Check(area_id=area.id, user_id=manager.id, total_score=j * 5,
+                                 checked_at=start + timedelta(hours=j)))
+        db.session.add(Audit(area_id=area.id, auditor_id=manager.id, total_score=80,
+                             audit_date=start + timedelta(days=i)))
+    db.session.commit()
+    return manager
+
+
+@pytest.mark.parametrize('url', [
+    '/api/areas',
+    '/api/checks/area/1',
+    '/api/checks/area/1?limit=5&cursor=WyIyMDI0LTAxLTAxVDEwOjAwOjAwIiwgMTBd',
+    '/api/checks/area/1?user_id=1&min_score=40',
+    '/api/checks/area/1?since=2024-01-01T05:00:00&until=2024-01-01T15:00:00',
+    '/api/dashboard/stats',
+])
+def test_endpoint_queries_use_indexes(client, login, count_queries, seeded, url):
+    login(seeded)
+    with count_queries() as counter:
+        assert client.get(url).status_code == 200
+    assert_indexed(counter.executions)
+
+
+def test_checks_history_order_comes_from_index(client, login, count_queries, seeded):
+    login(seeded)
+    with count_queries() as counter:
+        client.get('/api/checks/area/1?limit=5')
+    statement, parameters = counter.executions[-1]
+    plan = explain(statement, parameters)
+    assert not any('TEMP B-TREE' in detail for detail in plan), plan
+
+
+def compile_sqlite(query):
+    compiled = query.statement.compile(db.engine)
+    return str(compiled), compiled.positiontup and [compiled.params[k] for k in compiled.positiontup] or ()
+
+
+@pytest.mark.parametrize('build', [
+    # Аудиты участка за период
+    lambda: Audit.query.filter(Audit.area_id == 1, Audit.audit_date >= datetime(2024, 1, 1))
+                 .order_by(desc(Audit.audit_date)),
+    # Аудиты за период по всем участкам
+    lambda: Audit.query.filter(Audit.audit_date.between(datetime(2024, 1, 1), datetime(2024, 2, 1))),
+    # Проверки пользователя
+    lambda: Check.query.filter(Check.user_id == 1).order_by(desc(Check.checked_at)).limit(10),
+    # Последний аудит участка (по всем участкам — из area_score_rollup)
+    lambda: Audit.query.filter(Audit.area_id == 1).order_by(desc(Audit.audit_date)).limit(1),
+])
+def test_hot_model_queries_use_indexes(seeded, build):
+    statement, parameters = compile_sqlite(build())
+    plan = explain(statement, parameters)
+    assert not full_scans(plan, statement), f'Полный скан:\n{statement}\n{plan}'
+
+
+def test_detector_flags_full_scan(seeded):
+    plan = explain('SELECT * FROM checks_5s WHERE notes = ?', ('x',))
+    assert full_scans(plan)
+
+
+def test_detector_flags_full_index_scan(seeded):
+    statement = 'SELECT area_id, max(audit_date) FROM audits_5s GROUP BY area_id'
+    plan = explain(statement)
+    assert any('USING COVERING INDEX' in detail for detail in plan), plan
+    assert full_scans(plan, statement)
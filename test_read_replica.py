@@ -0,0 +1,186 @@
+# test_read_replica.py - Чтение с реплики и read-your-writes для GET-эндпоинтов API
+import sqlite3
+
+import pytest
+from sqlalchemy import event
+
+from app import create_app, db, tokens
+from app.database import REPLICA_BIND
+from app.models import Area5S as Area, User
+
+
+@pytest.fixture
+def replica_app(tmp_path):
+    """Основная база и реплика — два файла SQLite; реплика обновляется копированием"""
+    primary_path = tmp_path / 'primary.db'
+    replica_path = tmp_path / 'replica.db'
+    app = create_app({
+        'TESTING': True,
+        'SQLALCHEMY_DATABASE_URI': f'sqlite:///{primary_path}',
+        'SQLALCHEMY_READ_REPLICA_URI': f'sqlite:///{replica_path}',
+        'PASSWORD_HASH_METHOD': 'pbkdf2:sha256:1000',
+    })
+
+    def sync_replica():
+        with sqlite3.connect(primary_path) as source, sqlite3.connect(replica_path) as target:
+            source.backup(target)
+
+    app.sync_replica = sync_replica
+    with app.app_context():
+        db.create_all()
+        for name in ('manager', 'user1'):
+            db.session.add(User(username=name, email=f'{name}@5s.local', role=name.rstrip('1'), password_hash='-'))
+        db.session.add(Area(name='Склад'))
+        db.session.commit()
+    sync_replica()
+    yield app
+    with app.app_context():
+        db.engine.dispose()
+    replica_engine_of(app).dispose()
+
+
+def replica_engine_of(app):
+    return app.extensions.get(REPLICA_BIND)
+
+
+def client_for(app, username):
+    client = app.test_client()
+    with app.app_context():
+        user_id = User.query.filter_by(username=username).one().id
+    with client.session_transaction() as session:
+        session['_user_id'] = str(user_id)
+        session['_fresh'] = True
+    return client
+
+
+def area_names(app, client):
+    with app.app_context():
+        response = client.get('/api/areas')
+    assert response.status_code == 200
+    return sorted(area['name'] for area in response.get_json())
+
+
+def add_area_on_primary(app, name):
+    with app.app_context():
+        db.session.add(Area(name=name))
+        db.session.commit()
+
+
+def test_get_endpoints_read_from_replica(replica_app):
+    client = client_for(replica_app, 'user1')
+    add_area_on_primary(replica_app, 'Цех 1')
+
+    # Реплика еще не догнала основную базу
+    assert area_names(replica_app, client) == ['Склад']
+
+    replica_app.sync_replica()
+    assert area_names(replica_app, client) == ['Склад', 'Цех 1']
+
+
+def test_writes_go_to_primary_and_stick(replica_app):
+    manager = client_for(replica_app, 'manager')
+    other = client_for(replica_app, 'user1')
+
+    with replica_app.app_context():
+        response = manager.post('/api/areas', json={'name': 'Цех 2'})
+    assert response.status_code == 201
+
+    # Писавший клиент сразу видит свою запись, остальные — состояние реплики
+    assert area_names(replica_app, manager) == ['Склад', 'Цех 2']
+    assert area_names(replica_app, other) == ['Склад']
+
+
+def bearer_for(app, username):
+    with app.app_context():
+        user = User.query.filter_by(username=username).one()
+        return {'Authorization': 'Bearer ' + tokens.issue_pair(user)['access_token']}
+
+
+def test_bearer_writes_stick_server_side(replica_app):
+    client = replica_app.test_client()  # без cookie сессии
+    manager, other = bearer_for(replica_app, 'manager'), bearer_for(replica_app, 'user1')
+
+    with replica_app.app_context():
+        response = client.post('/api/areas', json={'name': 'Цех 4'}, headers=manager)
+    assert response.status_code == 201
+
+    for headers, expected in ((manager, ['Склад', 'Цех 4']), (other, ['Склад'])):
+        with replica_app.app_context():
+            response = replica_app.test_client().get('/api/areas', headers=headers)
+        assert sorted(area['name'] for area in response.get_json()) == expected
+
+
+def test_bearer_write_sets_no_cookie(replica_app, app, make_user):
+    # Без реплики отметка о записи не нужна вовсе, с репликой — только серверная
+    make_user('writer', role='manager')
+    for target in (app, replica_app):
+        headers = bearer_for(target, 'writer' if target is app else 'manager')
+        with target.app_context():
+            response = target.test_client().post('/api/areas', json={'name': 'Цех 5'}, headers=headers)
+        assert response.status_code == 201
+        assert 'Set-Cookie' not in response.headers
+
+
+def test_stickiness_expires(replica_app):
+    replica_app.config['READ_REPLICA_STICKY_SECONDS'] = 0
+    manager = client_for(replica_app, 'manager')
+
+    with replica_app.app_context():
+        manager.post('/api/areas', json={'name': 'Цех 3'})
+    assert area_names(replica_app, manager) == ['Склад']
+
+
+def recorder(statements):
+    def before_cursor_execute(conn, cursor, statement, *args):
+        statements.append(statement)
+    return before_cursor_execute
+
+
+def test_only_selects_use_replica(replica_app):
+    client = client_for(replica_app, 'user1')
+    statements = {'primary': [], 'replica': []}
+
+    with replica_app.app_context():
+        engines = {'primary': db.engine, 'replica': replica_engine_of(replica_app)}
+        listeners = {name: recorder(statements[name]) for name in engines}
+        for name, engine in engines.items():
+            event.listen(engine, 'before_cursor_execute', listeners[name])
+        try:
+            client.get('/api/areas')
+            client.post('/api/checks', json={
+                'area_id': 1, 's_seiri': True, 's_seiton': True, 's_seiso': True,
+                's_seiketsu': True, 's_shitsuke': True
+            })
+        finally:
+            for name, engine in engines.items():
+                event.remove(engine, 'before_cursor_execute', listeners[name])
+
+    assert any('areas_5s' in s for s in statements['replica'])
+    assert all(s.lstrip().upper().startswith(('SELECT', 'PRAGMA')) for s in statements['replica'])
+    assert any(s.startswith('INSERT INTO checks_5s') for s in statements['primary'])
+
+
+def test_user_loader_reads_primary(replica_app):
+    client = client_for(replica_app, 'user1')
+    statements = {'primary': [], 'replica': []}
+
+    with replica_app.app_context():
+        engines = {'primary': db.engine, 'replica': replica_engine_of(replica_app)}
+        listeners = {name: recorder(statements[name]) for name in engines}
+        for name, engine in engines.items():
+            event.listen(engine, 'before_cursor_execute', listeners[name])
+        try:
+            assert client.get('/api/areas').status_code == 200
+        finally:
+            for name, engine in engines.items():
+                event.remove(engine, 'before_cursor_execute', listeners[name])
+
+    assert any('FROM users_5s' in s for s in statements['primary'])
+    assert not any('FROM users_5s' in s for s in statements['replica'])
+    assert any('areas_5s' in s for s in statements['replica'])
+
+
+def test_without_replica_everything_uses_primary(client, make_user, login):
+    login(make_user('user1'))
+    assert client.get('/api/areas').status_code == 200
+    assert replica_engine_of(client.application) is None
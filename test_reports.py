@@ -0,0 +1,165 @@
+# test_reports.py - Отчеты 5С за месяц: задания, фоновый рендеринг, дисковый кэш
+import io
+import os
+from datetime import datetime, timedelta
+
+import pytest
+from PIL import Image
+
+from app import db, jobs, photos, reports
+from app.models import Area5S as Area, Check5S as Check, Job, Report5S as Report
+from app.rollup import rebuild_rollups
+
+
+@pytest.fixture
+def seeded(app, make_user, login, tmp_path):
+    app.config.update(REPORTS_FOLDER=str(tmp_path / 'reports'), UPLOAD_FOLDER=str(tmp_path / 'uploads'))
+    manager = make_user('manager', role='manager')
+    areas = [Area(name=f'Участок {i}', department='Цех 1' if i % 2 else 'Склад') for i in range(6)]
+    db.session.add_all(areas)
+    db.session.flush()
+
+    buffer = io.BytesIO()
+    Image.new('RGB', (400, 300), 'red').save(buffer, 'PNG')
+    buffer.seek(0)
+    photo, _ = photos.save_upload(buffer, manager.id)
+    jobs.Worker(['photos']).work(burst=True)
+
+    start = datetime(2024, 3, 1, 9)
+    for i in range(30):
+        area = areas[i % len(areas)]
+        db.session.add(Check(area_id=area.id, user_id=manager.id, s_seiri=True, s_seiton=i % 2 == 0,
+                             total_score=60 + i % 3 * 20, checked_at=start + timedelta(days=i % 28),
+                             photos=[photo.id] if i == 1 else None))
+    db.session.commit()
+    rebuild_rollups()
+    login(manager)
+    return manager, areas, photo
+
+
+def order(client, **payload):
+    payload.setdefault('month', '2024-03')
+    return client.post('/api/reports', json=payload)
+
+
+def render():
+    """Выполняет задания очереди reports, как процесс `flask worker`"""
+    return jobs.Worker(['reports']).work(burst=True)
+
+
+def test_request_enqueues_without_rendering(client, seeded):
+    response = order(client, department='Цех 1')
+
+    assert response.status_code == 202
+    report = response.get_json()['report']
+    assert report['status'] == 'pending'
+    assert report['download_url'] is None
+    assert response.headers['Location'] == report['status_url']
+    assert client.get(f'/api/reports/{report["id"]}/download').status_code == 409
+
+
+def test_html_report_rendered_by_worker(client, seeded):
+    report_id = order(client, department='Цех 1').get_json()['report']['id']
+
+    render()
+    status = client.get(f'/api/reports/{report_id}').get_json()
+    assert status['status'] == 'done'
+
+    response = client.get(status['download_url'])
+    assert response.status_code == 200
+    assert response.mimetype == 'text/html'
+    html = response.get_data(as_text=True)
+    assert 'Отчет 5С: Цех 1, 03.2024' in html
+    assert 'Участок 1' in html and 'Участок 2' not in html
+    # Превью фото встраивается в файл
+    assert 'data:image/webp;base64,' in html
+
+
+def test_pdf_report(client, seeded):
+    report_id = order(client, format='pdf').get_json()['report']['id']
+    render()
+
+    response = client.get(f'/api/reports/{report_id}/download')
+    assert response.status_code == 200
+    assert response.mimetype == 'application/pdf'
+    assert response.get_data().startswith(b'%PDF')
+    assert 'attachment' in response.headers['Content-Disposition']
+
+
+def test_same_parameters_reuse_cached_file(client, seeded):
+    first = order(client).get_json()['report']
+    # Пока задание ждет, повторный заказ возвращает его же
+    assert order(client).get_json()['report']['id'] == first['id']
+    render()
+
+    response = order(client)
+    assert response.status_code == 200
+    assert response.get_json()['cached'] is True
+    assert response.get_json()['report']['id'] == first['id']
+
+
+def test_new_data_invalidates_cache(client, seeded):
+    manager, areas, _ = seeded
+    first = order(client).get_json()['report']
+    render()
+
+    check = {'area_id': areas[0].id, 's_seiri': True, 's_seiton': True, 's_seiso': True,
+             's_seiketsu': True, 's_shitsuke': True}
+    assert client.post('/api/checks', json=check).status_code == 201
+    # Проверка за текущий месяц не меняет отчет за март
+    assert order(client).get_json()['report']['id'] == first['id']
+
+    db.session.add(Check(area_id=areas[0].id, user_id=manager.id, total_score=100,
+                         checked_at=datetime(2024, 3, 20)))
+    db.session.commit()
+    rebuild_rollups()
+    second = order(client)
+    assert second.status_code == 202
+    assert second.get_json()['report']['id'] != first['id']
+
+
+def test_failed_render_is_retried(app, client, seeded, monkeypatch):
+    app.config['REPORT_MAX_ATTEMPTS'] = 2
+    report_id = order(client).get_json()['report']['id']
+
+    def broken(data, path):
+        raise RuntimeError('нет места на диске')
+
+    monkeypatch.setitem(reports.RENDERERS, 'html', broken)
+    render()
+    report = db.session.get(Report, report_id)
+    assert (report.status, report.attempts) == ('pending', 1)
+    # Повтор — после задержки очереди
+    job = Job.query.filter_by(task='reports.render').one()
+    assert (job.status, job.max_attempts) == ('pending', 2)
+    assert job.run_at > datetime.utcnow()
+
+    job.run_at = datetime.utcnow()
+    db.session.commit()
+    render()
+    db.session.refresh(report)
+    db.session.refresh(job)
+    assert (report.status, report.attempts, job.status) == ('failed', 2, 'failed')
+    assert 'нет места' in report.error
+    assert not os.listdir(os.path.dirname(reports.report_path(report)))
+
+
+def test_invalid_parameters_and_permissions(client, seeded, make_user, login):
+    assert order(client, month='март').status_code == 400
+    assert order(client, format='docx').status_code == 400
+    assert client.get('/api/reports/999').status_code == 404
+
+    login(make_user('user1'))
+    assert order(client).status_code == 403
+
+
+def test_report_data_uses_aggregates(app, seeded, count_queries):
+    report, _ = reports.request_report('2024-03')
+    db.session.refresh(report)
+    with count_queries() as counter:
+        data = reports.build_report_data(report)
+    # Участки с показателями, фото и динамика — три запроса независимо от числа проверок
+    assert counter.count == 3
+    assert data['area_count'] == 6
+    assert data['checks'] == 30
+    assert sum(len(area['photos']) for area in data['areas']) == 1
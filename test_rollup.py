@@ -0,0 +1,108 @@
+# test_rollup.py - Накопительная таблица показателей участков
+from datetime import datetime, timedelta
+
+from sqlalchemy import insert
+
+from app import db, rollup as rollup_module
+from app.models import Area5S as Area, Check5S as Check, Audit5S as Audit, AreaScoreRollup as Rollup
+from app.rollup import apply_check, apply_audit, rebuild_rollups, rebuild_rollup_command
+
+
+def add_check(area, user, score, checked_at, **flags):
+    check = Check(area_id=area.id, user_id=user.id, total_score=score, checked_at=checked_at, **flags)
+    db.session.add(check)
+    db.session.flush()
+    return check
+
+
+def test_apply_check_is_incremental(app, make_user):
+    user = make_user('user1')
+    area = Area(name='Цех')
+    db.session.add(area)
+    db.session.commit()
+
+    now = datetime(2024, 5, 1, 10, 0)
+    apply_check(add_check(area, user, 60, now, s_seiri=True, s_seiso=True))
+    # Синхронизация офлайн-проверки с более ранней датой не сдвигает last_check_at назад
+    apply_check(add_check(area, user, 100, now - timedelta(days=3), s_seiri=True))
+    db.session.commit()
+
+    rollup = db.session.get(Rollup, area.id)
+    assert rollup.check_count == 2
+    assert rollup.score_sum == 160
+    assert rollup.average_score == 80
+    assert rollup.last_check_at == now
+    assert (rollup.seiri_hits, rollup.seiton_hits, rollup.seiso_hits) == (2, 0, 1)
+
+
+def test_concurrent_first_write_does_not_conflict(app, make_user, monkeypatch):
+    user = make_user('user1')
+    area = Area(name='Цех')
+    db.session.add(area)
+    db.session.commit()
+
+    insert_missing = rollup_module._insert_missing
+
+    def concurrent_insert(model, **key):
+        # Параллельная транзакция успела создать строку после нашего UPDATE
+        db.session.execute(insert(model).values(**key))
+        insert_missing(model, **key)
+
+    monkeypatch.setattr(rollup_module, '_insert_missing', concurrent_insert)
+    apply_check(add_check(area, user, 60, datetime(2024, 5, 1, 10, 0), s_seiri=True))
+    db.session.commit()
+
+    rollup = db.session.get(Rollup, area.id)
+    assert rollup.check_count == 1
+    assert rollup.score_sum == 60
+
+
+def test_apply_audit_keeps_latest_grade(app, make_user):
+    auditor = make_user('auditor1', role='auditor')
+    area = Area(name='Склад')
+    db.session.add(area)
+    db.session.commit()
+
+    newer = Audit(area_id=area.id, auditor_id=auditor.id, total_score=90, audit_date=datetime(2024, 6, 1))
+    older = Audit(area_id=area.id, auditor_id=auditor.id, total_score=40, audit_date=datetime(2024, 1, 1))
+    db.session.add_all([newer, older])
+    db.session.flush()
+    apply_audit(newer, 'A')
+    apply_audit(older, 'D')
+    db.session.commit()
+
+    rollup = db.session.get(Rollup, area.id)
+    assert rollup.audit_count == 2
+    assert rollup.last_audit_grade == 'A'
+    assert rollup.last_audit_score == 90
+    assert rollup.last_audit_at == datetime(2024, 6, 1)
+
+
+def test_rebuild_repairs_drift(app, make_user):
+    user = make_user('user1')
+    areas = [Area(name=f'Участок {i}') for i in range(3)]
+    db.session.add_all(areas)
+    db.session.commit()
+
+    start = datetime(2024, 1, 1)
+    for i, area in enumerate(areas):
+        for j in range(i + 1):
+            add_check(area, user, 20 * (j + 1), start + timedelta(days=j), s_shitsuke=True)
+    # Расхождение: строка, не соответствующая истории
+    db.session.add(Rollup(area_id=areas[0].id, check_count=99, score_sum=1))
+    db.session.commit()
+
+    assert rebuild_rollups() == 3
+
+    rows = {row.area_id: row for row in Rollup.query.all()}
+    assert rows[areas[0].id].check_count == 1
+    assert rows[areas[2].id].check_count == 3
+    assert rows[areas[2].id].score_sum == 120
+    assert rows[areas[2].id].shitsuke_hits == 3
+    assert rows[areas[2].id].last_check_at == start + timedelta(days=2)
+
+
+def test_rebuild_cli_command(app):
+    result = app.test_cli_runner().invoke(rebuild_rollup_command)
+    assert result.exit_code == 0
+    assert '0 участков' in result.output
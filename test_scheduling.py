@@ -0,0 +1,114 @@
+# test_scheduling.py - Планирование аудитов по истории оценок
+from datetime import datetime, timedelta
+
+import pytest
+
+from app import db
+from app.models import Area5S as Area, AreaScoreRollup as Rollup, Audit5S as Audit
+from app.rollup import rebuild_rollups
+from app.scheduling import next_audit_date
+
+SCORES = ('seiri_score', 'seiton_score', 'seiso_score', 'seiketsu_score', 'shitsuke_score')
+START = datetime(2024, 1, 1)
+
+
+@pytest.fixture
+def auditor(client, make_user, login):
+    user = make_user('auditor', role='auditor')
+    login(user)
+    return user
+
+
+def add_area(name, department=None):
+    area = Area(name=name, department=department)
+    db.session.add(area)
+    db.session.commit()
+    return area
+
+
+def post_audit(client, area, total, **extra):
+    """Аудит с общей оценкой total (кратной 5)"""
+    payload = dict(zip(SCORES, [total // 5] * 5))
+    response = client.post('/api/audits', json={'area_id': area.id, **payload, **extra})
+    assert response.status_code == 201, response.get_json()
+    return response.get_json()['audit']
+
+
+def test_interval_depends_on_grade_history(app):
+    assert next_audit_date(START, 'A') == START + timedelta(days=90)
+    assert next_audit_date(START, 'D') == START + timedelta(days=14)
+    # Ухудшение класса — интервал вдвое короче
+    assert next_audit_date(START, 'C', previous_grade='A') == START + timedelta(days=15)
+    # Повторный высший класс — интервал длиннее
+    assert next_audit_date(START, 'A', previous_grade='A') == START + timedelta(days=135)
+    assert next_audit_date(START, 'B', previous_grade='C') == START + timedelta(days=60)
+
+
+def test_interval_config_override(app):
+    app.config['AUDIT_INTERVAL_DAYS'] = {'A': 180}
+    assert next_audit_date(START, 'A') == START + timedelta(days=180)
+    assert next_audit_date(START, 'B') == START + timedelta(days=60)
+
+
+def test_create_audit_schedules_next(client, auditor):
+    area = add_area('Цех')
+    first = post_audit(client, area, 95)
+    first_date = db.session.get(Audit, first['id']).audit_date
+    assert datetime.fromisoformat(first['next_audit_date']) == first_date + timedelta(days=90)
+
+    second = post_audit(client, area, 50)
+    second_date = db.session.get(Audit, second['id']).audit_date
+    assert datetime.fromisoformat(second['next_audit_date']) == second_date + timedelta(days=7)
+
+    rollup = db.session.query(Rollup.next_audit_at).filter_by(area_id=area.id).scalar()
+    assert rollup == second_date + timedelta(days=7)
+
+
+def test_explicit_next_audit_date(client, auditor):
+    area = add_area('Склад')
+    audit = post_audit(client, area, 80, next_audit_date='2030-01-01T08:00:00')
+    assert audit['next_audit_date'] == '2030-01-01T08:00:00'
+    response = client.post('/api/audits', json={'area_id': area.id, **dict.fromkeys(SCORES, 10),
+                                                'next_audit_date': 'завтра'})
+    assert response.status_code == 400
+
+
+def test_due_list(client, auditor):
+    now = datetime.utcnow()
+    never = add_area('Новый участок', 'Логистика')
+    overdue = add_area('Цех 1', 'Производство')
+    soon = add_area('Цех 2', 'Производство')
+    later = add_area('Склад', 'Логистика')
+    for area, next_at in ((overdue, now - timedelta(days=3)), (soon, now + timedelta(days=2)),
+                          (later, now + timedelta(days=40))):
+        db.session.add(Audit(area_id=area.id, auditor_id=auditor.id, total_score=80,
+                             audit_date=now - timedelta(days=30), next_audit_date=next_at))
+    db.session.commit()
+    rebuild_rollups()
+
+    due = client.get('/api/audits/due').get_json()
+    assert [(d['area'], d['status']) for d in due] == [
+        ('Новый участок', 'never_audited'), ('Цех 1', 'overdue'), ('Цех 2', 'upcoming')
+    ]
+    assert due[1]['days_overdue'] == 3
+
+    due = client.get('/api/audits/due?within_days=0&department=Производство').get_json()
+    assert [d['area'] for d in due] == ['Цех 1']
+    assert len(client.get('/api/audits/due?within_days=60&limit=2').get_json()) == 2
+
+
+def test_due_list_uses_next_audit_index(client, auditor, count_queries):
+    from test_query_plans import explain
+
+    add_area('Цех')
+    with count_queries() as counter:
+        client.get('/api/audits/due')
+    plans = [explain(s, p) for s, p in counter.executions if 'next_audit_at <=' in s]
+    assert plans
+    assert any('ix_area_score_rollup_next_audit_at' in line for line in plans[0])
+    assert not [s for s in counter.statements if 'audits_5s' in s]
+
+
+def test_due_requires_auditor_role(client, make_user, login):
+    login(make_user('user1'))
+    assert client.get('/api/audits/due').status_code == 403
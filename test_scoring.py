@@ -0,0 +1,79 @@
+# test_scoring.py - Расчет оценок 5С: построчно и векторно
+import numpy as np
+import pytest
+
+from app import db, scoring
+from app.models import Area5S as Area, Check5S as Check, AreaScoreRollup as Rollup
+
+
+def test_vectorized_matches_row_path():
+    rng = np.random.default_rng(5)
+    flags = rng.integers(0, 2, size=(2000, 5)).astype(bool)
+    scores = rng.integers(0, scoring.AUDIT_MAX_S_SCORE + 1, size=(2000, 5))
+
+    assert scoring.check_scores_array(flags).tolist() == [scoring.check_score(row) for row in flags.tolist()]
+
+    totals = scoring.audit_totals_array(scores)
+    assert totals.tolist() == [scoring.audit_total(row) for row in scores.tolist()]
+    assert scoring.grades_array(totals).tolist() == [scoring.grade_for(total) for total in totals.tolist()]
+
+
+@pytest.mark.parametrize('total, grade', [(100, 'A'), (90, 'A'), (89, 'B'), (75, 'B'), (60, 'C'), (0, 'D')])
+def test_default_grades(total, grade):
+    assert scoring.grade_for(total) == grade
+
+
+def test_department_thresholds(app):
+    app.config['GRADE_THRESHOLDS'] = {
+        'Производство': [('A', 95), ('B', 80), ('C', 0)],
+        'default': [('OK', 50), ('FAIL', 0)],
+    }
+    assert scoring.grade_for(92, 'Производство') == 'B'
+    assert scoring.grade_for(92, 'Склад') == 'OK'
+    assert scoring.grades_array(np.array([96, 92, 10]), 'Производство').tolist() == ['A', 'B', 'C']
+
+
+def test_create_check_and_audit_endpoints(client, make_user, login):
+    auditor = make_user('auditor1', role='auditor')
+    area = Area(name='Цех', department='Производство')
+    db.session.add(area)
+    db.session.commit()
+    login(auditor)
+
+    response = client.post('/api/checks', json={
+        'area_id': area.id, 's_seiri': True, 's_seiton': True, 's_seiso': True,
+        's_seiketsu': False, 's_shitsuke': False
+    })
+    assert response.status_code == 201
+    assert response.get_json()['check']['total_score'] == 60
+
+    response = client.post('/api/audits', json={
+        'area_id': area.id, 'seiri_score': 20, 'seiton_score': 18, 'seiso_score': 17,
+        'seiketsu_score': 20, 'shitsuke_score': 15
+    })
+    assert response.status_code == 201
+    assert response.get_json()['audit']['total_score'] == 90
+    assert response.get_json()['audit']['grade'] == 'A'
+    assert db.session.get(Rollup, area.id).last_audit_grade == 'A'
+
+    response = client.post('/api/audits', json={
+        'area_id': area.id, 'seiri_score': 25, 'seiton_score': 0, 'seiso_score': 0,
+        'seiketsu_score': 0, 'shitsuke_score': 0
+    })
+    assert response.status_code == 400
+
+
+def test_rescore_checks_updates_only_changed_rows(app, make_user):
+    user = make_user('user1')
+    area = Area(name='Цех')
+    db.session.add(area)
+    db.session.flush()
+    db.session.add_all([
+        Check(area_id=area.id, user_id=user.id, s_seiri=True, s_seiton=True, total_score=40),
+        Check(area_id=area.id, user_id=user.id, s_seiri=True, total_score=0),
+        Check(area_id=area.id, user_id=user.id, s_seiso=True, s_shitsuke=True, total_score=100),
+    ])
+    db.session.commit()
+
+    assert scoring.rescore_checks(chunk_size=2) == 2
+    assert [c.total_score for c in Check.query.order_by(Check.id)] == [40, 20, 40]
@@ -0,0 +1,118 @@
+# test_seed.py - Генератор синтетических данных flask seed
+from datetime import datetime
+
+import pytest
+from sqlalchemy import func
+
+from app import db, seed
+from app.models import (
+    Area5S as Area, AreaScoreRollup as Rollup, Audit5S as Audit, Check5S as Check, Photo5S as Photo, User
+)
+
+NOW = datetime(2024, 12, 31, 12)
+
+
+def small(**kwargs):
+    params = dict(departments=3, areas=20, users=15, checks=5000, years=2, now=NOW)
+    params.update(kwargs)
+    return seed.generate(**params)
+
+
+def snapshot():
+    checks = db.session.query(Check.area_id, Check.user_id, Check.total_score, Check.checked_at) \
+        .order_by(Check.id).all()
+    audits = db.session.query(Audit.area_id, Audit.total_score, Audit.audit_date, Audit.photos) \
+        .order_by(Audit.id).all()
+    return checks, audits
+
+
+def test_generated_data_is_consistent(app):
+    counts = small()
+
+    assert counts['checks'] == db.session.query(Check).count() == 5000
+    assert counts['users'] == 15 and counts['areas'] == 20 and counts['audits'] > 0
+    assert {department for (department,) in db.session.query(Area.department)} == set(seed.department_names(3))
+    assert db.session.query(User).filter_by(username='admin', role='admin').count() == 1
+    assert User.query.filter_by(username='admin').one().check_password(seed.DEFAULT_PASSWORD)
+
+    # Оценка соответствует флагам, время проверок растет вместе с id
+    for check in Check.query.order_by(Check.id).limit(200):
+        flags = [check.s_seiri, check.s_seiton, check.s_seiso, check.s_seiketsu, check.s_shitsuke]
+        assert check.total_score == 20 * sum(flags)
+    times = [checked_at for (checked_at,) in db.session.query(Check.checked_at).order_by(Check.id)]
+    assert times == sorted(times)
+    assert times[0] >= datetime(2023, 1, 1) and times[-1] < datetime(2025, 1, 1)
+
+    # Фото аудитов — существующие записи photos_5s
+    photo_ids = {photo_id for (photo_id,) in db.session.query(Photo.id)}
+    refs = [ref for (refs,) in db.session.query(Audit.photos) if refs for ref in refs]
+    assert refs and set(refs) == photo_ids
+
+    # Накопительные таблицы пересчитаны, индексы на месте
+    assert db.session.query(func.sum(Rollup.check_count)).scalar() == 5000
+    assert db.session.query(func.sum(Rollup.audit_count)).scalar() == counts['audits']
+    assert {index.name for index in Check.__table__.indexes} <= {
+        name for (name,) in db.session.execute(db.text(
+            "SELECT name FROM sqlite_master WHERE type = 'index' AND tbl_name = 'checks_5s'"))
+    }
+
+
+def test_same_seed_gives_same_data(app):
+    small(seed=7)
+    first = snapshot()
+    db.session.remove()
+    db.drop_all()
+    db.create_all()
+
+    small(seed=7)
+    assert snapshot() == first
+    db.session.remove()
+    db.drop_all()
+    db.create_all()
+
+    small(seed=8)
+    assert snapshot() != first
+
+
+def test_scores_follow_seasons_and_improve(app):
+    small(areas=50, checks=30000, years=3)
+    month = func.strftime('%m', Check.checked_at)
+    by_month = dict(db.session.query(month, func.avg(Check.total_score)).group_by(month))
+    assert by_month['07'] < by_month['02'] - 3
+
+    year = func.strftime('%Y', Check.checked_at)
+    by_year = dict(db.session.query(year, func.avg(Check.total_score)).group_by(year))
+    assert by_year['2024'] > by_year['2022']
+
+
+def test_audit_target(app):
+    counts = small(areas=7, audits=100)
+
+    assert counts['audits'] == db.session.query(Audit).count() == 100
+    per_area = dict(db.session.query(Audit.area_id, func.count()).group_by(Audit.area_id))
+    assert sorted(per_area.values()) == [14] * 5 + [15] * 2
+    dates = [audit_date for (audit_date,) in db.session.query(Audit.audit_date)]
+    assert min(dates) >= datetime(2023, 1, 1) and max(dates) < datetime(2025, 1, 1)
+    assert db.session.query(Audit).filter(Audit.next_audit_date <= Audit.audit_date).count() == 0
+    assert db.session.query(func.sum(Rollup.audit_count)).scalar() == 100
+
+
+def test_refuses_non_empty_database(app, make_user):
+    make_user('existing')
+    with pytest.raises(seed.SeedError):
+        small()
+
+
+def test_seed_command(app):
+    runner = app.test_cli_runner()
+    args = ['seed', '--departments', '2', '--areas', '5', '--users', '6', '--checks', '300', '--years', '1']
+
+    result = runner.invoke(args=args)
+    assert result.exit_code == 0, result.output
+    assert 'checks: 300' in result.output
+    assert runner.invoke(args=args).exit_code != 0
+
+    result = runner.invoke(args=args + ['--drop', '--seed', '9', '--audits', '12'], input='y\n')
+    assert result.exit_code == 0, result.output
+    assert db.session.query(Check).count() == 300
+    assert db.session.query(Audit).count() == 12
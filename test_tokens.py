@@ -0,0 +1,98 @@
+# test_tokens.py - Токены доступа для API-клиентов
+import time
+
+from app import tokens
+
+
+def obtain_tokens(client, make_user, role='user'):
+    make_user('kiosk', role=role, password='kiosk123')
+    response = client.post('/auth/login', json={'username': 'kiosk', 'password': 'kiosk123'})
+    assert response.status_code == 200
+    return response.get_json()['tokens']
+
+
+def bearer(token):
+    return {'Authorization': f'Bearer {token}'}
+
+
+def test_api_accepts_access_token_without_users_query(app, make_user, count_queries):
+    pair = obtain_tokens(app.test_client(), make_user)
+    client = app.test_client()  # без cookie сессии
+
+    assert client.get('/api/areas').status_code == 401
+    with count_queries() as counter:
+        response = client.get('/api/areas', headers=bearer(pair['access_token']))
+    assert response.status_code == 200
+    assert not [s for s in counter.statements if 'FROM users_5s' in s]
+
+
+def test_role_required_uses_token_claims(app, make_user, count_queries):
+    pair = obtain_tokens(app.test_client(), make_user, role='admin')
+    client = app.test_client()
+
+    with count_queries() as counter:
+        response = client.get('/api/cache/stats', headers=bearer(pair['access_token']))
+    assert response.status_code == 200
+    assert counter.count == 0
+
+
+def test_token_not_accepted_outside_api_or_when_invalid(app, make_user):
+    pair = obtain_tokens(app.test_client(), make_user)
+    client = app.test_client()
+
+    assert client.get('/auth/profile', headers=bearer(pair['access_token'])).status_code == 401
+    assert client.get('/api/areas', headers=bearer(pair['refresh_token'])).status_code == 401
+    assert client.get('/api/areas', headers=bearer(pair['access_token'] + 'x')).status_code == 401
+
+
+def test_expired_access_token(app, make_user, monkeypatch):
+    pair = obtain_tokens(app.test_client(), make_user)
+    real_time = time.time
+    monkeypatch.setattr(time, 'time', lambda: real_time() + app.config['ACCESS_TOKEN_TTL'] + 5)
+    assert app.test_client().get('/api/areas', headers=bearer(pair['access_token'])).status_code == 401
+
+
+def test_refresh_rotates_and_revokes(app, make_user):
+    pair = obtain_tokens(app.test_client(), make_user)
+    client = app.test_client()
+
+    response = client.post('/auth/token/refresh', json={'refresh_token': pair['refresh_token']})
+    assert response.status_code == 200
+    new_pair = response.get_json()
+    assert client.get('/api/areas', headers=bearer(new_pair['access_token'])).status_code == 200
+
+    # Повторное использование старого refresh-токена запрещено
+    assert client.post('/auth/token/refresh', json={'refresh_token': pair['refresh_token']}).status_code == 401
+
+
+def test_concurrent_refresh_issues_one_pair(app, make_user, monkeypatch):
+    pair = obtain_tokens(app.test_client(), make_user)
+    client = app.test_client()
+    # Оба запроса прошли проверку отзыва в decode до того, как первый отозвал токен
+    monkeypatch.setattr(tokens.revocation_list, 'is_revoked', lambda jti: False)
+
+    first = client.post('/auth/token/refresh', json={'refresh_token': pair['refresh_token']})
+    second = client.post('/auth/token/refresh', json={'refresh_token': pair['refresh_token']})
+    assert first.status_code == 200
+    assert second.status_code == 401
+
+
+def test_revoke_access_token(app, make_user):
+    pair = obtain_tokens(app.test_client(), make_user)
+    client = app.test_client()
+
+    response = client.post('/auth/token/revoke', headers=bearer(pair['access_token']),
+                           json={'refresh_token': pair['refresh_token']})
+    assert response.get_json()['revoked'] == 2
+    assert client.get('/api/areas', headers=bearer(pair['access_token'])).status_code == 401
+    assert client.post('/auth/token/refresh', json={'refresh_token': pair['refresh_token']}).status_code == 401
+
+
+def test_revocation_list_uses_shared_backend(app):
+    from app.cache import LRUCacheBackend
+    backend = LRUCacheBackend()
+    tokens.revocation_list.configure(backend)
+    assert tokens.revocation_list.revoke('abc', time.time() + 60)
+    assert tokens.revocation_list.is_revoked('abc')
+    assert backend.get('revoked:abc') == 1
+    assert not tokens.revocation_list.revoke('abc', time.time() + 60)
@@ -0,0 +1,119 @@
+# test_user_cache.py - Кэш пользователей для user_loader
+from app import db
+from app.models import User
+from app.user_cache import user_cache
+
+
+def send(app, client, count_queries, method='get', url='/api/areas', **kwargs):
+    """Запрос в собственном контексте приложения, как в рабочем сервере"""
+    with app.app_context():
+        with count_queries() as counter:
+            response = getattr(client, method)(url, **kwargs)
+    assert response.status_code == 200, response.get_json()
+    return counter
+
+
+def users_queries(counter):
+    return [s for s in counter.statements if 'FROM users_5s' in s]
+
+
+def cached(user):
+    return user_cache.backend.get(f'user:{user.id}')
+
+
+def test_authenticated_requests_skip_users_table(app, client, make_user, login, count_queries):
+    login(make_user('user1'))
+
+    assert users_queries(send(app, client, count_queries))
+    assert not users_queries(send(app, client, count_queries))
+    assert not users_queries(send(app, client, count_queries))
+    assert (user_cache.hits, user_cache.misses) == (2, 1)
+
+
+def test_role_check_uses_cached_role(app, client, make_user, login, count_queries):
+    login(make_user('admin', role='admin'))
+    send(app, client, count_queries, url='/api/cache/stats')
+    assert send(app, client, count_queries, url='/api/cache/stats').count == 0
+
+
+def test_profile_update_invalidates(app, client, make_user, login, count_queries):
+    user = make_user('user1', department='Склад')
+    login(user)
+    send(app, client, count_queries)
+
+    send(app, client, count_queries, 'put', '/auth/profile', json={'department': 'ОТК'})
+    assert cached(user) is None
+
+    send(app, client, count_queries)
+    assert cached(user)['department'] == 'ОТК'
+
+
+def test_password_change_invalidates_and_checks_real_hash(app, client, make_user, login, count_queries):
+    user = make_user('user1', password='old-password')
+    login(user)
+    send(app, client, count_queries)
+    assert 'password_hash' not in cached(user)
+
+    send(app, client, count_queries, 'post', '/auth/change-password',
+         json={'current_password': 'old-password', 'new_password': 'new-password'})
+    assert cached(user) is None
+
+    with app.app_context():
+        assert user_cache.load(user.id).check_password('new-password')
+
+
+def test_deactivation_invalidates(app, client, make_user, login, count_queries):
+    user = make_user('user1')
+    login(user)
+    send(app, client, count_queries)
+
+    with app.app_context():
+        db.session.get(User, user.id).is_active = False
+        db.session.commit()
+
+    assert cached(user) is None
+    with app.app_context():
+        assert user_cache.load(user.id).is_active is False
+
+
+def test_bulk_update_invalidates(app, client, make_user, login, count_queries):
+    user = make_user('user1')
+    login(user)
+    send(app, client, count_queries)
+    assert cached(user) is not None
+
+    with app.app_context():
+        User.query.filter_by(id=user.id).update({'role': 'auditor'}, synchronize_session=False)
+        db.session.commit()
+
+    assert cached(user) is None
+    with app.app_context():
+        assert user_cache.load(user.id).role == 'auditor'
+
+
+def test_local_cache_enabled_with_short_ttl_by_default(app):
+    from app import create_app
+
+    try:
+        create_app({'SQLALCHEMY_DATABASE_URI': 'sqlite://'})
+        assert user_cache.backend is not None
+        assert user_cache.ttl == 30
+    finally:
+        user_cache.init_app(app)
+
+
+def test_local_cache_can_be_disabled(app):
+    from app import create_app
+
+    # USER_CACHE_LOCAL=False без общего бэкенда: кэш выключен
+    production = create_app({'TESTING': True, 'SQLALCHEMY_DATABASE_URI': 'sqlite://',
+                             'USER_CACHE_LOCAL': False})
+    try:
+        with production.app_context():
+            db.create_all()
+            db.session.add(User(username='user1', email='user1@example.com', role='worker', password_hash='x'))
+            db.session.commit()
+            assert user_cache.backend is None
+            assert user_cache.load(1).username == 'user1'
+    finally:
+        user_cache.init_app(app)